@@ -0,0 +1,48 @@
+
+import sys
+import json
+import logging
+import argparse
+
+from . import codecs, end_to_end, imports
+
+suites = {
+    'codecs': codecs.benchmarks,
+    'end-to-end': end_to_end.benchmarks,
+    'imports': imports.benchmarks
+}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="Loopback benchmarks of the Gadgetron Python interface.")
+    parser.add_argument('suites', nargs='*', metavar='suite',
+                        help=f"Benchmark suites to run; one or more of {', '.join(suites)}. All by default.")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Scale the number of messages in each benchmark; e.g. 0.1 for a quick run.")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Number of timed runs per benchmark; the fastest is reported.")
+    parser.add_argument('--json', metavar='PATH',
+                        help="Also write the results to a JSON file, e.g. for comparing runs.")
+    args = parser.parse_args(args)
+
+    for suite in args.suites:
+        if suite not in suites:
+            parser.error(f"unknown suite '{suite}'")
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = []
+    for suite in args.suites or suites:
+        print(f"[{suite}]")
+        for result in suites[suite](args.scale, args.repeat):
+            print(result, flush=True)
+            results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump([result.as_dict() for result in results], file, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
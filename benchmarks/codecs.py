@@ -0,0 +1,46 @@
+
+from tests import streams
+from .harness import run
+
+# Message kinds, and the number of messages per benchmark at scale 1.
+cases = {
+    'acquisition': (lambda: streams.acquisition(channels=32, samples=256), 4000),
+    'waveform': (lambda: streams.waveform(), 20000),
+    'image': (lambda: streams.image(size=256), 1000),
+    'image_array': (lambda: streams.image_array(), 100),
+    'recon_data': (lambda: streams.recon_data(), 50),
+    'acquisition_bucket': (lambda: streams.acquisition_bucket(), 50)
+}
+
+
+def _consume(connection):
+    for _ in connection:
+        pass
+
+
+def benchmark_reader(name, scale=1.0, repeat=3):
+    """ Deserialize a stream of messages of one kind; the handler discards them. """
+    create, count = cases[name]
+    count = max(1, int(count * scale))
+    payload = streams.serialize([create()] * count)
+    return run(f"read {name}", _consume, payload, count, repeat=repeat)
+
+
+def benchmark_writer(name, scale=1.0, repeat=3):
+    """ Serialize and send messages of one kind, with nothing to read. """
+    create, count = cases[name]
+    count = max(1, int(count * scale))
+    items = [create()] * count
+
+    def send(connection):
+        for item in items:
+            connection.send(item)
+        _consume(connection)
+
+    return run(f"write {name}", send, b'', count, repeat=repeat, count_output=True)
+
+
+def benchmarks(scale=1.0, repeat=3):
+    for name in cases:
+        yield benchmark_reader(name, scale, repeat)
+        yield benchmark_writer(name, scale, repeat)
@@ -0,0 +1,37 @@
+
+import itertools
+
+from gadgetron.examples import pass_through, recon_acquisitions, recon_buffers
+
+from tests import streams
+from .harness import run
+
+
+def benchmark_pass_through(scale=1.0, repeat=3):
+    """ Forward a mixed stream of acquisitions, waveforms, and images. """
+    count = max(1, int(2000 * scale))
+    items = list(itertools.islice(itertools.cycle(
+        [streams.acquisition(line) for line in range(8)] + [streams.waveform(), streams.image(size=128)]), count))
+    return run("pass_through", pass_through, streams.serialize(items), count, repeat=repeat)
+
+
+def benchmark_recon_acquisitions(scale=1.0, repeat=3):
+    """ Reconstruct slices from acquisitions; noise adjustment, oversampling removal, and FFT. """
+    slices = max(1, int(8 * scale))
+    items = list(streams.acquisitions(slices=slices, lines=128, channels=32, samples=256))
+    return run("recon_acquisitions", recon_acquisitions, streams.serialize(items), len(items), repeat=repeat)
+
+
+def benchmark_recon_buffers(scale=1.0, repeat=3):
+    """ Reconstruct images from alternating ReconData and AcquisitionBucket messages. """
+    count = max(1, int(16 * scale))
+    items = [streams.recon_data(readout=128) if i % 2 else streams.acquisition_bucket(samples=128)
+             for i in range(count)]
+    return run("recon_buffers", recon_buffers, streams.serialize(items), count,
+               header=streams.header(matrix=(128, 128, 1), recon=(128, 128, 1)), repeat=repeat)
+
+
+def benchmarks(scale=1.0, repeat=3):
+    yield benchmark_pass_through(scale, repeat)
+    yield benchmark_recon_acquisitions(scale, repeat)
+    yield benchmark_recon_buffers(scale, repeat)
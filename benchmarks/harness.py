@@ -0,0 +1,107 @@
+
+import time
+import socket
+import threading
+import tracemalloc
+
+from gadgetron.external import Connection
+
+from tests import streams
+from tests.streams import complete_stream
+
+
+class Result:
+    """ Throughput, and peak traced memory, of a benchmark. """
+
+    def __init__(self, name, messages, nbytes, seconds, peak_memory):
+        self.name = name
+        self.messages = messages
+        self.bytes = nbytes
+        self.seconds = seconds
+        self.peak_memory = peak_memory
+
+    @property
+    def messages_per_second(self):
+        return self.messages / self.seconds
+
+    @property
+    def megabytes_per_second(self):
+        return self.bytes / self.seconds / 1e6
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'messages': self.messages,
+            'bytes': self.bytes,
+            'seconds': self.seconds,
+            'messages_per_second': self.messages_per_second,
+            'megabytes_per_second': self.megabytes_per_second,
+            'peak_memory': self.peak_memory
+        }
+
+    def __str__(self):
+        return (f"{self.name:<40} {self.messages:>8} msgs {self.messages_per_second:>12.1f} msg/s "
+                f"{self.megabytes_per_second:>10.1f} MB/s {self.peak_memory / 1e6:>10.1f} MB peak")
+
+
+def loopback(handler, stream):
+    """ Run a handler on a Connection, fed with a stream over a socket pair.
+
+    :param handler: Callable taking a `Connection`, as passed to `gadgetron.external.listen`.
+    :param stream: The complete input stream; see `complete_stream`.
+    :return: Elapsed time in seconds, and the number of bytes sent back by the handler.
+    """
+    client, server = socket.socketpair()
+    received = 0
+
+    def feed():
+        client.sendall(stream)
+
+    def drain():
+        nonlocal received
+        buffer = bytearray(1024 * 1024)
+        while True:
+            count = client.recv_into(buffer)
+            if not count:
+                return
+            received += count
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    drainer = threading.Thread(target=drain, daemon=True)
+    feeder.start()
+    drainer.start()
+
+    start = time.perf_counter()
+    with Connection(server) as connection:
+        handler(connection)
+    drainer.join()
+    elapsed = time.perf_counter() - start
+
+    feeder.join()
+    client.close()
+
+    return elapsed, received
+
+
+def run(name, handler, payload, messages, header=None, repeat=3, count_output=False):
+    """ Benchmark a handler over a loopback connection.
+
+    :param messages: Number of messages the benchmark processes; used to compute message rates.
+    :param repeat: Number of timed runs; the fastest is reported.
+    :param count_output: Report the bytes sent by the handler, rather than the size of the payload.
+
+    Peak memory is measured with `tracemalloc`, in a separate, untimed run.
+    """
+    stream = complete_stream(payload, header)
+
+    timings = [loopback(handler, stream) for _ in range(repeat)]
+    seconds, output = min(timings)
+
+    tracemalloc.start()
+    try:
+        loopback(handler, stream)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Result(name, messages, output if count_output else len(payload), seconds, peak_memory)
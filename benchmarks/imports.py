@@ -0,0 +1,80 @@
+
+import sys
+import json
+import subprocess
+
+# Modules timed, each in a fresh interpreter; 'gadgetron.__main__' is what every external process imports
+# before it connects. The dependencies are listed to show their share.
+targets = [
+    'numpy',
+    'ismrmrd',
+    'multimethod',
+    'pyfftw',
+    'asyncio',
+    'gadgetron',
+    'gadgetron.__main__',
+    'gadgetron.external',
+    'gadgetron.util',
+    'gadgetron.legacy',
+    'gadgetron.examples'
+]
+
+_probe = """
+import sys, time, json
+before = set(sys.modules)
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'modules': len(set(sys.modules) - before)}}))
+"""
+
+
+class ImportResult:
+    """ Time taken to import a module in a fresh interpreter, and the number of modules it loaded.
+
+    Modules that fail to import (e.g. optional dependencies that are not installed) are reported as
+    unavailable, with no time or module count.
+    """
+
+    def __init__(self, name, seconds=None, modules=None):
+        self.name = name
+        self.seconds = seconds
+        self.modules = modules
+
+    @property
+    def available(self):
+        return self.seconds is not None
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'available': self.available,
+            'seconds': self.seconds,
+            'modules': self.modules
+        }
+
+    def __str__(self):
+        if not self.available:
+            return f"{'import ' + self.name:<40} unavailable"
+        return f"{'import ' + self.name:<40} {self.seconds * 1e3:>10.1f} ms {self.modules:>8} modules"
+
+
+def measure(module):
+    completed = subprocess.run([sys.executable, '-c', _probe.format(module=module)],
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout)
+
+
+def benchmark_import(module, repeat=3):
+    """ Import a module in a fresh interpreter; the fastest of `repeat` runs is reported. """
+    runs = [measure(module) for _ in range(repeat)]
+    fastest = min(runs, key=lambda run: run['seconds'])
+    return ImportResult(module, fastest['seconds'], fastest['modules'])
+
+
+def benchmarks(scale=1.0, repeat=3):
+    for module in targets:
+        try:
+            yield benchmark_import(module, repeat)
+        except subprocess.CalledProcessError:
+            yield ImportResult(module)
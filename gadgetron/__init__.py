@@ -1,34 +1,51 @@
 
+import importlib
 
-from . import util
 from . import version
-from . import external
-from . import examples
-from . import types
 
 __version__ = version.version
 
+# Subpackages, and the names aliased below, are imported on first access. Importing them eagerly
+# would load the examples, pyFFTW, and multimethod into every external process at startup.
+_subpackages = ['util', 'legacy', 'external', 'examples', 'types']
+
 # To maintain compatibility with the old Gadgetron interface, we need names/types to be available
 # in the 'gadgetron' package. These are aliased here:
-from .legacy import Gadget
+_aliases = {
+    'Gadget': ('.legacy', 'Gadget'),
+    'IsmrmrdImageArray': ('.types.image_array', 'ImageArray'),
+    'IsmrmrdReconData': ('.types.recon_data', 'ReconData'),
+    'IsmrmrdReconBit': ('.types.recon_data', 'ReconBit'),
+    'IsmrmrdDataBuffered': ('.types.recon_data', 'ReconBuffer'),
+    'SamplingDescription': ('.types.recon_data', 'SamplingDescription'),
+    'SamplingLimit': ('.types.recon_data', 'SamplingLimit')
+}
+
+
+def __getattr__(name):
+    if name in _subpackages:
+        return importlib.import_module('.' + name, __name__)
+    if name in _aliases:
+        module, attribute = _aliases[name]
+        value = globals()[name] = getattr(importlib.import_module(module, __name__), attribute)
+        return value
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
 
-from .types.image_array import ImageArray as IsmrmrdImageArray
-from .types.recon_data import ReconData as IsmrmrdReconData
-from .types.recon_data import ReconBit as IsmrmrdReconBit
-from .types.recon_data import ReconBuffer as IsmrmrdDataBuffered
-from .types.recon_data import SamplingDescription, SamplingLimit
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 
 __all__ = [
-    util,
-    legacy,
-    external,
-    examples,
-    Gadget,
-    IsmrmrdImageArray,
-    IsmrmrdReconData,
-    IsmrmrdReconBit,
-    IsmrmrdDataBuffered,
-    SamplingDescription,
-    SamplingLimit
+    'util',
+    'legacy',
+    'external',
+    'examples',
+    'Gadget',
+    'IsmrmrdImageArray',
+    'IsmrmrdReconData',
+    'IsmrmrdReconBit',
+    'IsmrmrdDataBuffered',
+    'SamplingDescription',
+    'SamplingLimit'
 ]
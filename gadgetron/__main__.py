@@ -4,14 +4,15 @@ import sys
 import socket
 import inspect
 import logging
+import argparse
 
 from typing import Callable
 
 from .version import version
-from .external import connection
+from . import daemon
 
 
-def load_target(args) -> Callable[[connection.Connection], None]:
+def load_target(args) -> Callable[['gadgetron.external.Connection'], None]:
 
     module = __import__(args.get('module'), globals(), locals(), [args.get('target')], 0)
     target = getattr(module, args.get('target'), None)
@@ -25,17 +26,18 @@ def load_target(args) -> Callable[[connection.Connection], None]:
     raise TypeError(f"Unable to initialize suitable target using symbol '{args.get('target')}'")
 
 
-def main(args=None):
+def configure_logging(name):
+    logging.basicConfig(format=f"%(asctime)s.%(msecs)03d %(levelname)s [ext. %(process)d {name}] %(message)s",
+                        level=logging.getLevelName(os.environ.get('GADGETRON_EXTERNAL_LOG_LEVEL', 'DEBUG')),
+                        datefmt="%m-%d %H:%M:%S",
+                        force=True)
 
-    if not args:
-        return print(f"Gadgetron External Python Module v. {version}")
 
-    args = dict(zip(['port', 'module', 'target'], args))
+def run(args):
+    # Imported here; a client handing its request to a daemon does not need numpy or ismrmrd.
+    from .external import connection
 
-    logging.basicConfig(format=f"%(asctime)s.%(msecs)03d %(levelname)s " +
-                               f"[ext. %(process)d {args.get('module')}.{args.get('target')}] %(message)s",
-                        level=logging.getLevelName(os.environ.get('GADGETRON_EXTERNAL_LOG_LEVEL', 'DEBUG')),
-                        datefmt="%m-%d %H:%M:%S")
+    configure_logging(f"{args.get('module')}.{args.get('target')}")
 
     logging.debug(f"Starting external Python module '{args.get('module')}' in state: [ACTIVE]")
     logging.debug(f"Connecting to parent on port {args.get('port')}")
@@ -47,6 +49,49 @@ def main(args=None):
         target(conn)
 
 
+def run_daemon(args):
+    parser = argparse.ArgumentParser(prog='python -m gadgetron --daemon',
+                                     description="Serve connect-back requests with pre-warmed, forked workers.")
+    parser.add_argument('--socket', default=os.environ.get('GADGETRON_DAEMON_SOCKET'),
+                        help="Path of the control socket. Defaults to GADGETRON_DAEMON_SOCKET.")
+    parser.add_argument('--preload', action='append', default=[], metavar='MODULE',
+                        help="Module to import, and warm up, ahead of the first request. May be repeated.")
+    parser.add_argument('--header', metavar='FILE',
+                        help="Template ISMRMRD header, parsed during warm up.")
+    args = parser.parse_args(args)
+
+    if not args.socket:
+        parser.error("no control socket; use --socket, or set GADGETRON_DAEMON_SOCKET")
+
+    configure_logging('daemon')
+
+    daemon.warm_up(args.preload, args.header)
+    daemon.Daemon(args.socket, run).serve_forever()
+
+
+def main(args=None):
+
+    if not args:
+        return print(f"Gadgetron External Python Module v. {version}")
+
+    if args[0] == '--daemon':
+        return run_daemon(args[1:])
+
+    args = dict(zip(['port', 'module', 'target'], args))
+
+    # If a daemon is running, it runs the request in a pre-warmed worker; this process only waits for it.
+    path = os.environ.get('GADGETRON_DAEMON_SOCKET')
+    if path:
+        try:
+            status = daemon.request(path, args)
+            sys.exit(status if status >= 0 else 128 - status)
+        except (FileNotFoundError, ConnectionRefusedError):
+            configure_logging(f"{args.get('module')}.{args.get('target')}")
+            logging.warning(f"No daemon listening on socket '{path}'; running module in this process.")
+
+    run(args)
+
+
 if __name__ == '__main__':
     try:
         main(sys.argv[1:])
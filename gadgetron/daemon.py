@@ -0,0 +1,274 @@
+
+import os
+import sys
+import json
+import signal
+import socket
+import struct
+import logging
+import importlib
+import selectors
+import threading
+
+
+def warm_up(modules=(), header=None):
+    """ Import, and exercise, what the children of a daemon would otherwise load on each request.
+
+    :param modules: Names of modules to import, e.g. the modules containing the targets. If a module
+    defines a `warm_up` function, it is called; this is the place to plan FFTs, or load models.
+    :param header: Optional path of a template ISMRMRD header, which is parsed to load the schema bindings.
+
+    Children are forked from the warmed-up process, and forking a process running threads is unsafe. Warm-up
+    is therefore single threaded. If the children transform with a single thread (GADGETRON_FFT_THREADS is
+    unset, or 1), FFTs planned during warm-up are planned with the engine the children use (see `cfft.engine`),
+    and every child inherits the plans. Otherwise, FFTs are planned with FFTW_MEASURE by a single threaded
+    engine, which is discarded afterwards; children create their own, threaded, engine, which plans from the
+    wisdom they inherit. Hooks must not start threads; `Daemon.serve_forever` refuses to run if they have.
+    """
+    import numpy
+    import ismrmrd
+
+    from .external import connection  # Readers and writers, along with the message types.
+    from .util import cfft
+
+    shared = _fft_threads() == 1
+    if not shared:
+        cfft.configure(threads=1, planner_effort='FFTW_MEASURE')
+    try:
+        cfft.cfftn(numpy.zeros((2, 2), dtype=numpy.complex64), axes=[0, 1])
+
+        if header:
+            with open(header, 'rb') as file:
+                ismrmrd.xsd.CreateFromDocument(file.read())
+
+        for name in modules:
+            module = importlib.import_module(name)
+            hook = getattr(module, 'warm_up', None)
+            if callable(hook):
+                logging.debug(f"Warming up module '{name}'")
+                hook()
+    finally:
+        if not shared:
+            cfft._engine = None
+
+
+class Daemon:
+    """ Resident process serving connect-back requests with warm, forked children.
+
+    :param path: Path of the Unix domain socket on which requests are accepted.
+    :param run: Callable taking the arguments of a request; called in a forked child, to run the request.
+
+    Clients send the arguments of a request, along with their standard output and error. For each request,
+    a child is forked. The child runs the request with the client's output and error streams, and the
+    child's exit status is sent back to the client. Anything imported or initialized before `serve_forever`
+    is called (see `warm_up`) is inherited by every child.
+
+    The socket is accessible to the user running the daemon only, and requests from other users are
+    refused. Children run in the client's working directory, but import modules from the daemon's
+    `sys.path`; targets must be importable by the daemon (e.g. started from the same directory).
+
+    The daemon itself is single threaded; children are reaped as SIGCHLD is delivered.
+    """
+
+    def __init__(self, path, run):
+        self.path = path
+        self.run = run
+        self.children = {}
+
+    def serve_forever(self):
+        """ Accept and run requests until terminated.
+
+        :raises: :class:`RuntimeError`: If another daemon is listening on the socket, or if the process is
+        running threads; children cannot be forked safely from a multi-threaded process.
+        """
+        if threading.active_count() > 1:
+            raise RuntimeError("Process is running threads; children cannot be forked safely.")
+
+        if os.path.exists(self.path):
+            if _is_listening(self.path):
+                raise RuntimeError(f"A daemon is already listening on socket: {self.path}")
+            os.unlink(self.path)
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            listener.bind(self.path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.path, 0o600)
+        listener.listen(64)
+
+        wakeup, self.wakeup = os.pipe()
+        os.set_blocking(wakeup, False)
+        os.set_blocking(self.wakeup, False)
+        signal.set_wakeup_fd(self.wakeup)
+        signal.signal(signal.SIGCHLD, lambda *_: None)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+        logging.info(f"Daemon accepting requests on socket: {self.path}")
+
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(listener, selectors.EVENT_READ)
+                selector.register(wakeup, selectors.EVENT_READ)
+                while True:
+                    for key, _ in selector.select():
+                        if key.fileobj is listener:
+                            self._accept(listener, [selector, wakeup])
+                        else:
+                            os.read(wakeup, 4096)
+                            self._reap()
+        finally:
+            signal.set_wakeup_fd(-1)
+            listener.close()
+            os.unlink(self.path)
+
+    def _accept(self, listener, resources):
+        client, _ = listener.accept()
+        if not _is_same_user(client):
+            logging.warning("Refusing request from another user.")
+            client.close()
+            return
+
+        try:
+            client.settimeout(5)
+            request, streams = _receive_request(client)
+            client.settimeout(None)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Discarding malformed request: {e}")
+            client.close()
+            return
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        pid = os.fork()
+        if pid == 0:
+            self._child(request, streams, [listener, client, *self.children.values(), *resources])
+
+        logging.debug(f"Forked child {pid} for request: {request.get('arguments')}")
+        for stream in streams:
+            os.close(stream)
+        self.children[pid] = client
+
+    def _child(self, request, streams, inherited):
+        status = 1
+        try:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            for resource in inherited:
+                if hasattr(resource, 'close'):
+                    resource.close()
+                else:
+                    os.close(resource)
+            os.close(self.wakeup)
+
+            for target, stream in zip([sys.stdout.fileno(), sys.stderr.fileno()], streams):
+                os.dup2(stream, target)
+                os.close(stream)
+
+            os.environ.update(request.get('environment', {}))
+            _discard_mismatched_fft_engine()
+            if request.get('directory'):
+                os.chdir(request['directory'])
+
+            self.run(request['arguments'])
+            status = 0
+        except BaseException as e:
+            logging.fatal(e, exc_info=True)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)
+
+    def _reap(self):
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                return
+
+            client = self.children.pop(pid)
+            code = os.waitstatus_to_exitcode(status)
+            logging.debug(f"Child {pid} exited with status {code}")
+            try:
+                client.sendall(json.dumps({'status': code}).encode() + b'\n')
+            except OSError:
+                pass
+            client.close()
+
+
+def request(path, arguments):
+    """ Have a daemon run a request, and wait for it to complete.
+
+    :param path: Path of the daemon's socket.
+    :param arguments: Arguments of the request, passed to the daemon's `run` callable.
+    :return: Exit status of the child which ran the request.
+    :raises FileNotFoundError, ConnectionRefusedError: If no daemon is listening on the socket; the request
+    has not been run.
+    :raises EOFError: If the daemon closed the connection before reporting an exit status.
+
+    The request is run with the standard output and error of this process, and the environment
+    variables prefixed by 'GADGETRON_'.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+
+        message = json.dumps({
+            'arguments': arguments,
+            'directory': os.getcwd(),
+            'environment': {key: value for key, value in os.environ.items() if key.startswith('GADGETRON_')}
+        }).encode() + b'\n'
+
+        socket.send_fds(client, [message], [sys.stdout.fileno(), sys.stderr.fileno()])
+
+        with client.makefile('rb') as responses:
+            response = responses.readline()
+
+    if not response:
+        raise EOFError("Daemon closed the connection without reporting an exit status.")
+    return json.loads(response)['status']
+
+
+def _receive_request(client):
+    message, streams, _, _ = socket.recv_fds(client, 64 * 1024, 2)
+    message = bytearray(message)
+    try:
+        while not message.endswith(b'\n'):
+            chunk = client.recv(64 * 1024)
+            if not chunk:
+                raise ValueError("Incomplete request.")
+            message += chunk
+        return json.loads(message), streams
+    except BaseException:
+        for stream in streams:
+            os.close(stream)
+        raise
+
+
+def _is_same_user(client):
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return True
+    credentials = client.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    _, uid, _ = struct.unpack('3i', credentials)
+    return uid == os.getuid()
+
+
+def _fft_threads():
+    return int(os.environ.get('GADGETRON_FFT_THREADS', 1))
+
+
+def _discard_mismatched_fft_engine():
+    # The engine warmed up by the daemon is single threaded; a request asking for more threads gets a new one.
+    cfft = sys.modules.get('gadgetron.util.cfft')
+    if cfft is not None and cfft._engine is not None and cfft._engine.threads != _fft_threads():
+        cfft._engine = None
+
+
+def _is_listening(path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+            return True
+        except OSError:
+            return False
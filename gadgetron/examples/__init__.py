@@ -4,7 +4,7 @@ from .recon_buffers import recon_buffers
 from .pass_through import pass_through
 
 __all__ = [
-    recon_acquisitions,
-    recon_buffers,
-    pass_through
+    'recon_acquisitions',
+    'recon_buffers',
+    'pass_through'
 ]
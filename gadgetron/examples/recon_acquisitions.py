@@ -6,103 +6,37 @@ import itertools
 
 import numpy as np
 
-from gadgetron.util.cfft import cfftn, cifftn
+import gadgetron.util
+
+from gadgetron.util.cfft import cifftn
 
 
 def noise_adjustment(acquisitions, header):
     # The dataset might include noise measurements (mine does). We'll consume noise measurements, use them
     # to prepare a noise adjustment matrix, and never pass them down the chain. They contain no image data,
     # and will not be missed. We'll also perform noise adjustment on following acquisitions, when we have a
-    # noise matrix available.
-
-    noise_matrix = None
-    noise_dwell_time = 1.0
-
-    try:
-        noise_bandwidth = header.encoding[0].acquisitionSystemInformation.relativeNoiseBandwidth
-    except:
-        noise_bandwidth = 0.793
-
-    def scaling_factor(acq):
-        return np.sqrt(2 * acq.sample_time_us * noise_bandwidth / noise_dwell_time)
-
-    def calculate_whitening_transformation(noise):
-        covariance = (1.0 / (noise.shape[1] - 1)) * np.dot(noise, np.transpose(np.conjugate(noise)))
-        return np.linalg.inv(np.linalg.cholesky(covariance))
+    # noise matrix available. Acquisitions are adjusted in batches; one matrix product per batch, rather than
+    # one per acquisition.
 
-    def apply_whitening_transformation(acq):
-        return scaling_factor(acq) * np.dot(noise_matrix, acq.data)
-
-    def noise_adjust(acq):
-        if noise_matrix is not None:
-            acq.data[:] = apply_whitening_transformation(acq)
-        return acq
-
-    for acquisition in acquisitions:
-        if acquisition.is_flag_set(ismrmrd.ACQ_IS_NOISE_MEASUREMENT):
-            noise_matrix = calculate_whitening_transformation(acquisition.data)
-            noise_dwell_time = acquisition.sample_time_us
-        else:
-            yield noise_adjust(acquisition)
+    return gadgetron.util.noise_whitening(acquisitions, header, batch_size=64)
 
 
 def remove_oversampling(acquisitions, header):
     # The dataset I'm working with was originally taken on a Siemens scanner. It features 2x oversampling
     # along the first image dimension. We're going to have a look at the header. If our encoded space
-    # doesn't match the recon space, we're going to crop the acquisition.
-
-    encoding_space = header.encoding[0].encodedSpace.matrixSize
-    recon_space = header.encoding[0].reconSpace.matrixSize
-
-    if encoding_space.x == recon_space.x:
-        return acquisitions
-
-    x0 = (encoding_space.x - recon_space.x) // 2
-    x1 = (encoding_space.x - recon_space.x) // 2 + recon_space.x
+    # doesn't match the recon space, we're going to crop the acquisitions - again in batches.
 
-    def crop_acquisition(acquisition):
-        x_space = cifftn(acquisition.data, axes=[1])
-        x_space = x_space[:, x0:x1]
-        acquisition.resize(number_of_samples=x_space.shape[1], active_channels=x_space.shape[0])
-        acquisition.center_sample = recon_space.x // 2
-        acquisition.data[:] = cfftn(x_space, axes=[1])
-
-        return acquisition
-
-    return map(crop_acquisition, acquisitions)
+    return gadgetron.util.remove_oversampling(acquisitions, header, batch_size=64)
 
 
 def accumulate_acquisitions(acquisitions, header):
     # To form images, we need a full slice of data. We accumulate acquisitions until we reach the
-    # end of a slice. The acquisitions are then combined in a single buffer, which is passed
-    # on. We also pass on a reference acquisition. We use it later to initialize image metadata.
-
-    accumulated_acquisitions = []
-    matrix_size = header.encoding[0].encodedSpace.matrixSize
-
-    def assemble_buffer(acqs):
-        logging.debug(f"Assembling buffer from {len(acqs)} acquisitions.")
-
-        number_of_channels, number_of_samples = acqs[0].data.shape
-
-        buffer = np.zeros(
-            (number_of_channels,
-             matrix_size.z,
-             matrix_size.y,
-             number_of_samples),
-            dtype=np.complex64
-        )
-
-        for acq in acqs:
-            buffer[:, acq.idx.kspace_encode_step_2, acq.idx.kspace_encode_step_1, :] = acq.data
-
-        return buffer
+    # end of a slice. Each acquisition is written into a buffer allocated from the encoded space as it
+    # arrives; when the slice is complete, the buffer is passed on. We also pass on a reference acquisition.
+    # We use it later to initialize image metadata.
 
-    for acquisition in acquisitions:
-        accumulated_acquisitions.append(acquisition)
-        if acquisition.is_flag_set(ismrmrd.ACQ_LAST_IN_SLICE):
-            yield acquisition, assemble_buffer(accumulated_acquisitions)
-            accumulated_acquisitions = []
+    accumulator = gadgetron.util.KSpaceAccumulator(header, keys=['slice'], triggers=[ismrmrd.ACQ_LAST_IN_SLICE])
+    return accumulator.accumulate(acquisitions)
 
 
 def reconstruct_images(buffers, header):
@@ -9,6 +9,8 @@ import multimethod
 
 import numpy as np
 
+from gadgetron.external.headers import header_object
+
 
 def prepare_buffers(input, header):
 
@@ -18,19 +20,21 @@ def prepare_buffers(input, header):
 
         logging.debug(f"Assembling buffer from bucket containing {len(acquisitions)} acquisitions.")
 
-        channels, samples = acquisitions[0].data.shape
+        data = acquisitions.stacked_data()
+        _, channels, samples = data.shape
         buffer = np.zeros(
             (channels, matrix_size.z, matrix_size.y, samples),
             dtype=np.complex64
         )
 
-        for acq in acquisitions:
-            buffer[:, acq.idx.kspace_encode_step_2, acq.idx.kspace_encode_step_1, :] = acq.data
+        # Place every readout in a single fancy-indexed assignment; the bundle data is (acquisitions, channels, samples).
+        idx = acquisitions.headers['idx']
+        buffer[:, idx['kspace_encode_step_2'], idx['kspace_encode_step_1'], :] = data.transpose(1, 0, 2)
 
         return buffer, acquisitions[0]
 
     def buffer_from_buffer(buffer):
-        return buffer.data.reshape(buffer.data.shape[:4]).transpose(), buffer.headers.item(0)
+        return buffer.data.reshape(buffer.data.shape[:4]).transpose(), header_object(buffer.headers.flat[0])
 
     @multimethod.multimethod
     def prepare_buffers(bucket: gadgetron.types.AcquisitionBucket):
@@ -1,5 +1,18 @@
 
 from .connection import Connection
-from .listen import listen
+from .listen import listen, serve, Server
+from .registry import register_reader, register_writer
+from .replay import replay, ReplaySource
 
-__all__ = [Connection, listen]
+
+def __getattr__(name):
+    # The asynchronous interface is imported on first use; importing asyncio is slow, and most
+    # processes never need it.
+    if name in ['AsyncConnection', 'listen_async']:
+        from . import async_connection
+        return getattr(async_connection, name)
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+__all__ = ['Connection', 'listen', 'serve', 'Server', 'register_reader', 'register_writer', 'replay', 'ReplaySource',
+           'AsyncConnection', 'listen_async']
@@ -0,0 +1,281 @@
+
+import asyncio
+import logging
+import collections
+
+import numpy
+
+from . import constants
+from .raw import RawMessage, skimmers
+from .protocol import Protocol
+from .connection import Connection
+
+from ..types.recon_data import ReconData
+from ..types.acquisition_bucket import AcquisitionBucket
+
+
+class AsyncConnection(Protocol):
+    """ Represents a connection to an ISMRMRD client, for use with asyncio.
+
+    Supports `async for item in connection`, and `await connection.send(item)`. Readers, writers, and
+    filters are shared with `Connection` (see `Protocol`). Messages are framed on the event loop; the
+    length fields of each message are read from the asyncio stream (see `raw.skimmers`), until the body is
+    complete. Only then is the body deserialized, in the connection's executor, so decoding never blocks the
+    event loop, and no thread waits on the stream. Items with more than `serialize_threshold` bytes of data
+    are serialized in the executor as well; others are serialized on the event loop.
+
+    Messages with no skimmer (i.e. messages of formats read by readers added for other message ids) cannot
+    be framed in advance. These are read in the executor, from the stream; the read waits on the event loop.
+    """
+
+    serialize_threshold = 256 * 1024
+
+    class MessageSource:
+        """ Source reading a message body from the chunks it was received in; see `raw.skim`.
+
+        As with `ReplaySource`, large reads contained in a chunk return read-only memoryview slices of it,
+        without copying.
+        """
+
+        zero_copy_threshold = 64 * 1024
+
+        def __init__(self, chunks):
+            self.chunks = collections.deque(memoryview(chunk).cast('B') for chunk in chunks if len(chunk))
+
+        def read(self, nbytes):
+            if self.chunks and len(self.chunks[0]) >= nbytes > 0:
+                data = self._take(nbytes)
+                return data if nbytes >= self.zero_copy_threshold else bytes(data)
+
+            data = bytearray(nbytes)
+            self.readinto(data)
+            return data
+
+        def peek(self, nbytes):
+            if not self.chunks or len(self.chunks[0]) < nbytes:
+                raise EOFError("End of message.")
+            return self.chunks[0][:nbytes]
+
+        def readinto(self, destination):
+            view = memoryview(destination).cast('B')
+            position = 0
+            while position < len(view):
+                if not self.chunks:
+                    raise EOFError("End of message.")
+                chunk = self._take(min(len(view) - position, len(self.chunks[0])))
+                view[position:position + len(chunk)] = chunk
+                position += len(chunk)
+            return len(view)
+
+        def _take(self, nbytes):
+            chunk = self.chunks.popleft()
+            if nbytes < len(chunk):
+                self.chunks.appendleft(chunk[nbytes:])
+            return chunk[:nbytes]
+
+    class StreamSource:
+        """ Blocking source reading from the connection's stream; used from the executor, for messages
+        that cannot be framed on the event loop.
+        """
+
+        def __init__(self, connection):
+            self.connection = connection
+
+        def read(self, nbytes):
+            return asyncio.run_coroutine_threadsafe(self.connection._receive(nbytes), self.connection.loop).result()
+
+        def readinto(self, destination):
+            view = memoryview(destination).cast('B')
+            view[:] = self.read(len(view))
+            return len(view)
+
+    class MessageBuffer:
+        """ Destination collecting the serialized pieces of a message. Large pieces are not copied. """
+
+        def __init__(self):
+            self.pieces = [bytearray()]
+
+        def write(self, byte_array):
+            view = memoryview(byte_array)
+            if view.nbytes < Connection.SocketWrapper.coalesce_limit:
+                self.pieces[-1] += view
+            else:
+                self.pieces.append(view.cast('B') if view.format != 'B' or view.ndim != 1 else view)
+                self.pieces.append(bytearray())
+
+        def flush(self):
+            pass
+
+    _end = object()
+
+    def __init__(self, reader, writer, executor=None):
+        self.reader = reader
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+
+        super().__init__(AsyncConnection.StreamSource(self))
+        self.executor = executor
+
+    @classmethod
+    async def open(cls, reader, writer, executor=None):
+        """ Create a connection on an asyncio stream, and read the configuration and header from it.
+
+        :param reader: `asyncio.StreamReader` to read items from.
+        :param writer: `asyncio.StreamWriter` to send items to.
+        :param executor: Executor in which messages are deserialized, large items serialized, and work passed
+        to `run_in_executor` is run. Defaults to the event loop's default executor.
+        """
+        connection = cls(reader, writer, executor)
+        connection.config, connection.raw_bytes.config = \
+            await connection._read_byte_string_message(constants.GADGET_MESSAGE_CONFIG, Protocol._parse_config)
+        connection.header, connection.raw_bytes.header = \
+            await connection._read_byte_string_message(constants.GADGET_MESSAGE_HEADER, Protocol._parse_header)
+        return connection
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exception_info):
+        await self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        _, item = await self.next()
+        return item
+
+    async def iter_with_mids(self):
+        while True:
+            try:
+                yield await self.next()
+            except StopAsyncIteration:
+                return
+
+    async def send(self, item):
+        """ Send an item to the client.
+
+        :param item: Item to be sent.
+        :raises: :class:`TypeError`: If no appropriate writer is found.
+
+        The item is serialized, written to the stream, and the stream drained before returning. Items with
+        more than `serialize_threshold` bytes of data are serialized in the connection's executor.
+        """
+        writer = self._find_writer(item)
+        buffer = AsyncConnection.MessageBuffer()
+        if type(item) is not RawMessage and _data_nbytes(item) > self.serialize_threshold:
+            await self.run_in_executor(writer, buffer, item)
+        else:
+            writer(buffer, item)
+        self.writer.writelines(buffer.pieces)
+        await self.writer.drain()
+
+    async def next(self):
+        """ Retrieves the next item available on a connection.
+
+        :return: The next message from the connection (along with the corresponding MessageID).
+        :raises: :class:`StopAsyncIteration`: If no more items are available.
+
+        Behaves like `Connection.next`; filtered items are sent back to the client.
+        """
+        mid, item = await self._read_item()
+
+        while type(item) is RawMessage or not all(pred(item) for pred in self.filters):
+            await self.send(item)
+            mid, item = await self._read_item()
+
+        return mid, item
+
+    async def run_in_executor(self, function, *args):
+        """ Run CPU-heavy work (e.g. a reconstruction step) in the connection's executor, and await the result. """
+        return await self.loop.run_in_executor(self.executor, function, *args)
+
+    async def close(self):
+        """ Send the close message to the client, and close the stream. """
+        self.writer.write(constants.GadgetMessageIdentifier.pack(constants.GADGET_MESSAGE_CLOSE))
+        try:
+            await self.writer.drain()
+        finally:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+    async def _read_item(self):
+        mid = constants.GadgetMessageIdentifier.unpack(await self._receive(constants.GadgetMessageIdentifier.size))[0]
+
+        if mid not in skimmers:
+            mid, item = await self.run_in_executor(self._decode, mid, self.socket)
+        else:
+            chunks = await self._skim(skimmers[mid]())
+            source = AsyncConnection.MessageSource(chunks)
+            if self.message_filters and not self._accepts_message(mid, source):
+                return mid, RawMessage(mid, chunks)
+            mid, item = await self.run_in_executor(self._decode, mid, source)
+
+        if mid is AsyncConnection._end:
+            raise StopAsyncIteration()
+        return mid, item
+
+    def _decode(self, mid, source):
+        # StopIteration cannot cross into a Future; it is translated into an end marker.
+        try:
+            return mid, self._read_body(mid, source)
+        except StopIteration:
+            return AsyncConnection._end, None
+
+    async def _skim(self, skimmer):
+        chunks = []
+        nbytes = next(skimmer)
+        try:
+            while True:
+                chunks.append(await self._receive(nbytes))
+                nbytes = skimmer.send(chunks[-1])
+        except StopIteration:
+            return chunks
+
+    async def _read_byte_string_message(self, expected_mid, parse):
+        mid = constants.GadgetMessageIdentifier.unpack(await self._receive(constants.GadgetMessageIdentifier.size))[0]
+        assert(mid == expected_mid)
+        length = constants.uint32.unpack(await self._receive(constants.uint32.size))[0]
+        return await self.run_in_executor(parse, await self._receive(length))
+
+    async def _receive(self, nbytes):
+        try:
+            return await self.reader.readexactly(nbytes)
+        except asyncio.IncompleteReadError as e:
+            raise EOFError("Connection closed by peer.") from e
+
+
+def _data_nbytes(item):
+    # Bytes of array data held by an item; a measure of the cost of serializing it.
+    if isinstance(item, ReconData):
+        return sum(_data_nbytes(bit.data) + _data_nbytes(bit.ref) for bit in item.bits)
+    if isinstance(item, AcquisitionBucket):
+        return _data_nbytes(item.data) + _data_nbytes(item.ref)
+    data = getattr(item, 'data', None)
+    return data.nbytes if isinstance(data, numpy.ndarray) else 0
+
+
+async def listen_async(port, handler, *args, **kwargs):
+    """
+    Serves connections on a given port, invoking the coroutine function handler for each
+    :param port: Port on which to listen
+    :param handler: Coroutine function which takes an AsyncConnection and the remaining args
+    :param args:
+    :param kwargs:
+
+    Connections are served concurrently on the running event loop, until the server is cancelled.
+    """
+    logging.debug(f"Starting external Python module '{handler.__name__}' in state: [PASSIVE, ASYNC]")
+    logging.debug(f"Serving connections from clients on port: {port}")
+
+    async def serve_client(reader, writer):
+        logging.info(f"Accepted connection from client: {writer.get_extra_info('peername')}")
+        try:
+            async with await AsyncConnection.open(reader, writer) as connection:
+                await handler(connection, *args, **kwargs)
+        except Exception as e:
+            logging.exception(f"Handler failed: {e}")
+
+    server = await asyncio.start_server(serve_client, port=port, reuse_address=True)
+    async with server:
+        await server.serve_forever()
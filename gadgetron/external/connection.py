@@ -1,60 +1,239 @@
 
+import os
+import time
 import socket
 import logging
-
-import xml.etree.ElementTree as xml
+import itertools
 
 import ismrmrd
 
 from . import constants
+from . import registry
+from .raw import RawMessage, write_raw_message
+from .metrics import Metrics, MeteredSocket
+from .pipeline import ReadAhead, WriteBehind
+
+from .protocol import Protocol
 
-from .readers import read, read_byte_string, read_acquisition, read_waveform, read_image
+from .readers import read_acquisition, read_waveform, read_image
 from .writers import write_acquisition, write_waveform, write_image
 
 from ..types.image_array import ImageArray, read_image_array, write_image_array
 from ..types.recon_data import ReconData, read_recon_data, write_recon_data
-from ..types.acquisition_bucket import read_acquisition_bucket
+from ..types.acquisition_bucket import AcquisitionBucket, read_acquisition_bucket, write_acquisition_bucket
 
 
-class Connection:
+class Connection(Protocol):
     """ Represents a connection to an ISMRMRD client.
+
+    `readers` maps message ids to readers, and `writers` lists (predicate, writer) pairs; both include the
+    readers and writers registered for the process (see `registry`) and the built-in ones. Readers set in
+    `readers` apply to the connection only. `writers` is a snapshot; writers are added with `add_writer`.
     """
 
     class SocketWrapper:
+        """ Buffered reader/writer on top of a blocking socket.
+
+        Reads are served from a reusable read-ahead buffer, which is refilled using large `recv_into`
+        calls. Small reads (message identifiers, optional flags, vector sizes, etc.) are thus served
+        without a syscall each. Reads larger than the buffer bypass it, and are received directly into
+        the destination.
+
+        Writes are queued, and sent when the wrapper is flushed; `write` alone does not send anything.
+        `Connection.send` flushes once per message. Code writing to `Connection.socket` directly (e.g. a
+        writer invoked outside `send`) must call `flush` itself; anything still queued is sent when the
+        connection is closed.
+
+        If a record file is provided, every byte received is also written to it, as it is received. If
+        writing to it fails (e.g. the disk is full), recording stops with a warning; the connection is
+        not affected.
+        """
+
+        buffer_size = 256 * 1024
+        coalesce_limit = 64 * 1024
+        max_pieces_per_send = 1024
 
-        def __init__(self, socket):
+        def __init__(self, socket, buffer_size=None, record=None):
             self.socket = socket
             self.socket.settimeout(None)
+            self.record = record
+
+            self.buffer = bytearray(buffer_size or Connection.SocketWrapper.buffer_size)
+            self.view = memoryview(self.buffer)
+            self.start = 0
+            self.end = 0
+
+            self.pending = bytearray()
+            self.pieces = []
 
         def read(self, nbytes):
-            bytes = self.socket.recv(nbytes, socket.MSG_WAITALL)
-            while len(bytes) < nbytes:
-                bytes += self.socket.recv(nbytes - len(bytes),socket.MSG_WAITALL)
-            return bytes
+            """ Read exactly `nbytes` bytes from the socket.
+
+            Returns a bytes-like object owned by the caller; it is never invalidated by subsequent reads.
+            """
+            if self.end - self.start < nbytes:
+                if nbytes > len(self.buffer):
+                    data = bytearray(nbytes)
+                    self.readinto(data)
+                    return data
+                self._fill(nbytes)
+
+            start, self.start = self.start, self.start + nbytes
+            return bytes(self.view[start:self.start])
+
+        def peek(self, nbytes):
+            """ Return the next `nbytes` bytes from the socket, without consuming them.
+
+            The bytes are returned as a view of the read buffer, valid until the next read. At most
+            `buffer_size` bytes can be peeked.
+            """
+            if self.end - self.start < nbytes:
+                self._fill(nbytes)
+            return self.view[self.start:self.start + nbytes]
+
+        def readinto(self, destination):
+            """ Fill the writable buffer `destination` completely with bytes from the socket.
+
+            :return: The number of bytes read.
+            """
+            view = memoryview(destination).cast('B')
+            nbytes = len(view)
+
+            available = min(self.end - self.start, nbytes)
+            view[:available] = self.view[self.start:self.start + available]
+            self.start += available
+
+            remaining = nbytes - available
+            if remaining >= len(self.buffer):
+                self._recv_into(view[available:])
+            elif remaining:
+                self._fill(remaining)
+                view[available:] = self.view[self.start:self.start + remaining]
+                self.start += remaining
+
+            return nbytes
+
+        def _fill(self, nbytes):
+            # Move any unread bytes to the front of the buffer, then receive until at least
+            # nbytes are available. We ask for as much as the buffer will hold; this is the read-ahead.
+            available = self.end - self.start
+            if self.start:
+                self.view[:available] = self.view[self.start:self.end]
+                self.start, self.end = 0, available
+
+            while self.end < nbytes:
+                received = self.socket.recv_into(self.view[self.end:])
+                if not received:
+                    raise EOFError("Connection closed by peer.")
+                if self.record:
+                    self._record(self.view[self.end:self.end + received])
+                self.end += received
+
+        def _recv_into(self, view):
+            while len(view):
+                received = self.socket.recv_into(view, len(view), socket.MSG_WAITALL)
+                if not received:
+                    raise EOFError("Connection closed by peer.")
+                if self.record:
+                    self._record(view[:received])
+                view = view[received:]
+
+        def _record(self, data):
+            try:
+                self.record.write(data)
+            except OSError as e:
+                logging.warning(f"Failed to record inbound stream; recording stopped: {e}")
+                record, self.record = self.record, None
+                try:
+                    record.close()
+                except OSError:
+                    pass
 
         def write(self, byte_array):
-            self.socket.sendall(byte_array)
+            """ Queue bytes for sending. Nothing is sent until `flush` is called.
+
+            Small writes are coalesced into a single buffer. Writes of `coalesce_limit` bytes or more
+            are kept by reference (not copied), and handed to the socket as part of a single
+            scatter-gather `sendmsg` when the message is flushed. The caller must not modify
+            such buffers until they have been flushed.
+            """
+            view = memoryview(byte_array)
+            if view.nbytes < self.coalesce_limit:
+                self.pending += view
+                return
 
-        def close(self):
-            end = constants.GadgetMessageIdentifier.pack(constants.GADGET_MESSAGE_CLOSE)
-            self.socket.send(end)
-            self.socket.close()
+            if self.pending:
+                self.pieces.append(self.pending)
+                self.pending = bytearray()
+            self.pieces.append(view.cast('B') if view.format != 'B' or view.ndim != 1 else view)
 
-    class Struct:
-        def __init__(self, **fields):
-            self.__dict__.update(fields)
+        def flush(self):
+            """ Send all queued bytes. """
+            if self.pending:
+                self.pieces.append(self.pending)
+                self.pending = bytearray()
+
+            pieces, self.pieces = self.pieces, []
+
+            if not hasattr(self.socket, 'sendmsg'):
+                for piece in pieces:
+                    self.socket.sendall(piece)
+                return
 
-    def __init__(self, socket):
-        self.socket = Connection.SocketWrapper(socket)
+            while pieces:
+                sent, done = self.socket.sendmsg(pieces[:self.max_pieces_per_send]), 0
+                while done < len(pieces) and sent >= len(pieces[done]):
+                    sent -= len(pieces[done])
+                    done += 1
+                del pieces[:done]
+                if sent:
+                    pieces[0] = memoryview(pieces[0])[sent:]
+
+        def shutdown_reads(self):
+            """ Stop receiving; blocked and subsequent reads fail with EOFError. Writes are not affected. """
+            try:
+                self.socket.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+        def close(self):
+            """ Send anything still queued, followed by the close message, and close the socket. """
+            end = constants.GadgetMessageIdentifier.pack(constants.GADGET_MESSAGE_CLOSE)
+            try:
+                self.flush()
+                self.write(end)
+                self.flush()
+                self.socket.close()
+            finally:
+                if self.record:
+                    self.record.close()
+
+    _recordings = itertools.count()
+
+    def __init__(self, socket, record=None):
+        """ Create a connection, and read the configuration and header from it.
+
+        :param socket: Connected socket. Objects providing `read` (e.g. a `ReplaySource`) are used as they are.
+        :param record: Optional path of a file to which the raw inbound stream is written, config and header
+        included. Defaults to a new file in the directory named by the GADGETRON_RECORD_DIRECTORY environment
+        variable, if it is set. Recorded streams can be replayed with `gadgetron.external.replay`.
+        :raises: :class:`OSError`: If the `record` file cannot be created. Files in the GADGETRON_RECORD_DIRECTORY
+        directory that cannot be created are skipped with a warning.
+        """
+        if hasattr(socket, 'read'):
+            source = socket
+        else:
+            source = Connection.SocketWrapper(socket, record=Connection._open_record(record))
 
-        self.readers = Connection._default_readers()
-        self.writers = Connection._default_writers()
+        super().__init__(source)
 
-        self.raw_bytes = Connection.Struct(config=None, header=None)
         self.config, self.raw_bytes.config = self._read_config()
         self.header, self.raw_bytes.header = self._read_header()
 
-        self.filters = []
+        self.read_ahead = None
+        self.write_behind = None
+
+        self.metrics = None
 
     def __next__(self):
         return self.next()
@@ -63,7 +242,17 @@ class Connection:
         return self
 
     def __exit__(self, *exception_info):
-        self.socket.close()
+        # Closing the socket flushes any writes still queued on it, before the close message is sent.
+        try:
+            if self.write_behind:
+                self.write_behind.close()
+        finally:
+            if self.read_ahead:
+                self.read_ahead.close()
+            self.socket.close()
+            if self.metrics:
+                self.metrics.handler_stopped()
+                self.metrics.report()
 
     def __iter__(self):
         while True:
@@ -80,49 +269,51 @@ class Connection:
             except StopIteration:
                 return
 
-    def add_reader(self, mid, reader, *args, **kwargs):
-        """ Add a reader to the connection's readers.
-
-        :param mid: The ISMRMRD Message ID for which the reader is called.
-        :param reader: Reader function to be called when `mid` is encountered on the connection.
-        :param args: Additional arguments. These are forwarded to the reader when it's called.
-        :param kwargs: Additional keyword-arguments. These are forwarded to the reader when it's called.
-
-        Add (or overwrite) a reader to the connection's reader-set. Readers are used to deserialize
-        binary ISMRMRD data into usable items.
-        """
-        self.readers[mid] = lambda readable: reader(readable, *args, **kwargs)
+    def pipeline(self, read_ahead=8, write_behind=8):
+        """ Overlap network I/O with item processing.
 
-    def add_writer(self, accepts, writer, *args, **kwargs):
-        """ Add a writer to the connection's writers.
+        :param read_ahead: Maximum number of items read and deserialized ahead of the consumer.
+        :param write_behind: Maximum number of sent items waiting to be serialized and written.
 
-        :param accepts: Predicate used to determine if a writer accepts an item.
-        :param writer: Writer function to be called when `accepts` predicate returned truthy value.
-        :param args: Additional arguments. These are forwarded to the writer when it's called.
-        :param kwargs: Additional keyword-arguments. These are forwarded to the writer when it's called.
+        Starts a background thread reading and deserializing items ahead of `next`, and another
+        serializing and writing items passed to `send`. Both work through bounded queues, and preserve
+        message order. Errors encountered while reading are raised by `next`; errors encountered while
+        writing are raised by the following call to `send`, or when the connection is closed. Closing the
+        connection stops the reader thread, and discards items read ahead but not consumed.
 
-        Add a writer to the connection's writer-set. Writers are used to serialize items into appropriate
-        ISMRMRD binary data.
+        Items passed to `send` are serialized later, on the writer thread; they must not be modified
+        after they have been sent. Must be called before items are read from the connection.
         """
-        self.writers.insert(0, (accepts, lambda writable: writer(writable, *args, **kwargs)))
+        if self.read_ahead is None and read_ahead:
+            self.read_ahead = ReadAhead(self._read_item, read_ahead,
+                                        interrupt=getattr(self.socket, 'shutdown_reads', None))
+        if self.write_behind is None and write_behind:
+            self.write_behind = WriteBehind(self._write_item, write_behind)
 
-    def filter(self, predicate):
-        """ Filters the items that come through the Connection.
+    def enable_metrics(self, prometheus_file=None):
+        """ Collect message counts, sizes, and timings for the connection.
 
-        :param predicate: Predicate used when filtering items.
+        :param prometheus_file: Optional path; metrics are written to it in the Prometheus text format
+        when the connection is closed.
 
-        Filters the items returned by `next`, such that only items for which `predicate(item)`
-        returns a truthy value is returned. Items not satisfying the predicate will be silently
-        sent back to the client.
+        Tracks received messages by message id (count, bytes, time reading and decoding), sent items
+        by type (count, bytes, time encoding and sending), and the time the handler spends between
+        calls to `next`. Metrics are available through `stats` while the connection is open, and are
+        logged when it is closed. Must be called before items are read from the connection.
 
-        Accepts types as well as function predicates. Supplying a type is shorthand for `isinstance`
-        based filtering, such that
-            `connection.filter(type)` is equivalent to
-            `connection.filter(lambda item: isinstance(item, type))`
+        :raises: :class:`RuntimeError`: If the connection is already pipelined; the pipeline threads use the
+        socket as it was when they started. Enable metrics before calling `pipeline`.
         """
-        if isinstance(predicate, type):
-            return self.filters.append(lambda o: isinstance(o, predicate))
-        self.filters.append(predicate)
+        if self.read_ahead or self.write_behind:
+            raise RuntimeError("Metrics must be enabled before the connection is pipelined.")
+        if self.metrics is None:
+            self.metrics = Metrics(prometheus_file)
+            self.socket = MeteredSocket(self.socket)
+
+    @property
+    def stats(self):
+        """ The connection's `Metrics`, or None if metrics are not enabled. See `enable_metrics`. """
+        return self.metrics
 
     def send(self, item):
         """ Send an item to the client.
@@ -133,10 +324,10 @@ class Connection:
         Calling send will offer the item to the connection's current writer-set. If
         an appropriate writer is found, the item is serialized, and sent to the client.
         """
-        for predicate, writer in self.writers:
-            if predicate(item):
-                return writer(self.socket, item)
-        raise TypeError(f"No appropriate writer found for item of type '{type(item)}'")
+        writer = self._find_writer(item)
+        if self.write_behind:
+            return self.write_behind.submit(writer, item)
+        return self._write_item(writer, item)
 
     def next(self):
         """ Retrieves the next item available on a connection.
@@ -153,45 +344,60 @@ class Connection:
         returned. Any items not satisfying the predicate is silently returned to the
         client.
         """
-        mid, item = self._read_item()
+        if self.metrics:
+            self.metrics.handler_stopped()
 
-        while not all(pred(item) for pred in self.filters):
-            self.send(item)
-            mid, item = self._read_item()
+        mid, item = self._next_item()
 
-        return mid, item
+        while type(item) is RawMessage or not all(pred(item) for pred in self.filters):
+            self.send(item)
+            mid, item = self._next_item()
 
-    def _read_item(self):
-        message_identifier = self._read_message_identifier()
+        if self.metrics:
+            self.metrics.handler_started()
 
-        def unknown_message_identifier(*_):
-            logging.error(f"Received message (id: {message_identifier}) with no registered readers.")
-            raise StopIteration()
+        return mid, item
 
-        reader = self.readers.get(message_identifier, unknown_message_identifier)
-        return message_identifier, reader(self.socket)
+    def _next_item(self):
+        if self.read_ahead:
+            return self.read_ahead.next()
+        return self._read_item()
 
-    def _read_message_identifier(self):
-        return read(self.socket, constants.GadgetMessageIdentifier)
+    def _write_item(self, writer, item):
+        if self.metrics:
+            return self.metrics.measure_write(self.socket, writer, item)
+        writer(self.socket, item)
+        self.socket.flush()
 
-    def _read_config(self):
-        message_identifier = self._read_message_identifier()
-        assert(message_identifier == constants.GADGET_MESSAGE_CONFIG)
-        config_bytes = read_byte_string(self.socket)
+    def _read_item(self):
+        if self.metrics:
+            return self.metrics.measure_read(self.socket, self._read_message)
+        return self._read_message()
 
+    @ staticmethod
+    def _open_record(record):
+        if record:
+            logging.info(f"Recording inbound stream to file: {record}")
+            return open(record, 'wb')
+
+        record = Connection._record_path()
+        if not record:
+            return None
         try:
-            parsed_config  = xml.fromstring(config_bytes)
-        except xml.ParseError as e:
-            logging.log(logging.WARN,"Config parsing failed with error message {}".format(e))
-            parsed_config = None 
+            file = open(record, 'wb')
+        except OSError as e:
+            logging.warning(f"Failed to create recording '{record}'; continuing without recording: {e}")
+            return None
+        logging.info(f"Recording inbound stream to file: {record}")
+        return file
 
-        return parsed_config, config_bytes
-
-    def _read_header(self):
-        message_identifier = self._read_message_identifier()
-        assert(message_identifier == constants.GADGET_MESSAGE_HEADER)
-        header_bytes = read_byte_string(self.socket)
-        return ismrmrd.xsd.CreateFromDocument(header_bytes), header_bytes
+    @ staticmethod
+    def _record_path():
+        directory = os.environ.get('GADGETRON_RECORD_DIRECTORY')
+        if not directory:
+            return None
+        name = f"gadgetron-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(Connection._recordings)}.stream"
+        return os.path.join(directory, name)
 
     @ staticmethod
     def _default_readers():
@@ -207,16 +413,28 @@ class Connection:
 
     @ staticmethod
     def _default_writers():
-        return [
-            (lambda item: isinstance(item, ismrmrd.Acquisition), write_acquisition),
-            (lambda item: isinstance(item, ismrmrd.Waveform), write_waveform),
-            (lambda item: isinstance(item, ismrmrd.Image), write_image),
-            (lambda item: isinstance(item, ImageArray), write_image_array),
-            (lambda item: isinstance(item, ReconData), write_recon_data)
-        ]
+        return {
+            ismrmrd.Acquisition: write_acquisition,
+            ismrmrd.Waveform: write_waveform,
+            ismrmrd.Image: write_image,
+            ImageArray: write_image_array,
+            ReconData: write_recon_data,
+            AcquisitionBucket: write_acquisition_bucket,
+            RawMessage: write_raw_message
+        }
 
     @ staticmethod
     def stop_iteration(_):
         logging.debug("Connection closed normally.")
         raise StopIteration()
 
+
+def _register_defaults():
+    for mid, reader in Connection._default_readers().items():
+        registry.defaults.add_reader(mid, reader)
+
+    for cls, writer in Connection._default_writers().items():
+        registry.defaults.add_writer(cls, writer)
+
+
+_register_defaults()
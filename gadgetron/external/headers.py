@@ -0,0 +1,54 @@
+
+import ismrmrd
+import numpy
+
+# Structured NumPy dtypes mirroring the ISMRMRD header structures. The layouts match the packed
+# ctypes structures exactly, so arrays of headers can be read and written in bulk, and fields
+# accessed in a vectorized manner, e.g. `headers['idx']['slice']`.
+acquisition_header_dtype = numpy.dtype(ismrmrd.AcquisitionHeader)
+image_header_dtype = numpy.dtype(ismrmrd.ImageHeader)
+waveform_header_dtype = numpy.dtype(ismrmrd.WaveformHeader)
+
+_header_types = {
+    acquisition_header_dtype: ismrmrd.AcquisitionHeader,
+    image_header_dtype: ismrmrd.ImageHeader,
+    waveform_header_dtype: ismrmrd.WaveformHeader
+}
+
+
+def header_object(record):
+    """ Convert a single structured header record to the corresponding ismrmrd header object.
+
+    :param record: Element of a structured header array.
+    :return: An `ismrmrd.AcquisitionHeader`, `ismrmrd.ImageHeader`, or `ismrmrd.WaveformHeader`.
+    """
+    return _header_types[record.dtype].from_buffer_copy(record)
+
+
+def header_objects(headers):
+    """ Convert a structured header array to an object array of ismrmrd header objects.
+
+    :param headers: Structured header array.
+    :return: Object array of the same shape, holding ismrmrd header objects.
+    """
+    header_type = _header_types[headers.dtype]
+    objects = numpy.empty(headers.shape, dtype=object)
+    for index, record in numpy.ndenumerate(headers):
+        objects[index] = header_type.from_buffer_copy(record)
+    return objects
+
+
+def header_array(objects, dtype=None):
+    """ Convert an object array of ismrmrd header objects to a structured header array.
+
+    :param objects: Object array holding ismrmrd header objects.
+    :param dtype: Structured dtype of the result. Inferred from the objects if not provided; an empty
+    array is taken to hold acquisition headers.
+    :return: Structured header array of the same shape.
+    """
+    flat = objects.ravel(order='F')
+    if dtype is None:
+        dtype = type(flat[0]) if flat.size else acquisition_header_dtype
+    dtype = numpy.dtype(dtype)
+    buffer = bytearray(b''.join(bytes(header) for header in flat))
+    return numpy.reshape(numpy.frombuffer(buffer, dtype=dtype), objects.shape, order='F')
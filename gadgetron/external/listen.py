@@ -1,5 +1,9 @@
 
+import os
+import signal
 import logging
+import threading
+import concurrent.futures
 
 import socket
 
@@ -32,3 +36,156 @@ def listen(port, handler, *args, **kwargs):
 
     with connection.Connection(wait_for_client_connection(port)) as conn:
         handler(conn, *args, **kwargs)
+
+
+class Server:
+    """ Long-running server, accepting connections until shut down.
+
+    Each connection is handled by one of a fixed number of workers; at most `workers` connections are
+    handled concurrently. Further clients wait in the listen backlog until a worker is available.
+
+    Workers are either threads in this process, or pre-forked child processes (`fork=True`). Forked
+    workers inherit everything imported before the server is started, and do not contend for the GIL.
+
+    Calling `shutdown` (or sending SIGTERM/SIGINT when started with `serve`) stops the server from
+    accepting new connections; connections being handled are allowed to complete.
+    """
+
+    poll_interval = 0.5
+
+    def __init__(self, port, handler, *args, workers=4, fork=False, **kwargs):
+        self.port = port
+        self.handler = handler
+        self.args = args
+        self.kwargs = kwargs
+        self.workers = workers
+        self.fork = fork
+
+        self.stopping = threading.Event()
+        self.children = set()
+
+    def serve_forever(self):
+        logging.debug(f"Starting external Python module '{self.handler.__name__}' in state: [PASSIVE, SERVER]")
+        logging.debug(f"Serving up to {self.workers} concurrent connections on port: {self.port}")
+
+        with self._create_socket() as sock:
+            sock.settimeout(self.poll_interval)
+            if self.fork:
+                self._serve_forked(sock)
+            else:
+                self._serve_threaded(sock)
+
+        logging.debug("Server shut down.")
+
+    def shutdown(self):
+        self.stopping.set()
+        for pid in list(self.children):
+            os.kill(pid, signal.SIGTERM)
+
+    def _create_socket(self):
+        sock = socket.socket(family=socket.AF_INET6)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('', self.port))
+        sock.listen(max(self.workers, socket.SOMAXCONN))
+        return sock
+
+    def _accept(self, sock):
+        while not self.stopping.is_set():
+            try:
+                return sock.accept()
+            except socket.timeout:
+                continue
+        return None
+
+    def _handle(self, client, address):
+        logging.info(f"Accepted connection from client: {address}")
+        try:
+            with connection.Connection(client) as conn:
+                self.handler(conn, *self.args, **self.kwargs)
+        except Exception as e:
+            logging.exception(f"Handler failed for client {address}: {e}")
+
+    def _serve_threaded(self, sock):
+        slots = threading.BoundedSemaphore(self.workers)
+
+        def handle(client, address):
+            try:
+                self._handle(client, address)
+            finally:
+                slots.release()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers,
+                                                   thread_name_prefix='gadgetron-worker') as executor:
+            while not self.stopping.is_set():
+                if not slots.acquire(timeout=self.poll_interval):
+                    continue
+                accepted = self._accept(sock)
+                if accepted is None:
+                    slots.release()
+                    break
+                executor.submit(handle, *accepted)
+
+    def _serve_forked(self, sock):
+        while not self.stopping.is_set():
+            while len(self.children) < self.workers and not self.stopping.is_set():
+                self.children.add(self._fork_worker(sock))
+
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                continue
+            except InterruptedError:
+                continue
+
+            self.children.discard(pid)
+            if status and not self.stopping.is_set():
+                logging.warning(f"Worker process {pid} exited with status {status}; replacing it.")
+
+        while self.children:
+            pid, _ = os.waitpid(-1, 0)
+            self.children.discard(pid)
+
+    def _fork_worker(self, sock):
+        pid = os.fork()
+        if pid:
+            return pid
+
+        exit_code = 0
+        try:
+            self.children = set()
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, lambda *_: self.stopping.set())
+
+            while True:
+                accepted = self._accept(sock)
+                if accepted is None:
+                    break
+                self._handle(*accepted)
+        except BaseException as e:
+            logging.exception(f"Worker process failed: {e}")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+
+def serve(port, handler, *args, workers=4, fork=False, **kwargs):
+    """
+    Serves connections on a given port until interrupted, invoking the handler for each connection
+    :param port: Port on which to listen
+    :param handler: Callable which takes a connection and the remaining args
+    :param workers: Maximum number of connections handled concurrently
+    :param fork: Handle connections in pre-forked worker processes, rather than threads
+    :param args:
+    :param kwargs:
+
+    Unlike `listen`, the process keeps serving clients after the first connection closes, so imports
+    and other start-up costs are paid once. SIGTERM and SIGINT shut the server down cleanly; connections
+    being handled are allowed to complete.
+    """
+    server = Server(port, handler, *args, workers=workers, fork=fork, **kwargs)
+
+    if threading.current_thread() is threading.main_thread():
+        for signum in [signal.SIGTERM, signal.SIGINT]:
+            signal.signal(signum, lambda *_: server.shutdown())
+
+    server.serve_forever()
@@ -0,0 +1,243 @@
+
+import os
+import time
+import bisect
+import logging
+import threading
+
+from . import constants
+
+message_names = {value: name[len('GADGET_MESSAGE_'):] for name, value in vars(constants).items()
+                 if name.startswith('GADGET_MESSAGE_') and not name.endswith(('_MIN', '_MAX'))}
+
+
+class Histogram:
+    """ Histogram of durations, in seconds, with exponential buckets from 1 us to ~16 s. """
+
+    bounds = [1e-6 * 2 ** i for i in range(25)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """ Estimate a quantile; the upper bound of the bucket holding it. """
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.bounds + [float('inf')], self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class MessageStats:
+    """ Count, total size, and timing histograms for a kind of message. """
+
+    def __init__(self, *timings):
+        self.count = 0
+        self.bytes = 0
+        self.timings = {timing: Histogram() for timing in timings}
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'bytes': self.bytes,
+            **{timing: {'mean': histogram.mean, 'p50': histogram.quantile(0.5), 'p99': histogram.quantile(0.99),
+                        'total': histogram.sum}
+               for timing, histogram in self.timings.items()}
+        }
+
+
+class MeteredSocket:
+    """ Wraps a connection's socket, counting the bytes, and the time spent, reading and writing. """
+
+    def __init__(self, socket):
+        self.socket = socket
+        if hasattr(socket, 'shutdown_reads'):
+            self.shutdown_reads = socket.shutdown_reads
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.read_time = 0.0
+
+    def read(self, nbytes):
+        start = time.perf_counter()
+        data = self.socket.read(nbytes)
+        self.read_time += time.perf_counter() - start
+        self.bytes_read += nbytes
+        return data
+
+    def readinto(self, destination):
+        start = time.perf_counter()
+        nbytes = self.socket.readinto(destination)
+        self.read_time += time.perf_counter() - start
+        self.bytes_read += nbytes
+        return nbytes
+
+    def peek(self, nbytes):
+        start = time.perf_counter()
+        data = self.socket.peek(nbytes)
+        self.read_time += time.perf_counter() - start
+        return data
+
+    def write(self, byte_array):
+        self.bytes_written += memoryview(byte_array).nbytes
+        self.socket.write(byte_array)
+
+    def flush(self):
+        self.socket.flush()
+
+    def close(self):
+        self.socket.close()
+
+
+class Metrics:
+    """ Message counts, sizes, and timings of a connection.
+
+    Received messages are tracked by message id, with histograms of the time spent reading from the
+    socket ('read'), and the remaining time spent deserializing ('decode'). Sent items are tracked by
+    type, with histograms of the time spent serializing ('encode'), and sending ('send'). Time spent by
+    the handler between calls to `next` is tracked in the 'handler' histogram.
+    """
+
+    def __init__(self, prometheus_file=None):
+        self.prometheus_file = prometheus_file
+        self.received = {}
+        self.sent = {}
+        self.handler = Histogram()
+        self.handler_start = None
+        self.lock = threading.Lock()
+
+    def measure_read(self, source, read_item):
+        start, read_time, bytes_read = time.perf_counter(), source.read_time, source.bytes_read
+        mid, item = read_item()
+        duration = time.perf_counter() - start
+
+        with self.lock:
+            stats = self.received.get(mid) or self.received.setdefault(mid, MessageStats('read', 'decode'))
+            stats.count += 1
+            stats.bytes += source.bytes_read - bytes_read
+            stats.timings['read'].observe(source.read_time - read_time)
+            stats.timings['decode'].observe(duration - (source.read_time - read_time))
+
+        return mid, item
+
+    def measure_write(self, destination, writer, item):
+        start, bytes_written = time.perf_counter(), destination.bytes_written
+        writer(destination, item)
+        encoded = time.perf_counter()
+        destination.flush()
+        sent = time.perf_counter()
+
+        with self.lock:
+            name = type(item).__name__
+            stats = self.sent.get(name) or self.sent.setdefault(name, MessageStats('encode', 'send'))
+            stats.count += 1
+            stats.bytes += destination.bytes_written - bytes_written
+            stats.timings['encode'].observe(encoded - start)
+            stats.timings['send'].observe(sent - encoded)
+
+    def handler_started(self):
+        self.handler_start = time.perf_counter()
+
+    def handler_stopped(self):
+        if self.handler_start is not None:
+            self.handler.observe(time.perf_counter() - self.handler_start)
+            self.handler_start = None
+
+    def as_dict(self):
+        """ Summary of the metrics, as plain dicts. """
+        with self.lock:
+            return {
+                'received': {message_names.get(mid, mid): stats.as_dict() for mid, stats in self.received.items()},
+                'sent': {name: stats.as_dict() for name, stats in self.sent.items()},
+                'handler': {'count': self.handler.count, 'total': self.handler.sum}
+            }
+
+    def report(self):
+        """ Log a summary of the metrics, and write them to the Prometheus text file, if one is configured. """
+        with self.lock:
+            for mid, stats in self.received.items():
+                read, decode = stats.timings['read'], stats.timings['decode']
+                logging.info(f"Received {stats.count} {message_names.get(mid, mid)} messages ({stats.bytes} bytes); "
+                             f"read {read.sum:.3f} s (p99 {read.quantile(0.99) * 1e3:.3f} ms), "
+                             f"decode {decode.sum:.3f} s (p99 {decode.quantile(0.99) * 1e3:.3f} ms)")
+            for name, stats in self.sent.items():
+                encode, send = stats.timings['encode'], stats.timings['send']
+                logging.info(f"Sent {stats.count} {name} items ({stats.bytes} bytes); "
+                             f"encode {encode.sum:.3f} s (p99 {encode.quantile(0.99) * 1e3:.3f} ms), "
+                             f"send {send.sum:.3f} s (p99 {send.quantile(0.99) * 1e3:.3f} ms)")
+            logging.info(f"Handler busy {self.handler.sum:.3f} s over {self.handler.count} items.")
+
+        if self.prometheus_file:
+            self.write_prometheus(self.prometheus_file)
+
+    def write_prometheus(self, path):
+        """ Write the metrics to a file, in the Prometheus text exposition format.
+
+        The file is replaced atomically; it can be collected by e.g. the node exporter's textfile collector.
+        """
+        lines = []
+
+        def braces(labels):
+            return f"{{{labels}}}" if labels else ''
+
+        def counter(name, description, samples):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f"{name}{braces(labels)} {value}" for labels, value in samples)
+
+        def histogram(name, description, samples):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, h in samples:
+                separator = ',' if labels else ''
+                cumulative = 0
+                for bound, count in zip(Histogram.bounds, h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{{{labels}{separator}le=\"{bound:.6g}\"}} {cumulative}")
+                lines.append(f"{name}_bucket{{{labels}{separator}le=\"+Inf\"}} {h.count}")
+                lines.append(f"{name}_sum{braces(labels)} {h.sum}")
+                lines.append(f"{name}_count{braces(labels)} {h.count}")
+
+        with self.lock:
+            received = [(f'mid="{mid}",message="{message_names.get(mid, mid)}"', stats)
+                        for mid, stats in self.received.items()]
+            sent = [(f'type="{name}"', stats) for name, stats in self.sent.items()]
+
+            counter('gadgetron_messages_received_total', "Messages received.",
+                    [(labels, stats.count) for labels, stats in received])
+            counter('gadgetron_bytes_received_total', "Bytes received.",
+                    [(labels, stats.bytes) for labels, stats in received])
+            counter('gadgetron_messages_sent_total', "Items sent.",
+                    [(labels, stats.count) for labels, stats in sent])
+            counter('gadgetron_bytes_sent_total', "Bytes sent.",
+                    [(labels, stats.bytes) for labels, stats in sent])
+
+            for timing, description, samples in [('read', "Time spent reading messages from the socket.", received),
+                                                 ('decode', "Time spent deserializing messages.", received),
+                                                 ('encode', "Time spent serializing items.", sent),
+                                                 ('send', "Time spent sending items.", sent)]:
+                histogram(f'gadgetron_{timing}_seconds', description,
+                          [(labels, stats.timings[timing]) for labels, stats in samples])
+
+            histogram('gadgetron_handler_seconds', "Time spent in the handler between items.", [('', self.handler)])
+
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, 'w') as file:
+                file.write('\n'.join(lines) + '\n')
+            os.replace(temporary, path)
+        except OSError as e:
+            logging.warning(f"Failed to write metrics to '{path}': {e}")
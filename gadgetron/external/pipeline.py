@@ -0,0 +1,123 @@
+
+import queue
+import logging
+import threading
+
+
+class ReadAhead:
+    """ Reads and deserializes items on a background thread, ahead of the consumer.
+
+    Items are handed to the consumer through a bounded queue, in the order they were read. Errors
+    raised while reading are re-raised by `next`, in their place in the stream.
+
+    If the consumer stops early, `close` stops the thread; `interrupt`, if provided, is called to make a
+    blocked read return (e.g. by shutting down the read side of the socket).
+    """
+
+    _end = object()
+
+    def __init__(self, read_item, depth, interrupt=None):
+        self.read_item = read_item
+        self.interrupt = interrupt
+        self.queue = queue.Queue(maxsize=depth)
+        self.done = False
+        self.stopped = False
+
+        self.thread = threading.Thread(target=self._run, name='gadgetron-read-ahead', daemon=True)
+        self.thread.start()
+
+    def next(self):
+        if self.done:
+            raise StopIteration()
+
+        item, error = self.queue.get()
+
+        if item is ReadAhead._end:
+            self.done = True
+            raise StopIteration()
+        if error is not None:
+            self.done = True
+            raise error
+
+        return item
+
+    def close(self):
+        """ Stop reading, and discard the items read but not consumed.
+
+        Waits for the thread to finish if reads can be interrupted; otherwise, the thread finishes on its
+        own once its current read returns.
+        """
+        self.done, self.stopped = True, True
+        if self.interrupt is not None and self.thread.is_alive():
+            self.interrupt()
+            while self.thread.is_alive():
+                self._discard()
+                self.thread.join(timeout=0.01)
+        self._discard()
+
+    def _discard(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _run(self):
+        while not self.stopped:
+            try:
+                item = self.read_item(), None
+            except StopIteration:
+                item = ReadAhead._end, None
+            except BaseException as e:
+                item = None, e
+
+            if self.stopped:
+                return
+            self.queue.put(item)
+            if item[0] is ReadAhead._end or item[1] is not None:
+                return
+
+
+class WriteBehind:
+    """ Serializes and sends items on a background thread, behind the producer.
+
+    Items are written in the order they were submitted. If writing fails, the remaining items are
+    discarded, and the error is re-raised by any subsequent call to `submit` or `close`.
+    """
+
+    _end = object()
+
+    def __init__(self, write_item, depth):
+        self.write_item = write_item
+        self.queue = queue.Queue(maxsize=depth)
+        self.error = None
+
+        self.thread = threading.Thread(target=self._run, name='gadgetron-write-behind', daemon=True)
+        self.thread.start()
+
+    def submit(self, *args):
+        self._raise_pending_error()
+        self.queue.put(args)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(WriteBehind._end)
+            self.thread.join()
+        self._raise_pending_error()
+
+    def _raise_pending_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        while True:
+            args = self.queue.get()
+            if args is WriteBehind._end:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self.write_item(*args)
+            except BaseException as e:
+                logging.error(f"Failed to send item: {e}")
+                self.error = e
@@ -0,0 +1,193 @@
+
+import logging
+import collections
+
+import xml.etree.ElementTree as xml
+
+import ismrmrd
+
+from . import constants
+from . import registry
+from .raw import MessageFilter, read_raw_message
+
+from .readers import read, read_byte_string
+
+
+class Protocol:
+    """ Readers, writers, and filters shared by `Connection` and `AsyncConnection`.
+
+    :param socket: Blocking source the messages are read from; see `Connection.SocketWrapper`.
+
+    Implements the message framing of the external protocol on top of `socket`: reading message ids,
+    the configuration and header, and finding the reader for a message or the writer for an item.
+    Connections add the transport, i.e. how items are read and sent.
+    """
+
+    class Struct:
+        def __init__(self, **fields):
+            self.__dict__.update(fields)
+
+    def __init__(self, socket):
+        self.socket = socket
+
+        self.codecs = registry.Codecs(parent=registry.codecs)
+        self.readers = collections.ChainMap(*(codecs.readers for codecs in self.codecs.lineage()))
+        self.predicate_writers = []
+
+        self.filters = []
+        self.message_filters = []
+
+        self.config, self.header = None, None
+        self.raw_bytes = Protocol.Struct(config=None, header=None)
+
+    def add_reader(self, mid, reader, *args, **kwargs):
+        """ Add a reader to the connection's readers.
+
+        :param mid: The ISMRMRD Message ID for which the reader is called.
+        :param reader: Reader function to be called when `mid` is encountered on the connection.
+        :param args: Additional arguments. These are forwarded to the reader when it's called.
+        :param kwargs: Additional keyword-arguments. These are forwarded to the reader when it's called.
+
+        Add (or overwrite) a reader to the connection's reader-set. Readers are used to deserialize
+        binary ISMRMRD data into usable items. Readers registered for the whole process (see
+        `registry.register_reader`) are used for message ids with no reader on the connection.
+        """
+        if args or kwargs:
+            self.readers[mid] = lambda readable: reader(readable, *args, **kwargs)
+        else:
+            self.readers[mid] = reader
+
+    def add_writer(self, accepts, writer, *args, **kwargs):
+        """ Add a writer to the connection's writers.
+
+        :param accepts: Type of the items serialized by the writer, or a predicate used to determine if
+        a writer accepts an item.
+        :param writer: Writer function to be called when `accepts` predicate returned truthy value.
+        :param args: Additional arguments. These are forwarded to the writer when it's called.
+        :param kwargs: Additional keyword-arguments. These are forwarded to the writer when it's called.
+
+        Add a writer to the connection's writer-set. Writers are used to serialize items into appropriate
+        ISMRMRD binary data.
+
+        Writers added for a type are found with a single (cached) lookup on the type of each item, and
+        also serve its subclasses. Writers added with a predicate take precedence over these, most
+        recently added first; every predicate writer is consulted for every item sent, so prefer types
+        where possible.
+        """
+        serialize = writer
+        if args or kwargs:
+            serialize = lambda writable, item: writer(writable, item, *args, **kwargs)
+
+        if isinstance(accepts, type):
+            return self.codecs.add_writer(accepts, serialize)
+        self.predicate_writers.insert(0, (accepts, serialize))
+
+    @property
+    def writers(self):
+        """ The writers used by the connection, as (predicate, writer) pairs in order of precedence.
+
+        Includes the writers registered for the process and the built-in writers, after those added to the
+        connection. The list is a snapshot; writers are added with `add_writer`.
+        """
+        writers, types = list(self.predicate_writers), set()
+        for codecs in self.codecs.lineage():
+            for cls, writer in codecs.writers.items():
+                if cls not in types:
+                    types.add(cls)
+                    writers.append((lambda item, cls=cls: isinstance(item, cls), writer))
+        return writers
+
+    def filter(self, predicate):
+        """ Filters the items that come through the Connection.
+
+        :param predicate: Predicate used when filtering items.
+
+        Filters the items returned by `next`, such that only items for which `predicate(item)`
+        returns a truthy value is returned. Items not satisfying the predicate will be silently
+        sent back to the client.
+
+        Accepts types as well as function predicates. Supplying a type is shorthand for `isinstance`
+        based filtering, such that
+            `connection.filter(type)` is equivalent to
+            `connection.filter(lambda item: isinstance(item, type))`
+        """
+        if isinstance(predicate, type):
+            return self.filters.append(lambda o: isinstance(o, predicate))
+        self.filters.append(predicate)
+
+    def filter_messages(self, mids, predicate=None):
+        """ Filters the messages that come through the Connection, before they are deserialized.
+
+        :param mids: The ISMRMRD Message IDs of the messages to be returned by `next`.
+        :param predicate: Optional predicate on the headers of acquisitions, images, and waveforms.
+
+        Messages with an id not in `mids` are not deserialized; they are sent back to the client byte
+        for byte, as they were received. Only the length fields needed to find the end of each message
+        are decoded. Acquisitions, images, and waveforms are also sent back if `predicate` is supplied,
+        and returns a falsy value when called with the message header (e.g. an `ismrmrd.AcquisitionHeader`).
+        Headers are inspected without consuming or deserializing the rest of the message.
+
+        This is much cheaper than `filter` when most of the traffic is not of interest, e.g.
+            `connection.filter_messages([GADGET_MESSAGE_ISMRMRD_ACQUISITION],
+                                        lambda header: header.idx.contrast == 0)`
+
+        Control messages, and messages of unknown formats, are always deserialized. Multiple message
+        filters may be added; messages are returned only if they satisfy all of them.
+        """
+        self.message_filters.append(MessageFilter(mids, predicate))
+
+    def _find_writer(self, item):
+        for predicate, writer in self.predicate_writers:
+            if predicate(item):
+                return writer
+
+        writer = self.codecs.writer(type(item))
+        if writer is None:
+            raise TypeError(f"No appropriate writer found for item of type '{type(item)}'")
+        return writer
+
+    def _read_message(self):
+        message_identifier = self._read_message_identifier()
+
+        if self.message_filters and not self._accepts_message(message_identifier, self.socket):
+            return message_identifier, read_raw_message(self.socket, message_identifier)
+
+        return message_identifier, self._read_body(message_identifier, self.socket)
+
+    def _read_body(self, message_identifier, source):
+        def unknown_message_identifier(*_):
+            logging.error(f"Received message (id: {message_identifier}) with no registered readers.")
+            raise StopIteration()
+
+        reader = self.codecs.reader(message_identifier) or unknown_message_identifier
+        return reader(source)
+
+    def _accepts_message(self, message_identifier, source):
+        return all(f.accepts(message_identifier, source) for f in self.message_filters)
+
+    def _read_message_identifier(self):
+        return read(self.socket, constants.GadgetMessageIdentifier)
+
+    def _read_config(self):
+        message_identifier = self._read_message_identifier()
+        assert(message_identifier == constants.GADGET_MESSAGE_CONFIG)
+        return self._parse_config(bytes(read_byte_string(self.socket)))
+
+    def _read_header(self):
+        message_identifier = self._read_message_identifier()
+        assert(message_identifier == constants.GADGET_MESSAGE_HEADER)
+        return self._parse_header(bytes(read_byte_string(self.socket)))
+
+    @staticmethod
+    def _parse_config(config_bytes):
+        try:
+            parsed_config  = xml.fromstring(config_bytes)
+        except xml.ParseError as e:
+            logging.log(logging.WARN,"Config parsing failed with error message {}".format(e))
+            parsed_config = None
+
+        return parsed_config, config_bytes
+
+    @staticmethod
+    def _parse_header(header_bytes):
+        return ismrmrd.xsd.CreateFromDocument(header_bytes), header_bytes
@@ -0,0 +1,219 @@
+
+import math
+import ctypes
+import struct
+
+import ismrmrd
+
+from . import constants
+from .headers import acquisition_header_dtype, image_header_dtype, waveform_header_dtype
+
+from ..types.recon_data import SamplingDescription
+from ..types.acquisition_bucket import bucket_meta
+
+
+class RawMessage:
+    """ A message passed through without being deserialized.
+
+    Holds the message identifier, and the serialized message body as a list of byte chunks, exactly
+    as they were read from the connection.
+    """
+
+    def __init__(self, mid, chunks):
+        self.mid = mid
+        self.chunks = chunks
+
+    @property
+    def nbytes(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+
+def write_raw_message(destination, message):
+    destination.write(constants.GadgetMessageIdentifier.pack(message.mid))
+    for chunk in message.chunks:
+        destination.write(chunk)
+
+
+# Skimmers find the end of a message, decoding only its length fields. They are generators: each yields the
+# number of bytes it needs next, and is sent those bytes in return. They are independent of how the bytes
+# are read; `skim` drives them from a blocking source, and `AsyncConnection` from an asyncio stream.
+
+def _uint64():
+    return constants.uint64.unpack((yield constants.uint64.size))[0]
+
+
+def _flag():
+    return constants.bool.unpack((yield constants.bool.size))[0]
+
+
+def _field(dtype, name):
+    # Offset and struct of a scalar (or fixed-size array) header field, for use with `unpack_from`.
+    field_dtype, offset = dtype.fields[name][:2]
+    base, shape = field_dtype.base, field_dtype.shape
+    return offset, struct.Struct('<' + str(math.prod(shape)) + base.char)
+
+
+_acquisition_samples = _field(acquisition_header_dtype, 'number_of_samples')
+_acquisition_channels = _field(acquisition_header_dtype, 'active_channels')
+_acquisition_trajectory_dimensions = _field(acquisition_header_dtype, 'trajectory_dimensions')
+
+_image_data_type = _field(image_header_dtype, 'data_type')
+_image_matrix_size = _field(image_header_dtype, 'matrix_size')
+_image_channels = _field(image_header_dtype, 'channels')
+
+_waveform_samples = _field(waveform_header_dtype, 'number_of_samples')
+_waveform_channels = _field(waveform_header_dtype, 'channels')
+
+# Sizes of image data elements on the wire.
+_image_data_sizes = {
+    ismrmrd.DATATYPE_USHORT: 2,
+    ismrmrd.DATATYPE_SHORT: 2,
+    ismrmrd.DATATYPE_UINT: 4,
+    ismrmrd.DATATYPE_INT: 4,
+    ismrmrd.DATATYPE_FLOAT: 4,
+    ismrmrd.DATATYPE_DOUBLE: 8,
+    ismrmrd.DATATYPE_CXFLOAT: 8,
+    ismrmrd.DATATYPE_CXDOUBLE: 16
+}
+
+
+def _unpack(header, field):
+    offset, layout = field
+    values = layout.unpack_from(header, offset)
+    return values if len(values) > 1 else values[0]
+
+
+def _skim_acquisition():
+    header = yield acquisition_header_dtype.itemsize
+    samples = _unpack(header, _acquisition_samples)
+    yield (samples * _unpack(header, _acquisition_trajectory_dimensions) * 4 +
+           samples * _unpack(header, _acquisition_channels) * 8)
+
+
+def _skim_waveform():
+    header = yield waveform_header_dtype.itemsize
+    yield _unpack(header, _waveform_samples) * _unpack(header, _waveform_channels) * 4
+
+
+def _skim_image():
+    header = yield image_header_dtype.itemsize
+    yield (yield from _uint64())
+    yield (math.prod(_unpack(header, _image_matrix_size)) *
+           _unpack(header, _image_channels) *
+           _image_data_sizes[_unpack(header, _image_data_type)])
+
+
+def _skim_array(itemsize):
+    count = yield from _uint64()
+    dimensions = struct.unpack('<' + str(count) + 'Q', (yield count * constants.uint64.size))
+    yield math.prod(dimensions) * itemsize
+
+
+def _skim_image_array():
+    yield from _skim_array(8)
+    yield from _skim_array(image_header_dtype.itemsize)
+    for _ in range((yield from _uint64())):
+        yield (yield from _uint64())
+    if (yield from _flag()):
+        for _ in range((yield from _uint64())):
+            yield from _skim_waveform()
+    if (yield from _flag()):
+        yield from _skim_array(acquisition_header_dtype.itemsize)
+
+
+def _skim_recon_buffer():
+    yield from _skim_array(8)
+    if (yield from _flag()):
+        yield from _skim_array(4)
+    if (yield from _flag()):
+        yield from _skim_array(4)
+    yield from _skim_array(acquisition_header_dtype.itemsize)
+    yield ctypes.sizeof(SamplingDescription)
+
+
+def _skim_recon_data():
+    for _ in range((yield from _uint64())):
+        yield from _skim_recon_buffer()
+        if (yield from _flag()):
+            yield from _skim_recon_buffer()
+
+
+def _skim_acquisition_bucket():
+    meta = bucket_meta.from_buffer_copy((yield ctypes.sizeof(bucket_meta)))
+    yield sum([
+        meta.data.header_bytes, meta.data.trajectory_bytes, meta.data.data_bytes, meta.data_stats.nbytes,
+        meta.reference.header_bytes, meta.reference.trajectory_bytes, meta.reference.data_bytes,
+        meta.reference_stats.nbytes,
+        meta.waveforms.header_bytes, meta.waveforms.data_bytes
+    ])
+
+
+skimmers = {
+    constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION: _skim_acquisition,
+    constants.GADGET_MESSAGE_ISMRMRD_WAVEFORM: _skim_waveform,
+    constants.GADGET_MESSAGE_ISMRMRD_IMAGE: _skim_image,
+    constants.GADGET_MESSAGE_IMAGE_ARRAY: _skim_image_array,
+    constants.GADGET_MESSAGE_RECON_DATA: _skim_recon_data,
+    constants.GADGET_MESSAGE_BUCKET: _skim_acquisition_bucket
+}
+
+header_types = {
+    constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION: ismrmrd.AcquisitionHeader,
+    constants.GADGET_MESSAGE_ISMRMRD_WAVEFORM: ismrmrd.WaveformHeader,
+    constants.GADGET_MESSAGE_ISMRMRD_IMAGE: ismrmrd.ImageHeader
+}
+
+
+def skim(source, skimmer):
+    """ Read a message from a blocking source, as far as a skimmer asks.
+
+    :param source: Source positioned at the start of the message body.
+    :param skimmer: A skimmer for the message, e.g. `skimmers[mid]()`.
+    :return: The byte chunks read, in order.
+    """
+    chunks = []
+    nbytes = next(skimmer)
+    try:
+        while True:
+            chunks.append(source.read(nbytes))
+            nbytes = skimmer.send(chunks[-1])
+    except StopIteration:
+        return chunks
+
+
+def read_raw_message(source, mid):
+    """ Read the body of a message without deserializing it.
+
+    :param source: Source positioned just after the message identifier.
+    :param mid: The message identifier; must be a key in `skimmers`.
+    :return: A `RawMessage`.
+    """
+    return RawMessage(mid, skim(source, skimmers[mid]()))
+
+
+class MessageFilter:
+    """ Selects messages by message identifier, and optionally by header, before they are deserialized.
+
+    :param mids: Message identifiers of the messages accepted.
+    :param predicate: Optional predicate, called with the header of acquisitions, images, and waveforms
+    (an `ismrmrd.AcquisitionHeader`, `ismrmrd.ImageHeader`, or `ismrmrd.WaveformHeader`). Such messages are
+    accepted only if it returns a truthy value.
+
+    Headers are peeked from the source, and not consumed. Messages that cannot be skimmed (i.e. with no
+    entry in `skimmers`) are always accepted.
+    """
+
+    def __init__(self, mids, predicate=None):
+        self.mids = frozenset(mids)
+        self.predicate = predicate
+
+    def accepts(self, mid, source):
+        if mid not in skimmers:
+            return True
+        if mid not in self.mids:
+            return False
+        if self.predicate is None or mid not in header_types:
+            return True
+
+        header_type = header_types[mid]
+        return self.predicate(header_type.from_buffer_copy(source.peek(ctypes.sizeof(header_type))))
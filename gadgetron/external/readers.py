@@ -5,7 +5,9 @@ import functools
 
 import numpy
 
+from . import storage
 from . import constants
+from . import headers
 
 
 def read(source, type):
@@ -17,17 +19,32 @@ def read_optional(source, continuation, *args, **kwargs):
     return continuation(source, *args, **kwargs) if is_present else None
 
 
+def read_into(source, array):
+    """ Fill a preallocated, contiguous array with data from source, in memory order.
+
+    Sources providing `readinto` receive directly into the array's memory; other sources
+    are read in chunks, and the bytes copied into place. The array is returned.
+    """
+    destination = array.ravel(order='A').view(numpy.uint8)
+    if hasattr(source, 'readinto'):
+        source.readinto(destination)
+    else:
+        for chunk in storage.chunks(destination):
+            chunk[:] = numpy.frombuffer(source.read(chunk.nbytes), dtype=numpy.uint8)
+    return array
+
+
 def read_vector(source, numpy_type=numpy.uint64):
     size = read(source, constants.uint64)
-    dtype = numpy.dtype(numpy_type)
-    return numpy.frombuffer(source.read(size * dtype.itemsize), dtype=dtype)
+    return read_into(source, numpy.empty(size, dtype=numpy_type))
 
 
 def read_array(source, numpy_type=numpy.uint64):
-    dtype = numpy.dtype(numpy_type)
-    dimensions = read_vector(source)
-    elements = int(functools.reduce(lambda a, b: a * b, dimensions))
-    return numpy.reshape(numpy.frombuffer(source.read(elements * dtype.itemsize), dtype=dtype), dimensions, order='F')
+    """ Read an array. Arrays above the configured size threshold are backed by a temporary
+    memory-mapped file rather than memory; see `storage.configure`.
+    """
+    dimensions = tuple(int(d) for d in read_vector(source))
+    return read_into(source, storage.empty(dimensions, numpy_type))
 
 
 def read_object_array(source, read_object):
@@ -37,6 +54,16 @@ def read_object_array(source, read_object):
                          order='F')
 
 
+def read_header_array(source, dtype, as_objects=False):
+    """ Read an array of headers in a single bulk operation.
+
+    :param dtype: Structured header dtype, e.g. `headers.acquisition_header_dtype`.
+    :param as_objects: Return an object array of ismrmrd header objects instead of a structured array.
+    """
+    header_array = read_array(source, dtype)
+    return headers.header_objects(header_array) if as_objects else header_array
+
+
 def read_image_header(source):
     header_bytes = source.read(ctypes.sizeof(ismrmrd.ImageHeader))
     return ismrmrd.ImageHeader.from_buffer_copy(header_bytes)
@@ -71,4 +98,9 @@ def read_waveform(source):
 
 
 def read_image(source):
-    return ismrmrd.Image.deserialize_from(source.read)
+    # The attribute string is handled as bytes; some sources return memoryviews for large reads.
+    return ismrmrd.Image.deserialize_from(lambda nbytes: _as_bytes(source.read(nbytes)))
+
+
+def _as_bytes(data):
+    return bytes(data) if isinstance(data, memoryview) else data
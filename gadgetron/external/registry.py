@@ -0,0 +1,97 @@
+
+class Codecs:
+    """ Readers keyed by message identifier, and writers keyed by item type.
+
+    :param parent: Codecs consulted for message identifiers and types not registered here.
+
+    Writers are looked up along the method resolution order of an item's type; a writer registered for
+    a base class serves its subclasses as well. Writer lookups are cached per concrete type. Registrations
+    in a child take precedence over registrations in its parent.
+    """
+
+    # Bumped whenever a writer is registered anywhere, invalidating the lookup caches of all registries.
+    generation = 0
+
+    def __init__(self, parent=None):
+        self.parent = parent
+
+        self.readers = {}
+        self.writers = {}
+
+        self.cache = {}
+        self.cache_generation = None
+
+    def add_reader(self, mid, reader):
+        self.readers[mid] = reader
+
+    def add_writer(self, cls, writer):
+        self.writers[cls] = writer
+        Codecs.generation += 1
+
+    def lineage(self):
+        """ These codecs, followed by their parents; in order of precedence. """
+        codecs = self
+        while codecs is not None:
+            yield codecs
+            codecs = codecs.parent
+
+    def reader(self, mid):
+        """ Find the reader for a message identifier.
+
+        :return: The reader, or None if no reader is registered.
+        """
+        reader = self.readers.get(mid)
+        if reader is None and self.parent is not None:
+            return self.parent.reader(mid)
+        return reader
+
+    def writer(self, cls):
+        """ Find the writer for items of a type.
+
+        :return: The writer, or None if no writer is registered for the type, nor any of its base classes.
+        """
+        if self.cache_generation != Codecs.generation:
+            self.cache.clear()
+            self.cache_generation = Codecs.generation
+        try:
+            return self.cache[cls]
+        except KeyError:
+            writer = self.cache[cls] = self._resolve_writer(cls)
+            return writer
+
+    def _resolve_writer(self, cls):
+        for base in cls.__mro__:
+            if base in self.writers:
+                return self.writers[base]
+        if self.parent is not None:
+            return self.parent._resolve_writer(cls)
+        return None
+
+
+# The built-in codecs; populated by the connection module.
+defaults = Codecs()
+
+# Codecs shared by all connections in the process.
+codecs = Codecs(parent=defaults)
+
+
+def register_reader(mid, reader):
+    """ Register a reader for all connections in the process.
+
+    :param mid: The ISMRMRD Message ID for which the reader is called.
+    :param reader: Reader function, called with the connection's source when `mid` is encountered.
+
+    Readers added to a connection with `Connection.add_reader` take precedence.
+    """
+    codecs.add_reader(mid, reader)
+
+
+def register_writer(cls, writer):
+    """ Register a writer for all connections in the process.
+
+    :param cls: Type of the items serialized by the writer. The writer also serves subclasses.
+    :param writer: Writer function, called with the connection's destination and the item.
+
+    Writers added to a connection with `Connection.add_writer` take precedence.
+    """
+    codecs.add_writer(cls, writer)
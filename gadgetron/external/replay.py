@@ -0,0 +1,98 @@
+
+import mmap
+import logging
+
+from . import constants
+from .connection import Connection
+
+
+class ReplaySource:
+    """ Source replaying a recorded inbound stream, in place of a socket.
+
+    The recording is memory-mapped. Reads of `zero_copy_threshold` bytes or more return read-only
+    memoryview slices of the mapping, without copying; smaller reads return bytes. `readinto` copies
+    straight from the mapping into the destination.
+
+    Items sent by the handler are written to `output`, if provided, and discarded otherwise.
+
+    The mapping is closed by `close`, or on leaving a `with` block. Slices returned by `read` must be
+    released by then; those still referenced keep the mapping open until they are.
+    """
+
+    zero_copy_threshold = 64 * 1024
+
+    def __init__(self, path, output=None):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.position = 0
+
+        self.output = open(output, 'wb') if output else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+    def read(self, nbytes):
+        data = self._take(nbytes)
+        return data if nbytes >= self.zero_copy_threshold else bytes(data)
+
+    def readinto(self, destination):
+        view = memoryview(destination).cast('B')
+        view[:] = self._take(len(view))
+        return len(view)
+
+    def peek(self, nbytes):
+        if self.position + nbytes > len(self.view):
+            raise EOFError("End of recorded stream.")
+        return self.view[self.position:self.position + nbytes]
+
+    def write(self, byte_array):
+        if self.output:
+            self.output.write(byte_array)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.output:
+            self.output.write(constants.GadgetMessageIdentifier.pack(constants.GADGET_MESSAGE_CLOSE))
+            self.output.close()
+            self.output = None
+
+        if self.map is None:
+            return
+
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # Items still hold slices of the mapping; it is unmapped once they are released.
+            logging.debug("Recording still referenced by items; unmapped when they are released.")
+        self.view, self.map = None, None
+
+    def _take(self, nbytes):
+        start, end = self.position, self.position + nbytes
+        if end > len(self.view):
+            raise EOFError("End of recorded stream.")
+        self.position = end
+        return self.view[start:end]
+
+
+def replay(path, handler, *args, output=None, **kwargs):
+    """
+    Replays a recorded stream, invoking the handler with a connection reading from it
+    :param path: Path of a stream recorded by a Connection (see `Connection`, `record`)
+    :param handler: Callable which takes a connection and the remaining args
+    :param output: Optional path of a file to which the items sent by the handler are written
+    :param args:
+    :param kwargs:
+
+    Runs the handler offline, as fast as it can consume the recording.
+    """
+    logging.debug(f"Replaying stream '{path}' to handler '{handler.__name__}'")
+
+    with Connection(ReplaySource(path, output)) as conn:
+        handler(conn, *args, **kwargs)
@@ -0,0 +1,84 @@
+
+import os
+import tempfile
+
+import numpy
+
+threshold = None
+directory = None
+chunk_size = 64 * 1024 * 1024
+
+_unchanged = object()
+
+
+def configure(memmap_threshold=_unchanged, memmap_directory=_unchanged, chunk_bytes=_unchanged):
+    """ Configure out-of-core storage of large arrays. Settings not passed are left as they are.
+
+    :param memmap_threshold: Arrays larger than this many bytes are read into temporary, memory-mapped files
+    rather than memory. None disables memory-mapping.
+    :param memmap_directory: Directory in which the temporary files are created; the system default if None.
+    :param chunk_bytes: Size of the chunks in which large arrays are written.
+
+    The defaults are read from the GADGETRON_MEMMAP_THRESHOLD and GADGETRON_MEMMAP_DIRECTORY environment variables.
+    """
+    global threshold, directory, chunk_size
+    if memmap_threshold is not _unchanged:
+        threshold = memmap_threshold
+    if memmap_directory is not _unchanged:
+        directory = memmap_directory
+    if chunk_bytes is not _unchanged:
+        chunk_size = chunk_bytes
+
+
+def is_large(nbytes):
+    return threshold is not None and nbytes > threshold
+
+
+def empty(shape, dtype, order='F'):
+    """ Allocate an uninitialized array; memory-mapped onto an anonymous temporary file if it is large.
+
+    The temporary file is unlinked when created; its storage is released with the last reference to the array.
+    """
+    dtype = numpy.dtype(dtype)
+    nbytes = dtype.itemsize * int(numpy.prod(shape, dtype=numpy.int64))
+    if not is_large(nbytes):
+        return numpy.empty(shape, dtype=dtype, order=order)
+
+    with tempfile.TemporaryFile(dir=directory) as file:
+        return numpy.memmap(file, dtype=dtype, mode='w+', shape=shape, order=order)
+
+
+def chunks(array, itemsize=None):
+    """ Split an array into Fortran-ordered pieces of at most `chunk_size` bytes.
+
+    Pieces are views, taken along the slowest varying (last) axes; concatenating them in order,
+    each in Fortran order, yields the elements of the array in Fortran order.
+
+    :param itemsize: Size of the elements, if they are to be converted; that of the array otherwise.
+    """
+    elements = max(1, chunk_size // (itemsize or array.itemsize))
+
+    if array.size <= elements or array.ndim == 0:
+        yield array
+    elif array.ndim == 1:
+        for start in range(0, len(array), elements):
+            yield array[start:start + elements]
+    else:
+        last = array.shape[-1]
+        slab = array.size // last
+        if slab > elements:
+            for index in range(last):
+                yield from chunks(array[..., index], itemsize)
+        else:
+            step = elements // slab
+            for start in range(0, last, step):
+                yield array[..., start:start + step]
+
+
+def _environment_threshold():
+    value = os.environ.get('GADGETRON_MEMMAP_THRESHOLD')
+    return int(value) if value else None
+
+
+configure(memmap_threshold=_environment_threshold(),
+          memmap_directory=os.environ.get('GADGETRON_MEMMAP_DIRECTORY'))
@@ -1,7 +1,9 @@
 
 import numpy as np
 
+from ..external import storage
 from ..external import constants
+from ..external import headers
 
 
 def write_optional(destination, optional, continuation, *args, **kwargs):
@@ -13,15 +15,30 @@ def write_optional(destination, optional, continuation, *args, **kwargs):
 
 
 def write_vector(destination, values, type=constants.uint64):
-    destination.write(constants.uint64.pack(len(values)))
-    for val in values:
-        destination.write(type.pack(val))
+    destination.write(constants.uint64.pack(len(values)) + b''.join(map(type.pack, values)))
+
+
+def fortran_bytes(array):
+    """ Byte view of an array's elements in Fortran order.
+
+    No copy is made if the array is already Fortran-contiguous.
+    """
+    return array.ravel(order='F').view(np.uint8)
 
 
 def write_array(destination, array, dtype):
+    """ Write an array. Arrays above the configured size threshold are written, and flushed, in chunks;
+    converting a chunk at a time, and without reading a memory-mapped array into memory as a whole.
+    """
     write_vector(destination, array.shape)
-    array_view = np.array(array,dtype=dtype,copy=False)
-    destination.write(array_view.tobytes(order='F'))
+    itemsize = np.dtype(dtype).itemsize
+    if not storage.is_large(array.size * itemsize):
+        destination.write(fortran_bytes(np.asarray(array, dtype=dtype)))
+        return
+
+    for chunk in storage.chunks(array, itemsize):
+        destination.write(fortran_bytes(np.asarray(chunk, dtype=dtype)))
+        destination.flush()
 
 
 def write_object_array(destination, array, writer, *args, **kwargs):
@@ -31,6 +48,16 @@ def write_object_array(destination, array, writer, *args, **kwargs):
         writer(destination, item, *args, **kwargs)
 
 
+def write_header_array(destination, header_array, dtype):
+    """ Write an array of headers in a single bulk operation.
+
+    Accepts structured header arrays, as well as object arrays of ismrmrd header objects.
+    """
+    if header_array.dtype == object:
+        header_array = headers.header_array(header_array, dtype)
+    write_array(destination, header_array, dtype)
+
+
 def write_acquisition_header(destination, header):
     destination.write(header)
 
@@ -2,4 +2,4 @@
 
 from .gadget import Gadget
 
-__all__ = [Gadget]
+__all__ = ['Gadget']
@@ -1,22 +1,33 @@
 
 import numpy
 import ismrmrd
+import inspect
 import logging
+import itertools
 
 from ..external import constants
 from ..external import handlers
+from ..external.headers import acquisition_header_dtype, header_array
+from ..util.batch import batches, gather
+
+
+def _transform_to_legacy_item(item):
+    return item,
 
 
 def _transform_to_legacy_acquisition(acquisition):
     return acquisition.getHead(), numpy.transpose(acquisition.data)
 
 
-def _transform_from_legacy_acquisition(items):
+def _transform_from_legacy_acquisition(items, copy=False):
+    # The transposed data is used as the acquisition's data, without copying, unless it must be converted,
+    # or a copy is asked for.
     header, data = items
+    if copy:
+        header = ismrmrd.AcquisitionHeader.from_buffer_copy(header)
     header.number_of_samples, header.active_channels = data.shape
-    acquisition = ismrmrd.Acquisition(header)
-    acquisition.data[:] = numpy.transpose(data)
-    return acquisition
+    convert = numpy.array if copy else numpy.asarray
+    return ismrmrd.Acquisition(header, convert(numpy.transpose(data), dtype=numpy.complex64))
 
 
 def _transform_to_legacy_waveform(waveform):
@@ -27,13 +38,69 @@ def _transform_to_legacy_image(image):
     return image.getHead(), numpy.transpose(image.data), image.attribute_string
 
 
-def _transform_from_legacy_image(items):
+def _transform_from_legacy_image(items, copy=False):
+    # The transposed data is reshaped, and used as the image's data, without copying where the layout allows,
+    # unless a copy is asked for. The header is always copied by `ismrmrd.Image`.
     items = list(items) + [""]
     header, data, meta = items[:3]
     header.attribute_string_len = len(meta)
-    image = ismrmrd.Image(header, meta)
-    image.data[:] = numpy.reshape(numpy.transpose(data), image.data.shape)
-    return image
+    shape = (header.channels, header.matrix_size[2], header.matrix_size[1], header.matrix_size[0])
+    convert = numpy.array if copy else numpy.asarray
+    data = convert(numpy.transpose(data), dtype=ismrmrd.image.get_dtype_from_data_type(header.data_type))
+    return ismrmrd.Image(header, meta, data=numpy.reshape(data, shape))
+
+
+class AcquisitionBatch:
+    """ Acquisitions passed to `Gadget.put_next_batch`; sent to the client in a single write. """
+
+    def __init__(self, headers, data):
+        self.headers = headers
+        self.data = data
+
+
+def _header_objects(headers):
+    objects = numpy.empty(len(headers), dtype=object)
+    for index, header in enumerate(headers):
+        objects[index] = header
+    return objects
+
+
+def _gather_legacy_acquisitions(acquisitions):
+    # The data is gathered through a (channels, acquisitions, samples) view of the legacy layout.
+    channels, samples = acquisitions[0].data.shape
+    headers = header_array(_header_objects([acquisition.getHead() for acquisition in acquisitions]))
+    data = numpy.empty((len(acquisitions), samples, channels), dtype=numpy.complex64)
+    gather(acquisitions, out=numpy.transpose(data, (2, 0, 1)))
+    return headers, data
+
+
+def write_acquisition_batch(destination, batch):
+    # As for single legacy acquisitions, trajectories are not carried through; zeros are sent, sliced from
+    # a single buffer.
+    headers = numpy.array(batch.headers, dtype=acquisition_header_dtype, ndmin=1)
+    headers['number_of_samples'], headers['active_channels'] = batch.data.shape[1:]
+    data = numpy.ascontiguousarray(numpy.transpose(batch.data, (0, 2, 1)), dtype=numpy.complex64)
+
+    trajectory_bytes = 4 * headers['number_of_samples'].astype(int) * headers['trajectory_dimensions'].astype(int)
+    zeros = memoryview(bytes(int(trajectory_bytes.max(initial=0))))
+
+    message_id_bytes = constants.GadgetMessageIdentifier.pack(constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION)
+    for header, nbytes, acquisition_data in zip(headers, trajectory_bytes, data):
+        destination.write(message_id_bytes)
+        destination.write(header.tobytes())
+        if nbytes:
+            destination.write(zeros[:nbytes])
+        destination.write(acquisition_data)
+
+
+def _positional_arity(function):
+    """ Number of positional arguments required by a callable, and the number it accepts; None if unbounded. """
+    parameters = inspect.signature(function).parameters.values()
+    positional = [p for p in parameters if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]
+    required = len([p for p in positional if p.default is p.empty])
+    if any(p.kind == p.VAR_POSITIONAL for p in parameters):
+        return required, None
+    return required, len(positional)
 
 
 def _parse_params(xml):
@@ -52,6 +119,12 @@ class Gadget:
         (lambda args: isinstance(args[0], ismrmrd.ImageHeader), _transform_from_legacy_image)
     ]
 
+    # Writer transformations, resolved by the type of the first argument to `put_next`.
+    _writer_cache = {}
+
+    # Maximum number of acquisitions passed to `process_batch` at a time.
+    batch_size = 64
+
     @ classmethod
     def __init_subclass__(cls, **kwargs):
         handlers.register_handler(lambda conn: cls().handle(conn))
@@ -64,30 +137,47 @@ class Gadget:
                 self._process_waveform if hasattr(self, 'process_waveform') else self._ignore_waveform
         }
 
+        if hasattr(self, 'process_batch'):
+            self.hooks[constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION] = self._process_batch
+
     def handle(self, connection):
         self.connection = connection
         self.params = _parse_params(connection.config)
         self.process_config(connection.raw_bytes.header)
 
-        def invoke_process(process, args):
-            if not args:
-                raise ValueError()
-            try:
-                process(*args)
-            except TypeError:
-                invoke_process(process, args[:-1])
-
-        for mid, item in connection.iter_with_mids():
-            if mid in self.hooks:
-                self.hooks.get(mid)(item)
-            else:
-                transformation = Gadget._reader_transformations.get(mid, lambda x: [x])
-                args = transformation(item)
-                try:
-                    invoke_process(self.process, args)
-                except ValueError:
-                    raise TypeError(f"Failed to invoke self.process; arguments do not match. Had arguments: "
-                                    f"{[type(a) for a in args]}")
+        connection.add_writer(AcquisitionBatch, write_acquisition_batch)
+
+        messages = connection.iter_with_mids()
+        if hasattr(self, 'process_batch'):
+            messages = self._batch_acquisitions(messages)
+
+        arity, dispatch = _positional_arity(self.process), {}
+        for mid, item in messages:
+            if mid not in dispatch:
+                dispatch[mid] = self._dispatcher(mid, arity)
+            dispatch[mid](item)
+
+    def _dispatcher(self, mid, arity):
+        """ Resolve how messages of a given type are passed to the gadget; once per message type.
+
+        Legacy gadgets declare `process` with as many of the legacy arguments (e.g. header, data, and meta
+        for images) as they need. The arguments accepted are read from the signature of `process`, and
+        surplus arguments are dropped.
+        """
+        if mid in self.hooks:
+            return self.hooks[mid]
+
+        transformation = Gadget._reader_transformations.get(mid, _transform_to_legacy_item)
+        process, (required, accepted) = self.process, arity
+
+        def invoke_process(item):
+            args = transformation(item)
+            if accepted == 0 or len(args) < required:
+                raise TypeError(f"Failed to invoke self.process; arguments do not match. Had arguments: "
+                                f"{[type(a) for a in args]}")
+            process(*args[:accepted])
+
+        return invoke_process
 
     def process_config(self, config):
         pass
@@ -98,13 +188,61 @@ class Gadget:
     def wait(self):
         pass
 
+    def put_next_batch(self, headers, data):
+        """ Send a batch of acquisitions, in a single write.
+
+        :param headers: Structured array of acquisition headers (see `gadgetron.external.headers`), or a
+        sequence of `ismrmrd.AcquisitionHeader`.
+        :param data: Array of shape (acquisitions, samples, channels), as passed to `process_batch`.
+        """
+        if not isinstance(headers, numpy.ndarray):
+            headers = header_array(_header_objects(headers), dtype=acquisition_header_dtype)
+        elif self._sent_later():
+            headers = numpy.array(headers)
+        if self._sent_later():
+            data = numpy.array(data)
+        self.connection.send(AcquisitionBatch(headers, data))
+
     def put_next(self, *args):
-        transformation = next((trans for pred, trans in Gadget._writer_transformation if pred(args)), lambda x: x[0])
-        self.connection.send(transformation(args))
+        """ Send an item, or the legacy arguments of an acquisition or image (header, data, and meta).
+
+        Acquisition and image headers and data are sent without copying where possible. If the connection
+        serializes items in the background (see `Connection.pipeline`), they are copied first, so the gadget
+        may reuse or modify its buffers as soon as `put_next` returns. Other items are sent as they are, and
+        must not be modified once sent.
+        """
+        transformation = Gadget._writer_cache.get(type(args[0]))
+        if transformation is None:
+            transformation = next((trans for pred, trans in Gadget._writer_transformation if pred(args)),
+                                  lambda items, copy: items[0])
+            Gadget._writer_cache[type(args[0])] = transformation
+        self.connection.send(transformation(args, copy=self._sent_later()))
+
+    def _sent_later(self):
+        return getattr(self.connection, 'write_behind', None) is not None
 
     def _ignore_waveform(self, waveform):
         self.connection.send(waveform)
 
+    def _batch_acquisitions(self, messages):
+        # Gadgets defining `process_batch(headers, data)` receive acquisitions in batches, as formed by
+        # `gadgetron.util.batch.batches`, of at most `batch_size` acquisitions. Runs of consecutive acquisitions
+        # are batched, so a batch is also processed before any other type of message, and at the end of the
+        # stream. Headers are passed as a structured array, and data as a contiguous (acquisitions, samples,
+        # channels) array.
+        def is_acquisition(message):
+            return message[0] == constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION
+
+        for acquisitions, run in itertools.groupby(messages, key=is_acquisition):
+            if not acquisitions:
+                yield from run
+                continue
+            for batch in batches((acquisition for _, acquisition in run), self.batch_size):
+                yield constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION, batch
+
+    def _process_batch(self, acquisitions):
+        self.process_batch(*_gather_legacy_acquisitions(acquisitions))
+
     def _process_waveform(self, waveform):
         self.process_waveform(waveform)
     
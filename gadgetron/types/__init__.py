@@ -1,6 +1,10 @@
 
+# The connection registers the readers and writers of these types, which in turn use the external readers
+# and writers; the external package is imported first, so the cycle resolves the same way for either entry point.
+from .. import external
+
 from .image_array import ImageArray
 from .acquisition_bucket import  AcquisitionBucket
 from .recon_data import  ReconData
 
-__all__ = [ImageArray]
+__all__ = ['ImageArray']
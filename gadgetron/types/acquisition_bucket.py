@@ -4,15 +4,19 @@ import logging
 
 import numpy as np
 
-from ismrmrd import Acquisition, Waveform
+from ismrmrd import Acquisition, AcquisitionHeader, Waveform
 
-from ..external.constants import uint64
-from gadgetron.external.readers import read, read_acquisition_header, read_vector, read_waveform_header
+from ..external.constants import uint64, GadgetMessageIdentifier, GADGET_MESSAGE_BUCKET
+from gadgetron.external.headers import acquisition_header_dtype, waveform_header_dtype
+from gadgetron.external.readers import read, read_into, read_vector
 from gadgetron.external.writers import write_optional, write_array, write_object_array, write_acquisition_header
 
 
 class AcquisitionBucketStats:
 
+    fields = ['kspace_encode_step_1', 'kspace_encode_step_2', 'slice', 'phase', 'contrast', 'repetition',
+              'set', 'segment', 'average']
+
     def __init__(self, kspace_encode_step_1={}, kspace_encode_step_2={}, slice={}, phase={}, contrast={}, repetition={},
                  set={}, segment={}, average={}):
         self.kspace_encode_step_1 = kspace_encode_step_1
@@ -26,6 +30,105 @@ class AcquisitionBucketStats:
         self.set = set
 
 
+class AcquisitionBundle:
+    """ Columnar representation of a set of acquisitions.
+
+    Headers are kept in a structured array (see `gadgetron.external.headers`), while k-space data and
+    trajectories are kept as single contiguous complex64 and float32 blocks. The data of acquisition `i`
+    is found in `data[data_offsets[i]:data_offsets[i + 1]]`, and likewise for trajectories.
+
+    Bundles behave as sequences of `ismrmrd.Acquisition`. Acquisitions are created on demand, and share
+    memory with the bundle; changes made to them are reflected in the bundle columns.
+    """
+
+    def __init__(self, headers, data, trajectory):
+        self.headers = headers
+        self.data = data
+        self.trajectory = trajectory
+
+        self.data_offsets = _offsets(headers['active_channels'], headers['number_of_samples'])
+        self.trajectory_offsets = _offsets(headers['number_of_samples'], headers['trajectory_dimensions'])
+
+        self.acquisitions = [None] * len(headers)
+
+    def __len__(self):
+        return len(self.headers)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+
+        index = range(len(self))[index]
+        if self.acquisitions[index] is None:
+            self.acquisitions[index] = Acquisition(
+                AcquisitionHeader.from_buffer(self.headers, index * self.headers.itemsize),
+                self.acquisition_data(index),
+                self.acquisition_trajectory(index)
+            )
+        return self.acquisitions[index]
+
+    def acquisition_data(self, index):
+        """ View of the k-space data of acquisition `index`, shaped (channels, samples). """
+        header = self.headers[index]
+        return self.data[self.data_offsets[index]:self.data_offsets[index + 1]].reshape(
+            header['active_channels'], header['number_of_samples'])
+
+    def acquisition_trajectory(self, index):
+        """ View of the trajectory of acquisition `index`, shaped (samples, trajectory dimensions). """
+        header = self.headers[index]
+        return self.trajectory[self.trajectory_offsets[index]:self.trajectory_offsets[index + 1]].reshape(
+            header['number_of_samples'], header['trajectory_dimensions'])
+
+    @staticmethod
+    def from_acquisitions(acquisitions):
+        """ Create a bundle from a sequence of `ismrmrd.Acquisition`. The acquisition data is copied. """
+        acquisitions = list(acquisitions)
+        headers = np.frombuffer(bytearray(b''.join(bytes(acq.getHead()) for acq in acquisitions)),
+                                dtype=acquisition_header_dtype)
+        return AcquisitionBundle(
+            headers,
+            np.concatenate([np.empty(0, dtype=np.complex64)] + [acq.data.ravel() for acq in acquisitions]),
+            np.concatenate([np.empty(0, dtype=np.float32)] + [acq.traj.ravel() for acq in acquisitions])
+        )
+
+    def consolidated(self):
+        """ Bundle whose columns reflect any changes made through its acquisitions.
+
+        Acquisitions modified in place need no consolidation; the bundle itself is returned unless an
+        acquisition has been resized, or had its data or trajectory replaced.
+        """
+        def in_place(index, acquisition):
+            return acquisition is None or (
+                _is_view(acquisition.data, self.data, self.data_offsets, index) and
+                _is_view(acquisition.traj, self.trajectory, self.trajectory_offsets, index))
+
+        if all(in_place(index, acquisition) for index, acquisition in enumerate(self.acquisitions)):
+            return self
+        return AcquisitionBundle.from_acquisitions(self)
+
+    def stacked_data(self):
+        """ View of all k-space data, shaped (acquisitions, channels, samples).
+
+        :raises: :class:`ValueError`: If the acquisitions do not all share the same number of channels and samples.
+        """
+        channels, samples = self.headers['active_channels'], self.headers['number_of_samples']
+        if len(self) and (np.any(channels != channels[0]) or np.any(samples != samples[0])):
+            raise ValueError("Acquisitions in bundle differ in number of channels or samples.")
+        return self.data.reshape(len(self), *((channels[0], samples[0]) if len(self) else (0, 0)))
+
+
+def _is_view(array, block, offsets, index):
+    return array.size == offsets[index + 1] - offsets[index] and (array.size == 0 or np.may_share_memory(array, block))
+
+
+def _offsets(*factors):
+    sizes = np.prod([np.asarray(factor, dtype=np.int64) for factor in factors], axis=0)
+    return np.concatenate(([0], np.cumsum(sizes, dtype=np.int64)))
+
+
 class AcquisitionBucket:
     def __init__(self, data, datastats, ref, refstats, waveforms):
         self.data = data
@@ -76,30 +179,27 @@ def read_bucketstats(source):
             for _ in range(count)]
 
 
-def read_waveforms(source, sizes):
-    headers = [read_waveform_header(source) for _ in range(sizes.count)]
-    data_arrays = [read_data_as_array(source, np.uint32, (header.channels, header.number_of_samples))
-                   for header in headers]
-    return [Waveform(head, data) for head, data in zip(headers, data_arrays)]
-
-
-def read_data_as_array(source, data_type, shape):
-    dtype = np.dtype(data_type)
-    bytesize = np.prod(shape) * dtype.itemsize
-    return np.reshape(np.frombuffer(source.read(bytesize), dtype), shape)
+def serialize_bucketstats(stats):
+    def serialize_set(values):
+        return uint64.pack(len(values)) + np.array(sorted(values), dtype=np.uint16).tobytes()
 
+    return uint64.pack(len(stats)) + b''.join(serialize_set(getattr(stat, field))
+                                              for stat in stats
+                                              for field in AcquisitionBucketStats.fields)
 
-def read_acquisitions(source, sizes):
-    headers = [read_acquisition_header(source) for _ in range(sizes.count)]
 
-    trajectories = [read_data_as_array(source, np.float32, (head.number_of_samples, head.trajectory_dimensions))
-                    if head.trajectory_dimensions > 0 else None
-                    for head in headers]
+def read_waveforms(source, sizes):
+    headers = read_into(source, np.empty(sizes.count, dtype=waveform_header_dtype))
+    data = read_into(source, np.empty(sizes.data_bytes // np.dtype(np.uint32).itemsize, dtype=np.uint32))
+    offsets = _offsets(headers['channels'], headers['number_of_samples'])
+    return [Waveform(header, data[start:end]) for header, start, end in zip(headers, offsets[:-1], offsets[1:])]
 
-    acqs = [read_data_as_array(source, np.complex64, (head.active_channels, head.number_of_samples))
-            for head in headers]
 
-    return [Acquisition(header, data, trajectory) for header, data, trajectory in zip(headers, acqs, trajectories)]
+def read_acquisitions(source, sizes):
+    headers = read_into(source, np.empty(sizes.count, dtype=acquisition_header_dtype))
+    trajectory = read_into(source, np.empty(sizes.trajectory_bytes // np.dtype(np.float32).itemsize, dtype=np.float32))
+    data = read_into(source, np.empty(sizes.data_bytes // np.dtype(np.complex64).itemsize, dtype=np.complex64))
+    return AcquisitionBundle(headers, data, trajectory)
 
 
 def read_acquisition_bucket(source):
@@ -114,3 +214,43 @@ def read_acquisition_bucket(source):
     )
 
 
+def _as_bundle(acquisitions):
+    if isinstance(acquisitions, AcquisitionBundle):
+        return acquisitions.consolidated()
+    return AcquisitionBundle.from_acquisitions(acquisitions)
+
+
+def _bundle_sizes(bundle):
+    return bundle_meta(len(bundle), bundle.headers.nbytes, bundle.data.nbytes, bundle.trajectory.nbytes)
+
+
+def write_bundle(destination, bundle):
+    destination.write(np.ascontiguousarray(bundle.headers, dtype=acquisition_header_dtype).view(np.uint8))
+    destination.write(np.ascontiguousarray(bundle.trajectory, dtype=np.float32).view(np.uint8))
+    destination.write(np.ascontiguousarray(bundle.data, dtype=np.complex64).view(np.uint8))
+
+
+def write_acquisition_bucket(destination, bucket):
+    data, reference = _as_bundle(bucket.data), _as_bundle(bucket.ref)
+    datastats, refstats = serialize_bucketstats(bucket.datastats), serialize_bucketstats(bucket.refstats)
+
+    waveform_headers = b''.join(bytes(waveform.getHead()) for waveform in bucket.waveforms)
+    waveform_data = b''.join(np.ascontiguousarray(waveform.data, dtype=np.uint32).tobytes()
+                             for waveform in bucket.waveforms)
+
+    meta = bucket_meta(
+        _bundle_sizes(data),
+        _bundle_sizes(reference),
+        stats_meta(len(datastats)),
+        stats_meta(len(refstats)),
+        waveform_meta(len(bucket.waveforms), len(waveform_headers), len(waveform_data))
+    )
+
+    destination.write(GadgetMessageIdentifier.pack(GADGET_MESSAGE_BUCKET))
+    destination.write(meta)
+    write_bundle(destination, data)
+    destination.write(datastats)
+    write_bundle(destination, reference)
+    destination.write(refstats)
+    destination.write(waveform_headers)
+    destination.write(waveform_data)
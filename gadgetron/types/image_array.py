@@ -1,8 +1,12 @@
+import ismrmrd
+import collections.abc
+
 import numpy as np
 
 from ..external import readers
 from ..external import writers
 from ..external import constants
+from ..external.headers import image_header_dtype, acquisition_header_dtype
 
 
 class ImageArray:
@@ -14,14 +18,98 @@ class ImageArray:
         self.acq_headers = acq_headers
 
 
+class MetaContainers(collections.abc.MutableSequence):
+    """ The meta containers of an ImageArray, parsed on demand.
+
+    Containers are kept as the serialized bytes they were read as. Each container is parsed into an
+    `ismrmrd.Meta` the first time it is accessed, and the result cached; modifying the returned Meta
+    modifies the container. Containers may also be replaced by `ismrmrd.Meta` objects, dicts, or strings.
+
+    When written, containers that have not been replaced or modified are sent as their original bytes,
+    without being serialized again.
+    """
+
+    def __init__(self, containers=()):
+        self.raw = list(containers)
+        self.parsed = [None] * len(self.raw)
+        self.snapshots = [None] * len(self.raw)
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        meta = self.parsed[index]
+        if meta is None:
+            meta = self.parsed[index] = ismrmrd.Meta.deserialize(bytes(self.raw[index]).rstrip(b'\0'))
+            self.snapshots[index] = _snapshot(meta)
+        return meta
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            indices = range(*index.indices(len(self)))
+            values = list(value)
+            if len(values) != len(indices) or index.step not in (None, 1):
+                raise ValueError("Meta containers can only be replaced one for one.")
+            for i, v in zip(indices, values):
+                self[i] = v
+            return
+
+        self.raw[index], self.parsed[index], self.snapshots[index] = None, _as_meta(value), None
+
+    def __delitem__(self, index):
+        del self.raw[index]
+        del self.parsed[index]
+        del self.snapshots[index]
+
+    def insert(self, index, value):
+        self.raw.insert(index, None)
+        self.parsed.insert(index, _as_meta(value))
+        self.snapshots.insert(index, None)
+
+    def serialized(self, index):
+        """ The serialized bytes of a container; the original bytes if the container is unchanged. """
+        meta = self.parsed[index]
+        if meta is None or (self.raw[index] is not None and _snapshot(meta) == self.snapshots[index]):
+            return self.raw[index]
+        return _serialize_meta(meta)
+
+
+def _as_meta(value):
+    if isinstance(value, ismrmrd.Meta):
+        return value
+    if isinstance(value, (str, bytes, bytearray)):
+        return ismrmrd.Meta.deserialize(value)
+    return ismrmrd.Meta(value)
+
+
+def _snapshot(meta):
+    return {key: list(value) if isinstance(value, list) else value for key, value in meta.items()}
+
+
+def _serialize_meta(container):
+    if isinstance(container, (bytes, bytearray)):
+        return container
+    if isinstance(container, str):
+        return container.encode('utf-8')
+    return ismrmrd.Meta(container).serialize().encode('utf-8')
+
 
 def read_meta_container(source):
-    return readers.read_byte_string(source, constants.uint64).decode('ascii')
+    return str(readers.read_byte_string(source, constants.uint64), 'ascii')
+
 
+def read_meta_container_vector(source, as_strings=False):
+    """ Read a vector of meta containers.
 
-def read_meta_container_vector(source):
+    :param as_strings: Return the containers as a list of strings, rather than as lazily parsed `MetaContainers`.
+    """
     size = readers.read(source, constants.uint64)
-    return [read_meta_container(source) for _ in range(size)]
+    if as_strings:
+        return [read_meta_container(source) for _ in range(size)]
+    return MetaContainers(readers.read_byte_string(source, constants.uint64) for _ in range(size))
 
 
 def read_waveforms(source):
@@ -29,24 +117,34 @@ def read_waveforms(source):
     return [readers.read_waveform(source) for _ in range(size)]
 
 
-def read_image_array(source):
+def read_image_array(source, headers_as_objects=False, meta_as_strings=False):
+    """ Read an ImageArray message.
+
+    Image and acquisition headers are read as structured arrays (see `gadgetron.external.headers`). Set
+    `headers_as_objects` to read them as object arrays of ismrmrd header objects instead.
+
+    Meta containers are read as `MetaContainers`, and only parsed when accessed. Set `meta_as_strings`
+    to read them as a list of XML strings instead.
+    """
     return ImageArray(
         data=readers.read_array(source, np.complex64),
-        headers=readers.read_object_array(source, readers.read_image_header),
-        meta=read_meta_container_vector(source),
+        headers=readers.read_header_array(source, image_header_dtype, headers_as_objects),
+        meta=read_meta_container_vector(source, meta_as_strings),
         waveform=readers.read_optional(source, read_waveforms),
         acq_headers=readers.read_optional(
-            source, readers.read_object_array, readers.read_acquisition_header)
+            source, readers.read_header_array, acquisition_header_dtype, headers_as_objects)
     )
 
 
 def write_meta_container(destination, container):
-    writers.write_byte_string(
-        destination, container.encode('ascii'), constants.uint64)
+    writers.write_byte_string(destination, _serialize_meta(container), constants.uint64)
 
 
 def write_meta_container_vector(destination, containers):
+    """ Write a vector of meta containers; `MetaContainers`, or a list of strings, dicts, or `ismrmrd.Meta`. """
     destination.write(constants.uint64.pack(len(containers)))
+    if isinstance(containers, MetaContainers):
+        containers = map(containers.serialized, range(len(containers)))
     for container in containers:
         write_meta_container(destination, container)
 
@@ -54,16 +152,16 @@ def write_meta_container_vector(destination, containers):
 def write_waveforms(destination, waveforms):
     destination.write(constants.uint64.pack(len(waveforms)))
     for waveform in waveforms:
-        writers.write_waveform(destination, waveform)
+        # Waveforms of an image array are not messages of their own; they carry no message identifier.
+        waveform.serialize_into(destination.write)
 
 
 def write_image_array(destination, image_array):
     destination.write(constants.GadgetMessageIdentifier.pack(
         constants.GADGET_MESSAGE_IMAGE_ARRAY))
     writers.write_array(destination, image_array.data, np.complex64)
-    writers.write_object_array(
-        destination, image_array.headers, writers.write_image_header)
+    writers.write_header_array(destination, image_array.headers, image_header_dtype)
     write_meta_container_vector(destination, image_array.meta)
     writers.write_optional(destination, image_array.waveform, write_waveforms)
     writers.write_optional(destination, image_array.acq_headers,
-                           writers.write_object_array, writers.write_acquisition_header)
+                           writers.write_header_array, acquisition_header_dtype)
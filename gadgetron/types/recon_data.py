@@ -3,8 +3,9 @@ import numpy
 import struct
 import ctypes
 
-from gadgetron.external.readers import read, read_optional, read_array, read_object_array, read_acquisition_header
-from gadgetron.external.writers import write_optional, write_array, write_object_array, write_acquisition_header
+from gadgetron.external.readers import read, read_optional, read_array, read_header_array
+from gadgetron.external.writers import write_optional, write_array, write_header_array
+from gadgetron.external.headers import acquisition_header_dtype
 from gadgetron.external.constants import uint64, GadgetMessageIdentifier, GADGET_MESSAGE_RECON_DATA
 
 uint16 = struct.Struct('<H')
@@ -61,30 +62,36 @@ def read_sampling_description(source):
     return SamplingDescription.from_buffer_copy(source.read(ctypes.sizeof(SamplingDescription)))
 
 
-def read_recon_buffer(source):
+def read_recon_buffer(source, headers_as_objects=False):
 
     data = read_array(source, numpy.complex64)
     trajectory = read_optional(source, read_array, numpy.float32)
     density = read_optional(source, read_array, numpy.float32)
-    headers = read_object_array(source, read_acquisition_header)
+    headers = read_header_array(source, acquisition_header_dtype, headers_as_objects)
     sampling_description = read_sampling_description(source)
 
     return ReconBuffer(data, trajectory, density, headers, sampling_description)
 
 
-def read_recon_bit(source):
-    buffer = read_recon_buffer(source)
-    reference = read_optional(source, read_recon_buffer)
+def read_recon_bit(source, headers_as_objects=False):
+    buffer = read_recon_buffer(source, headers_as_objects)
+    reference = read_optional(source, read_recon_buffer, headers_as_objects)
     return ReconBit(buffer, reference)
 
 
-def read_recon_bits(source):
+def read_recon_bits(source, headers_as_objects=False):
     size = read(source, uint64)
-    return [read_recon_bit(source) for _ in range(size)]
+    return [read_recon_bit(source, headers_as_objects) for _ in range(size)]
 
 
-def read_recon_data(source):
-    return ReconData(read_recon_bits(source))
+def read_recon_data(source, headers_as_objects=False):
+    """ Read a ReconData message.
+
+    Buffer headers are read as structured arrays (see `gadgetron.external.headers`). Set `headers_as_objects`
+    to read them as object arrays of `ismrmrd.AcquisitionHeader` instead, e.g.
+        `connection.add_reader(GADGET_MESSAGE_RECON_DATA, read_recon_data, headers_as_objects=True)`
+    """
+    return ReconData(read_recon_bits(source, headers_as_objects))
 
 
 def write_sampling_description(destination, description):
@@ -95,7 +102,7 @@ def write_recon_buffer(destination, buffer):
     write_array(destination, buffer.data, numpy.complex64)
     write_optional(destination, buffer.trajectory, write_array,numpy.float32)
     write_optional(destination, buffer.density, write_array,numpy.float32)
-    write_object_array(destination, buffer.headers, write_acquisition_header)
+    write_header_array(destination, buffer.headers, acquisition_header_dtype)
     write_sampling_description(destination, buffer.sampling)
 
 
@@ -1,5 +1,10 @@
 
 
-from .cfft import cfftn, cifftn
+from .cfft import cfftn, cifftn, CenteredFFT
+from .shard import shard
+from .batch import batches, noise_whitening, remove_oversampling
+from .accumulate import KSpaceAccumulator
+from .compression import CoilCompression, coil_compression
 
-__all__ = [cfftn, cifftn]
+__all__ = ['cfftn', 'cifftn', 'CenteredFFT', 'shard', 'batches', 'noise_whitening', 'remove_oversampling',
+           'KSpaceAccumulator', 'CoilCompression', 'coil_compression']
@@ -0,0 +1,78 @@
+
+import ismrmrd
+
+import numpy as np
+
+
+class KSpaceAccumulator:
+    """ Accumulate acquisitions into preallocated k-space buffers, as they arrive.
+
+    :param header: ISMRMRD header; the buffer size along the encoding dimensions is read from the encoded space.
+    :param keys: Fields of the acquisition `idx` grouping acquisitions into buffers, e.g. ('slice', 'set').
+    :param triggers: Acquisition flags completing a buffer; the buffer of the flagged acquisition is emitted.
+    :param encoding: Index of the encoding read from the header.
+
+    Buffers have shape (channels, encoded z, encoded y, samples), and complex64 data. A buffer is allocated
+    when the first acquisition of its group arrives; channels and samples are taken from that acquisition,
+    so acquisitions may have had oversampling removed. Each acquisition is written into place at its
+    `kspace_encode_step_1` and `kspace_encode_step_2`. Only the latest acquisition of each incomplete buffer
+    is retained, data included, as the reference returned by `flush`.
+
+    Completed buffers are emitted as (reference, buffer) pairs; the reference is the acquisition which
+    triggered completion, and may be used to initialize image headers.
+    """
+
+    def __init__(self, header, keys=('slice', 'contrast', 'phase', 'repetition', 'set'),
+                 triggers=(ismrmrd.ACQ_LAST_IN_SLICE,), encoding=0):
+        matrix_size = header.encoding[encoding].encodedSpace.matrixSize
+        self.shape = (matrix_size.z, matrix_size.y)
+        self.keys = tuple(keys)
+        self.triggers = tuple(triggers)
+        self.buffers = {}
+        self.references = {}
+
+    def add(self, acquisition):
+        """ Write an acquisition into its buffer.
+
+        :return: A (reference, buffer) pair, if the acquisition completed its buffer. None otherwise.
+        :raises: :class:`ValueError`: If the data shape differs from that of the buffer's first acquisition.
+        """
+        key = tuple(getattr(acquisition.idx, field) for field in self.keys)
+
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            channels, samples = acquisition.data.shape
+            buffer = self.buffers[key] = np.zeros((channels, *self.shape, samples), dtype=np.complex64)
+
+        if acquisition.data.shape != (buffer.shape[0], buffer.shape[3]):
+            raise ValueError(f"Acquisition data of shape {acquisition.data.shape} does not match buffer of "
+                             f"shape {buffer.shape}.")
+
+        buffer[:, acquisition.idx.kspace_encode_step_2, acquisition.idx.kspace_encode_step_1, :] = acquisition.data
+
+        if any(acquisition.is_flag_set(flag) for flag in self.triggers):
+            self.references.pop(key, None)
+            return acquisition, self.buffers.pop(key)
+
+        self.references[key] = acquisition
+        return None
+
+    def flush(self):
+        """ Release all incomplete buffers; e.g. at the end of a stream.
+
+        :return: List of (reference, buffer) pairs; the reference is the latest acquisition in each buffer.
+        """
+        completed = [(self.references[key], buffer) for key, buffer in self.buffers.items()]
+        self.buffers, self.references = {}, {}
+        return completed
+
+    def accumulate(self, acquisitions):
+        """ Accumulate an iterable of acquisitions.
+
+        :return: Generator yielding (reference, buffer) pairs as buffers are completed. Incomplete buffers
+        are discarded when the acquisitions are exhausted.
+        """
+        for acquisition in acquisitions:
+            completed = self.add(acquisition)
+            if completed:
+                yield completed
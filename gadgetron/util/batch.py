@@ -0,0 +1,158 @@
+
+import ismrmrd
+
+import numpy as np
+
+from .cfft import cfftn, cifftn
+
+
+def batches(acquisitions, batch_size=64, isolate=None):
+    """ Gather consecutive acquisitions into batches.
+
+    :param acquisitions: Iterable of acquisitions.
+    :param batch_size: Maximum number of acquisitions in a batch.
+    :param isolate: Optional predicate. Acquisitions satisfying it are yielded in a batch of their own.
+    :return: Generator yielding lists of acquisitions.
+
+    All acquisitions in a batch have data of the same shape. A batch is completed when it is full, when
+    the shape of the data changes, and after an acquisition flagged ACQ_LAST_IN_SLICE; a slice is thus
+    never held back waiting for acquisitions from the next.
+    """
+    batch = []
+
+    for acquisition in acquisitions:
+        if isolate and isolate(acquisition):
+            if batch:
+                yield batch
+                batch = []
+            yield [acquisition]
+            continue
+
+        if batch and batch[0].data.shape != acquisition.data.shape:
+            yield batch
+            batch = []
+
+        batch.append(acquisition)
+
+        if len(batch) >= batch_size or acquisition.is_flag_set(ismrmrd.ACQ_LAST_IN_SLICE):
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def gather(batch, out=None):
+    """ Copy the data of a batch of acquisitions into a single contiguous block.
+
+    :param batch: List of acquisitions, all with data of the same shape.
+    :param out: Optional block to copy the data into, of shape (channels, n, samples) for some n of at
+    least the number of acquisitions. Rows past the end of the batch are left as they are.
+    :return: Array of shape (channels, acquisitions, samples); `out`, if provided.
+    """
+    channels, samples = batch[0].data.shape
+    block = out if out is not None else np.empty((channels, len(batch), samples), dtype=batch[0].data.dtype)
+    for i, acquisition in enumerate(batch):
+        block[:, i, :] = acquisition.data
+    return block
+
+
+def scatter(block, batch):
+    """ Copy the data in a block back into a batch of acquisitions; the inverse of `gather`. """
+    for i, acquisition in enumerate(batch):
+        acquisition.data[:] = block[:, i, :]
+
+
+def noise_whitening(acquisitions, header, batch_size=64):
+    """ Noise adjust acquisitions, in batches.
+
+    :param acquisitions: Iterable of acquisitions.
+    :param header: ISMRMRD header of the connection.
+    :param batch_size: Maximum number of acquisitions whitened at once.
+    :return: Generator yielding noise adjusted acquisitions.
+
+    Noise measurements are consumed, and used to compute a noise whitening matrix; they are not passed on.
+    The acquisitions following a noise measurement are whitened with a single matrix product per batch.
+    Acquisitions are passed on unchanged until a noise measurement has been seen.
+    """
+    noise_matrix = None
+    noise_dwell_time = 1.0
+
+    try:
+        noise_bandwidth = header.encoding[0].acquisitionSystemInformation.relativeNoiseBandwidth
+    except (AttributeError, IndexError):
+        noise_bandwidth = 0.793
+
+    def is_noise(acquisition):
+        return acquisition.is_flag_set(ismrmrd.ACQ_IS_NOISE_MEASUREMENT)
+
+    def whitening_transformation(noise):
+        covariance = (1.0 / (noise.shape[1] - 1)) * np.dot(noise, np.transpose(np.conjugate(noise)))
+        return np.linalg.inv(np.linalg.cholesky(covariance))
+
+    def whiten(batch):
+        block = gather(batch)
+        channels, count, samples = block.shape
+
+        scaling = np.sqrt(2 * np.array([acq.sample_time_us for acq in batch]) * noise_bandwidth / noise_dwell_time)
+        matrix = noise_matrix.astype(block.dtype, copy=False)
+
+        result = np.dot(matrix, block.reshape(channels, count * samples)).reshape(channels, count, samples)
+        result *= scaling.astype(result.real.dtype)[np.newaxis, :, np.newaxis]
+
+        scatter(result, batch)
+
+    for batch in batches(acquisitions, batch_size, isolate=is_noise):
+        if is_noise(batch[0]):
+            noise_matrix = whitening_transformation(batch[0].data)
+            noise_dwell_time = batch[0].sample_time_us
+            continue
+
+        if noise_matrix is not None:
+            whiten(batch)
+
+        yield from batch
+
+
+def remove_oversampling(acquisitions, header, batch_size=64):
+    """ Crop acquisitions to the recon space, in batches.
+
+    :param acquisitions: Iterable of acquisitions.
+    :param header: ISMRMRD header of the connection.
+    :param batch_size: Maximum number of acquisitions cropped at once.
+    :return: Iterable of cropped acquisitions.
+
+    Readouts are transformed to x-space, cropped to the size of the recon space along the first
+    dimension, and transformed back. The transforms are done once per batch, on a block holding all
+    the acquisitions of the batch. Acquisitions are passed through untouched if the encoded and the
+    recon space have the same size.
+
+    Batches end at slice boundaries, so their lengths vary. The block is always `batch_size` acquisitions
+    long, zero-padded past the end of the batch, so that the transforms are planned once per readout shape
+    rather than once per batch length.
+    """
+    encoding_space = header.encoding[0].encodedSpace.matrixSize
+    recon_space = header.encoding[0].reconSpace.matrixSize
+
+    if encoding_space.x == recon_space.x:
+        return acquisitions
+
+    x0 = (encoding_space.x - recon_space.x) // 2
+    x1 = (encoding_space.x - recon_space.x) // 2 + recon_space.x
+
+    def crop(batch):
+        channels, samples = batch[0].data.shape
+        block = np.zeros((channels, batch_size, samples), dtype=batch[0].data.dtype)
+
+        block = cifftn(gather(batch, out=block), axes=[2])
+        block = cfftn(block[:, :, x0:x1], axes=[2])
+
+        channels, _, samples = block.shape
+        for i, acquisition in enumerate(batch):
+            acquisition.resize(number_of_samples=samples, active_channels=channels)
+            acquisition.center_sample = recon_space.x // 2
+            acquisition.data[:] = block[:, i, :]
+
+        return batch
+
+    return (acquisition for batch in batches(acquisitions, batch_size) for acquisition in crop(batch))
@@ -1,25 +1,242 @@
 
-try:
-    import pyfftw.interfaces.numpy_fft as fft
-except ImportError:
-    import numpy.fft as fft
+import os
+import atexit
+import struct
+import logging
+import threading
+import collections
 
+import numpy as np
 
-def cfftn(data, axes):
+# pyFFTW is slow to import, and is imported when the first transform is planned; see `_pyfftw`.
+_not_imported = object()
+pyfftw = _not_imported
+
+
+class CenteredFFT:
+    """ Centered fast fourier transforms, with cached plans.
+
+    :param threads: Number of threads used by each transform.
+    :param cache_size: Maximum number of plans kept; the least recently used plan is evicted first.
+    :param cache_bytes: Maximum memory held by the arrays of the plans kept. Plans larger than this are
+    used once, and not kept.
+    :param planner_effort: FFTW planner flag. 'FFTW_ESTIMATE' plans immediately; 'FFTW_MEASURE' times
+    candidate algorithms when a shape is first seen, which is slow, but may pay off for long-running
+    processes, especially with wisdom.
+    :param wisdom: Path to an FFTW wisdom file. Wisdom is loaded from it if it exists, and saved to it at exit.
+
+    Plans are keyed by shape, dtype, axes and direction. Each plan owns aligned input and output arrays;
+    calls copy the data into the plan input, and the result out of the plan output, so no other arrays
+    are allocated when an output array is supplied. The output may be the input array itself.
+
+    The shifts of the centered transform are folded into these copies: along axes of even length,
+    shifting by half the length is equivalent to modulating with a checkerboard of alternating signs,
+    both before and after the transform. Only odd-length axes are shifted explicitly. The orthonormal
+    scaling is applied in the same pass.
+
+    Falls back to `numpy.fft` (without plan caching) if pyFFTW is not available.
+    """
+
+    class Plan:
+
+        def __init__(self, shape, dtype, axes, direction, threads, planner_effort):
+            real_dtype = np.empty(0, dtype=dtype).real.dtype
+
+            even = [axis for axis in axes if shape[axis] % 2 == 0]
+            self.odd = [axis for axis in axes if shape[axis] % 2 == 1]
+
+            self.input_mask = np.ones([1] * len(shape), dtype=real_dtype)
+            for axis in even:
+                signs = np.ones(shape[axis], dtype=real_dtype)
+                signs[1::2] = -1
+                self.input_mask = self.input_mask * signs.reshape([-1 if a == axis else 1 for a in range(len(shape))])
+
+            elements = np.prod([shape[axis] for axis in axes])
+            sign = (-1) ** sum(shape[axis] // 2 for axis in even)
+            self.output_mask = self.input_mask * real_dtype.type(sign / np.sqrt(elements))
+
+            self.lock = threading.Lock()
+            self.nbytes = self.input_mask.nbytes + self.output_mask.nbytes
+
+            if _pyfftw() is None:
+                transform = np.fft.fftn if direction == 'FFTW_FORWARD' else np.fft.ifftn
+                norm = 'backward' if direction == 'FFTW_FORWARD' else 'forward'
+                self.input_array = np.empty(shape, dtype=dtype)
+                self.execute = lambda: transform(self.input_array, axes=axes, norm=norm)
+                self.nbytes += self.input_array.nbytes
+            else:
+                self.input_array = pyfftw.empty_aligned(shape, dtype=dtype)
+                self.output_array = pyfftw.empty_aligned(shape, dtype=dtype)
+                fftw = pyfftw.FFTW(self.input_array, self.output_array,
+                                   axes=axes,
+                                   direction=direction,
+                                   flags=(planner_effort,),
+                                   threads=threads)
+                self.nbytes += self.input_array.nbytes + self.output_array.nbytes
+
+                def execute():
+                    fftw.execute()
+                    return self.output_array
+
+                self.execute = execute
+
+        def __call__(self, data, out, pre_shift, post_shift):
+            with self.lock:
+                if self.odd:
+                    data = pre_shift(data, axes=self.odd)
+                np.multiply(data, self.input_mask, out=self.input_array)
+
+                result = self.execute()
+
+                if self.odd:
+                    out[...] = post_shift(result * self.output_mask, axes=self.odd)
+                else:
+                    np.multiply(result, self.output_mask, out=out)
+                return out
+
+    def __init__(self, threads=1, cache_size=32, cache_bytes=256 * 1024 * 1024, planner_effort='FFTW_ESTIMATE',
+                 wisdom=None):
+        self.threads = threads
+        self.cache_size = cache_size
+        self.cache_bytes = cache_bytes
+        self.planner_effort = planner_effort
+
+        self.plans = collections.OrderedDict()
+        self.plan_bytes = 0
+        self.lock = threading.Lock()
+
+        self.wisdom = wisdom
+        if wisdom:
+            if os.path.exists(wisdom):
+                load_wisdom(wisdom)
+            _save_wisdom_at_exit(wisdom)
+
+    def forward(self, data, axes, out=None):
+        """ Centered forward transform; see `cfftn`. """
+        return self._transform(data, axes, out, 'FFTW_FORWARD', np.fft.ifftshift, np.fft.fftshift)
+
+    def inverse(self, data, axes, out=None):
+        """ Centered inverse transform; see `cifftn`. """
+        return self._transform(data, axes, out, 'FFTW_BACKWARD', np.fft.fftshift, np.fft.ifftshift)
+
+    def _transform(self, data, axes, out, direction, pre_shift, post_shift):
+        data = np.asarray(data)
+        if data.dtype.kind != 'c':
+            data = data.astype(np.complex64 if data.dtype == np.float32 else np.complex128)
+        if out is None:
+            out = np.empty(data.shape, dtype=data.dtype)
+
+        axes = tuple(sorted(axis % data.ndim for axis in axes))
+        plan = self._plan(data.shape, data.dtype, axes, direction)
+        return plan(data, out, pre_shift, post_shift)
+
+    def _plan(self, shape, dtype, axes, direction):
+        key = (shape, dtype.str, axes, direction)
+        with self.lock:
+            plan = self.plans.get(key)
+            if plan is None:
+                plan = CenteredFFT.Plan(shape, dtype, axes, direction, self.threads, self.planner_effort)
+                if plan.nbytes > self.cache_bytes:
+                    return plan
+                self.plans[key] = plan
+                self.plan_bytes += plan.nbytes
+            self.plans.move_to_end(key)
+            while len(self.plans) > 1 and (len(self.plans) > self.cache_size or self.plan_bytes > self.cache_bytes):
+                _, evicted = self.plans.popitem(last=False)
+                self.plan_bytes -= evicted.nbytes
+            return plan
+
+
+_engine = None
+_wisdom_files = set()
+
+# Wisdom files hold the strings exported by FFTW (double, single and long double precision), each
+# preceded by its length.
+_wisdom_length = struct.Struct('<Q')
+
+
+def _pyfftw():
+    global pyfftw
+    if pyfftw is _not_imported:
+        try:
+            import pyfftw as module
+        except ImportError:
+            module = None
+        pyfftw = module
+    return pyfftw
+
+
+def load_wisdom(path):
+    """ Load FFTW wisdom from a file written by `save_wisdom`. """
+    if _pyfftw() is None:
+        return
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    wisdom, position = [], 0
+    while position < len(data):
+        length, = _wisdom_length.unpack_from(data, position)
+        position += _wisdom_length.size
+        wisdom.append(data[position:position + length])
+        position += length
+    pyfftw.import_wisdom(tuple(wisdom))
+
+
+def save_wisdom(path):
+    """ Save the FFTW wisdom accumulated by the process to a file. """
+    if _pyfftw() is None:
+        return
+    try:
+        with open(path, 'wb') as file:
+            for wisdom in pyfftw.export_wisdom():
+                file.write(_wisdom_length.pack(len(wisdom)))
+                file.write(wisdom)
+    except OSError as e:
+        logging.warning(f"Failed to save FFTW wisdom to '{path}': {e}")
+
+
+def _save_wisdom_at_exit(path):
+    # Wisdom is shared by the whole process; it is saved once per file, however many engines use it.
+    if path not in _wisdom_files:
+        _wisdom_files.add(path)
+        atexit.register(save_wisdom, path)
+
+
+def configure(**kwargs):
+    """ Replace the engine used by `cfftn` and `cifftn`; arguments are passed to `CenteredFFT`.
+
+    The default engine reads its number of threads from the GADGETRON_FFT_THREADS environment variable,
+    and its wisdom file path from GADGETRON_FFTW_WISDOM.
+    """
+    global _engine
+    _engine = CenteredFFT(**kwargs)
+    return _engine
+
+
+def engine():
+    if _engine is None:
+        return configure(threads=int(os.environ.get('GADGETRON_FFT_THREADS', 1)),
+                         wisdom=os.environ.get('GADGETRON_FFTW_WISDOM'))
+    return _engine
+
+
+def cfftn(data, axes, out=None):
     """ Centered fast fourier transform, n-dimensional.
 
     :param data: Complex input data.
     :param axes: Axes along which to shift and transform.
+    :param out: Optional output array, of the same shape and dtype as data. May be data itself.
     :return: Fourier transformed data.
     """
-    return fft.fftshift(fft.fftn(fft.ifftshift(data, axes=axes), axes=axes, norm='ortho'), axes=axes)
+    return engine().forward(data, axes, out)
 
 
-def cifftn(data, axes):
+def cifftn(data, axes, out=None):
     """ Centered inverse fast fourier transform, n-dimensional.
 
     :param data: Complex input data.
     :param axes: Axes along which to shift.
+    :param out: Optional output array, of the same shape and dtype as data. May be data itself.
     :return: Inverse fourier transformed data.
     """
-    return fft.ifftshift(fft.ifftn(fft.fftshift(data, axes=axes), axes=axes, norm='ortho'), axes=axes)
+    return engine().inverse(data, axes, out)
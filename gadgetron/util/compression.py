@@ -0,0 +1,135 @@
+
+import weakref
+
+import ismrmrd
+
+import numpy as np
+
+from .batch import batches, gather
+
+
+class CoilCompression:
+    """ Compress multi-channel data into fewer virtual channels, by a principal component (SVD) transform.
+
+    :param channels: Number of virtual channels to keep.
+    :param energy: If no channel count is given, keep the fewest virtual channels holding at least
+    this fraction of the signal energy.
+
+    The compression matrix is estimated once (see `estimate`), and applied to subsequent data as a single
+    matrix product over all samples. The virtual channels are the left singular vectors of the calibration
+    data, ordered by decreasing energy; they are computed from the channel covariance matrix, which is far
+    smaller than the data itself.
+    """
+
+    def __init__(self, channels=None, energy=0.99):
+        self.channels = channels
+        self.energy = energy
+        self.matrix = None
+
+    def estimate(self, data, axis=0):
+        """ Estimate the compression matrix from calibration data, e.g. a reference scan or the first slice.
+
+        :param data: Complex data, with channels along `axis`.
+        :param axis: Channel axis of the data.
+        :return: Compression matrix, of shape (virtual channels, channels).
+        """
+        samples = np.moveaxis(data, axis, 0).reshape(data.shape[axis], -1)
+        covariance = np.dot(samples, np.conjugate(np.transpose(samples)))
+
+        energies, vectors = np.linalg.eigh(covariance)
+        energies, vectors = np.maximum(energies[::-1], 0), vectors[:, ::-1]
+
+        if self.channels is not None:
+            count = min(self.channels, len(energies))
+        else:
+            fractions = np.cumsum(energies) / max(np.sum(energies), np.finfo(energies.dtype).tiny)
+            count = min(int(np.searchsorted(fractions, self.energy)) + 1, len(energies))
+
+        self.matrix = np.conjugate(np.transpose(vectors[:, :count])).astype(np.complex64)
+        return self.matrix
+
+    def compress(self, data, axis=0):
+        """ Compress data to the virtual channels.
+
+        :param data: Complex data, with channels along `axis`.
+        :param axis: Channel axis of the data.
+        :return: Compressed data; of the same shape as the input, but for the number of channels.
+        :raises: :class:`RuntimeError`: If no compression matrix has been estimated.
+        """
+        if self.matrix is None:
+            raise RuntimeError("Coil compression matrix has not been estimated.")
+
+        channels = np.moveaxis(data, axis, 0)
+        result = np.dot(self.matrix, channels.reshape(channels.shape[0], -1))
+        return np.moveaxis(result.reshape(self.matrix.shape[0], *channels.shape[1:]), 0, axis)
+
+    def compress_acquisitions(self, acquisitions, batch_size=64):
+        """ Compress acquisitions, in batches.
+
+        :param acquisitions: Iterable of acquisitions.
+        :param batch_size: Maximum number of acquisitions compressed at once.
+        :return: Generator yielding compressed acquisitions.
+
+        If no compression matrix has been estimated, acquisitions are held back until the end of the
+        first slice (ACQ_LAST_IN_SLICE); the matrix is estimated from the slice, which is then passed on.
+        """
+        held = []
+
+        def compress(batch):
+            block = self.compress(gather(batch))
+            channels, _, samples = block.shape
+            for i, acquisition in enumerate(batch):
+                acquisition.resize(number_of_samples=samples,
+                                   active_channels=channels,
+                                   trajectory_dimensions=acquisition.trajectory_dimensions)
+                acquisition.data[:] = block[:, i, :]
+            return batch
+
+        for batch in batches(acquisitions, batch_size):
+            if self.matrix is not None:
+                yield from compress(batch)
+                continue
+
+            held.append(batch)
+            if batch[-1].is_flag_set(ismrmrd.ACQ_LAST_IN_SLICE):
+                self._estimate_from(held)
+                for pending in held:
+                    yield from compress(pending)
+                held = []
+
+        if held:
+            self._estimate_from(held)
+            for pending in held:
+                yield from compress(pending)
+
+    def compress_buffer(self, buffer):
+        """ Compress the data of a `ReconBuffer`; the matrix is estimated from it if needed.
+
+        Replaces `buffer.data` with a new, compressed array; other references to the original data are
+        not affected.
+
+        The buffer data is laid out as (RO, E1, E2, CHA, N, S, LOC); channels are along axis 3.
+        """
+        if self.matrix is None:
+            self.estimate(buffer.data, axis=3)
+        buffer.data = self.compress(buffer.data, axis=3)
+        return buffer
+
+    def _estimate_from(self, held):
+        self.estimate(np.concatenate([gather(batch).reshape(batch[0].active_channels, -1) for batch in held], axis=1))
+
+
+_compressions = weakref.WeakKeyDictionary()
+
+
+def coil_compression(connection, channels=None, energy=0.99):
+    """ Coil compression shared by all stages of a connection.
+
+    :param connection: Connection the compression belongs to.
+    :return: The connection's `CoilCompression`; created with the given parameters on first use.
+
+    The compression matrix is estimated once per connection, and reused by every stage asking for it.
+    """
+    if connection not in _compressions:
+        _compressions[connection] = CoilCompression(channels, energy)
+    return _compressions[connection]
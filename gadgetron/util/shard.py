@@ -0,0 +1,213 @@
+
+import io
+import os
+import queue
+import pickle
+import logging
+import multiprocessing
+
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+
+class _SharedMemoryPickler(pickle.Pickler):
+    # Large arrays are moved into shared memory blocks; only their names, shapes and dtypes are pickled.
+
+    def __init__(self, file, threshold):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.threshold = threshold
+        self.blocks = []
+
+    def persistent_id(self, obj):
+        if type(obj) is not np.ndarray or obj.dtype.hasobject or obj.nbytes < max(self.threshold, 1):
+            return None
+
+        order = 'F' if obj.flags.f_contiguous and not obj.flags.c_contiguous else 'C'
+        block = shared_memory.SharedMemory(create=True, size=obj.nbytes)
+        np.ndarray(obj.shape, dtype=obj.dtype, buffer=block.buf, order=order)[...] = obj
+        self.blocks.append(block)
+
+        return 'shared_memory', block.name, obj.shape, obj.dtype, order
+
+
+class _SharedMemoryUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, unlink):
+        super().__init__(file)
+        self.unlink = unlink
+
+    def persistent_load(self, pid):
+        _, name, shape, dtype, order = pid
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            return np.array(np.ndarray(shape, dtype=dtype, buffer=block.buf, order=order), order=order)
+        finally:
+            block.close()
+            if self.unlink:
+                block.unlink()
+
+
+def _dumps(obj, threshold):
+    file = io.BytesIO()
+    pickler = _SharedMemoryPickler(file, threshold)
+    try:
+        pickler.dump(obj)
+    except BaseException:
+        _release(pickler.blocks)
+        raise
+    return file.getvalue(), pickler.blocks
+
+
+def _loads(payload, unlink):
+    return _SharedMemoryUnpickler(io.BytesIO(payload), unlink).load()
+
+
+def _release(blocks, unlink=True):
+    for block in blocks:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def _worker(function, tasks, results, threshold):
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+
+        sequence, payload = task
+        try:
+            result = function(_loads(payload, unlink=False))
+            payload, blocks = _dumps(result, threshold)
+            results.put((sequence, payload, None))
+            # The parent unlinks the blocks once it has copied the arrays out.
+            _release(blocks, unlink=False)
+        except Exception as e:
+            logging.exception(f"Sharded function failed: {e}")
+            try:
+                error = pickle.dumps(e)
+            except Exception:
+                error = pickle.dumps(RuntimeError(f"Sharded function failed: {e!r}"))
+            results.put((sequence, None, error))
+
+
+class _Pool:
+
+    poll_interval = 1.0
+
+    def __init__(self, function, processes, threshold, context):
+        # Workers must share our resource tracker; blocks are created in one process, and unlinked in another.
+        resource_tracker.ensure_running()
+
+        self.threshold = threshold
+        self.results = context.Queue()
+        self.tasks = [context.Queue() for _ in range(processes)]
+        self.workers = [context.Process(target=_worker,
+                                        args=(function, tasks, self.results, threshold),
+                                        daemon=True)
+                        for tasks in self.tasks]
+        for worker in self.workers:
+            worker.start()
+
+        self.in_flight = {}
+
+    def submit(self, worker, sequence, item):
+        payload, blocks = _dumps(item, self.threshold)
+        self.in_flight[sequence] = blocks
+        self.tasks[worker].put((sequence, payload))
+
+    def collect(self):
+        while True:
+            try:
+                sequence, payload, error = self.results.get(timeout=self.poll_interval)
+                break
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self.workers):
+                    raise RuntimeError("A shard worker process exited unexpectedly.")
+
+        _release(self.in_flight.pop(sequence))
+
+        if error is not None:
+            return sequence, None, pickle.loads(error)
+        return sequence, _loads(payload, unlink=True), None
+
+    def close(self):
+        for tasks in self.tasks:
+            tasks.put(None)
+        for worker in self.workers:
+            worker.join(timeout=self.poll_interval)
+            if worker.is_alive():
+                worker.terminate()
+        for blocks in self.in_flight.values():
+            _release(blocks)
+        self.in_flight.clear()
+
+        # Results never collected still hold shared memory blocks; loading them releases the blocks.
+        while True:
+            try:
+                _, payload, _ = self.results.get(timeout=0.1)
+            except queue.Empty:
+                return
+            if payload is not None:
+                _loads(payload, unlink=True)
+
+
+def shard(items, key, function, processes=None, max_pending=None, threshold=64 * 1024, context=None):
+    """ Process items in a pool of worker processes, routing items by key.
+
+    :param items: Iterable of items, e.g. `iter(connection)`.
+    :param key: Function mapping an item to its shard key, e.g. `lambda acq: acq.idx.slice`.
+    :param function: Function applied to each item in a worker process. Return None to produce no result.
+    :param processes: Number of worker processes. Defaults to the number of CPUs.
+    :param max_pending: Maximum number of items submitted, but not yet yielded. Defaults to twice `processes`.
+    :param threshold: NumPy arrays of at least this many bytes are passed through shared memory rather than pickled.
+    :param context: Multiprocessing start method; the platform default if not provided.
+    :return: Generator yielding results in the order of the items that produced them.
+
+    All items sharing a key are processed by the same worker, in order; `function` may thus keep
+    per-key state (e.g. accumulate the acquisitions of a slice) between calls. Keys are assigned to
+    workers round-robin, in order of first appearance. Items and results are transferred between
+    processes by pickling, except for large NumPy arrays, which are copied through
+    `multiprocessing.shared_memory` blocks.
+
+    Exceptions raised by `function` are re-raised in the parent when the corresponding result is due.
+    """
+    processes = processes or os.cpu_count()
+    max_pending = max_pending or 2 * processes
+
+    pool = _Pool(function, processes, threshold, multiprocessing.get_context(context))
+    assignments = {}
+    completed = {}
+    next_sequence = 0
+
+    def ready():
+        nonlocal next_sequence
+        while next_sequence in completed:
+            result, error = completed.pop(next_sequence)
+            next_sequence += 1
+            if error is not None:
+                raise error
+            if result is not None:
+                yield result
+
+    def collect():
+        sequence, result, error = pool.collect()
+        completed[sequence] = result, error
+
+    try:
+        submitted = 0
+        for sequence, item in enumerate(items):
+            worker = assignments.setdefault(key(item), len(assignments) % processes)
+            pool.submit(worker, sequence, item)
+            submitted = sequence + 1
+
+            while submitted - next_sequence >= max_pending:
+                collect()
+                yield from ready()
+
+        while next_sequence < submitted:
+            collect()
+            yield from ready()
+    finally:
+        pool.close()
@@ -0,0 +1,125 @@
+
+import os
+
+import numpy
+import ismrmrd
+
+from gadgetron.types.image_array import ImageArray
+from gadgetron.types.recon_data import ReconData, ReconBit, ReconBuffer, SamplingDescription
+
+directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def _complex(*shape):
+    values = numpy.arange(numpy.prod(shape), dtype=numpy.float32)
+    return (values + 1j * (values[::-1] - 0.5)).astype(numpy.complex64).reshape(shape, order='F')
+
+
+def _objects(headers, shape):
+    array = numpy.empty(len(headers), dtype=object)
+    for index, header in enumerate(headers):
+        array[index] = header
+    return array.reshape(shape, order='F')
+
+
+def acquisition(line, channels=2, samples=4, trajectory_dimensions=0):
+    header = ismrmrd.AcquisitionHeader()
+    header.version = 1
+    header.number_of_samples = samples
+    header.active_channels = channels
+    header.available_channels = channels
+    header.trajectory_dimensions = trajectory_dimensions
+    header.scan_counter = 100 + line
+    header.center_sample = samples // 2
+    header.sample_time_us = 2.5
+    header.idx.kspace_encode_step_1 = line
+    header.idx.slice = 1
+    header.flags = 1 << (ismrmrd.ACQ_LAST_IN_SLICE - 1) if line == 1 else 0
+
+    acq = ismrmrd.Acquisition(header)
+    acq.data[:] = _complex(channels, samples) * (line + 1)
+    if trajectory_dimensions:
+        acq.traj[:] = numpy.arange(samples * trajectory_dimensions, dtype=numpy.float32).reshape(samples, -1)
+    return acq
+
+
+def waveform():
+    header = ismrmrd.WaveformHeader()
+    header.version = 1
+    header.channels = 2
+    header.number_of_samples = 3
+    header.waveform_id = 7
+    header.scan_counter = 100
+    return ismrmrd.Waveform(header, numpy.arange(6, dtype=numpy.uint32).reshape(2, 3) + 4000)
+
+
+def image():
+    img = ismrmrd.Image.from_array(_complex(2, 1, 3, 4), transpose=False)
+    img.image_index = 5
+    img.image_series_index = 2
+    img.attribute_string = ismrmrd.Meta({'GADGETRON_DataRole': 'Image', 'ImageNumber': '5'}).serialize()
+    return img
+
+
+def image_header(index):
+    header = ismrmrd.ImageHeader()
+    header.version = 1
+    header.data_type = ismrmrd.DATATYPE_CXFLOAT
+    header.matrix_size[:] = (4, 3, 1)
+    header.channels = 1
+    header.image_index = index
+    return header
+
+
+def image_array():
+    return ImageArray(
+        data=_complex(4, 3, 1, 1, 1, 2, 1),
+        headers=_objects([image_header(index) for index in range(2)], (2, 1)),
+        meta=[ismrmrd.Meta({'ImageNumber': str(index)}).serialize() for index in range(2)],
+        waveform=[waveform()],
+        acq_headers=_objects([acquisition(line).getHead() for line in range(2)], (2, 1))
+    )
+
+
+def sampling_description():
+    sampling = SamplingDescription()
+    sampling.encoded_FOV[:] = (300.0, 150.0, 5.0)
+    sampling.recon_FOV[:] = (150.0, 150.0, 5.0)
+    sampling.encoded_matrix[:] = (4, 2, 1)
+    sampling.recon_matrix[:] = (2, 2, 1)
+    sampling.sampling_limits[1].max, sampling.sampling_limits[1].center = 1, 1
+    return sampling
+
+
+def recon_data():
+    buffer = ReconBuffer(
+        data=_complex(4, 2, 1, 2, 1, 1, 1),
+        trajectory=numpy.asfortranarray(numpy.arange(16, dtype=numpy.float32).reshape(2, 4, 2, 1, 1, 1, 1)),
+        density=None,
+        headers=_objects([acquisition(line).getHead() for line in range(2)], (2, 1, 1, 1, 1)),
+        sampling_description=sampling_description()
+    )
+    return ReconData([ReconBit(buffer, None)])
+
+
+def items():
+    """ Small items of every message type written by gadgetron 1.4.1, by name. Values are deterministic.
+
+    The files in `directory` hold the items, as serialized by the writers of gadgetron 1.4.1. They pin the
+    wire format independently of the current writers and readers. The writer of 1.4.1 prefixed each waveform
+    of an image array with a message identifier, which neither Gadgetron nor the reader expect; the identifiers
+    are removed from `image_arrays.bin`.
+    """
+    return {
+        'acquisitions': [acquisition(0), acquisition(1, trajectory_dimensions=2)],
+        'waveforms': [waveform()],
+        'images': [image()],
+        'image arrays': [image_array()],
+        'recon data': [recon_data()]
+    }
+
+
+def serialized(name):
+    """ The items named `name` as serialized by gadgetron 1.4.1; see `items`. """
+    with open(os.path.join(directory, name.replace(' ', '_') + '.bin'), 'rb') as file:
+        return file.read()
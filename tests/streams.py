@@ -0,0 +1,164 @@
+
+import ismrmrd
+import numpy as np
+
+from gadgetron.external import constants, registry
+from gadgetron.external.headers import image_header_dtype, acquisition_header_dtype
+
+from gadgetron.types.image_array import ImageArray
+from gadgetron.types.recon_data import ReconData, ReconBit, ReconBuffer, SamplingDescription
+from gadgetron.types.acquisition_bucket import AcquisitionBucket, AcquisitionBundle, AcquisitionBucketStats
+
+rng = np.random.default_rng(42)
+
+
+def config():
+    return b"<gadgetronStreamConfiguration><property name='benchmark' value='true'/></gadgetronStreamConfiguration>"
+
+
+def header(matrix=(256, 128, 1), recon=(128, 128, 1), field_of_view=(600, 300, 5)):
+    """ A minimal ISMRMRD header, with 2x readout oversampling by default. """
+    x, y, z = matrix
+    rx, ry, rz = recon
+    fx, fy, fz = field_of_view
+    return f"""<?xml version="1.0"?>
+<ismrmrdHeader xmlns="http://www.ismrm.org/ISMRMRD">
+  <experimentalConditions><H1resonanceFrequency_Hz>63500000</H1resonanceFrequency_Hz></experimentalConditions>
+  <encoding>
+    <encodedSpace>
+      <matrixSize><x>{x}</x><y>{y}</y><z>{z}</z></matrixSize>
+      <fieldOfView_mm><x>{fx}</x><y>{fy}</y><z>{fz}</z></fieldOfView_mm>
+    </encodedSpace>
+    <reconSpace>
+      <matrixSize><x>{rx}</x><y>{ry}</y><z>{rz}</z></matrixSize>
+      <fieldOfView_mm><x>{fx * rx / x}</x><y>{fy}</y><z>{fz}</z></fieldOfView_mm>
+    </reconSpace>
+    <encodingLimits>
+      <kspace_encoding_step_1><minimum>0</minimum><maximum>{y - 1}</maximum><center>{y // 2}</center></kspace_encoding_step_1>
+    </encodingLimits>
+    <trajectory>cartesian</trajectory>
+  </encoding>
+</ismrmrdHeader>""".encode()
+
+
+def _complex(*shape):
+    return (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(np.complex64)
+
+
+def acquisition(line=0, slice=0, channels=32, samples=256, flags=()):
+    acq = ismrmrd.Acquisition.from_array(_complex(channels, samples))
+    acq.idx.kspace_encode_step_1 = line
+    acq.idx.slice = slice
+    acq.scan_counter = line
+    acq.sample_time_us = 2.5
+    acq.center_sample = samples // 2
+    for flag in flags:
+        acq.set_flag(flag)
+    return acq
+
+
+def acquisitions(slices=4, lines=128, channels=32, samples=256, noise=True):
+    """ Acquisitions of a Cartesian scan, slice by slice; optionally preceded by a noise measurement. """
+    if noise:
+        yield acquisition(channels=channels, samples=samples, flags=[ismrmrd.ACQ_IS_NOISE_MEASUREMENT])
+    for slice in range(slices):
+        for line in range(lines):
+            last = [ismrmrd.ACQ_LAST_IN_SLICE] if line == lines - 1 else []
+            yield acquisition(line, slice, channels, samples, last)
+
+
+def waveform(channels=5, samples=40):
+    head = ismrmrd.WaveformHeader()
+    head.channels = channels
+    head.number_of_samples = samples
+    head.waveform_id = 0
+    return ismrmrd.Waveform(head, rng.integers(0, 4096, (channels, samples)).astype(np.uint32))
+
+
+def image(size=256, channels=1):
+    img = ismrmrd.Image.from_array(rng.standard_normal((channels, 1, size, size)).astype(np.float32),
+                                   image_type=ismrmrd.IMTYPE_MAGNITUDE, transpose=False)
+    meta = ismrmrd.Meta({'GADGETRON_DataRole': 'Image', 'ImageNumber': '1'})
+    img.attribute_string = meta.serialize()
+    return img
+
+
+def image_array(size=128, sets=4, slices=8, meta_entries=64):
+    """ An ImageArray with one complex image per (set, slice), each with headers and a meta container. """
+    headers = np.zeros((sets, slices), dtype=image_header_dtype)
+    headers['matrix_size'] = (size, size, 1)
+    headers['channels'] = 1
+    headers['image_index'] = np.arange(sets * slices).reshape(sets, slices)
+
+    meta = ismrmrd.Meta({f'entry_{i}': [str(v) for v in range(4)] for i in range(meta_entries)}).serialize()
+
+    return ImageArray(
+        data=np.asfortranarray(_complex(size, size, 1, 1, 1, sets, slices)),
+        headers=headers,
+        meta=[meta] * (sets * slices),
+        waveform=None,
+        acq_headers=np.zeros(sets * slices, dtype=acquisition_header_dtype)
+    )
+
+
+def recon_data(readout=256, lines=128, channels=32, reference=True):
+    """ ReconData with a single bit; a fully sampled buffer, and optionally a reference buffer. """
+    def buffer(lines):
+        headers = np.zeros((lines, 1, 1, 1, 1), dtype=acquisition_header_dtype)
+        headers['number_of_samples'] = readout
+        headers['active_channels'] = channels
+        headers['idx']['kspace_encode_step_1'] = np.arange(lines).reshape(headers.shape)
+        return ReconBuffer(np.asfortranarray(_complex(readout, lines, 1, channels, 1, 1, 1)),
+                           None, None, headers, SamplingDescription())
+
+    return ReconData([ReconBit(buffer(lines), buffer(lines // 4) if reference else None)])
+
+
+def acquisition_bucket(lines=128, channels=32, samples=256, reference_lines=24):
+    data = AcquisitionBundle.from_acquisitions([acquisition(line, 0, channels, samples) for line in range(lines)])
+    ref = AcquisitionBundle.from_acquisitions([acquisition(line, 0, channels, samples)
+                                               for line in range(lines // 2 - reference_lines // 2,
+                                                                 lines // 2 + reference_lines // 2)])
+    stats = [AcquisitionBucketStats(kspace_encode_step_1=set(range(lines)), slice={0})]
+    return AcquisitionBucket(data, stats, ref, stats, [waveform() for _ in range(4)])
+
+
+class Sink:
+    """ Destination collecting serialized messages in memory. """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, byte_array):
+        self.buffer += memoryview(byte_array)
+
+    def flush(self):
+        pass
+
+
+def serialize(items):
+    """ Serialize items into a byte stream, using the default writers. """
+    sink = Sink()
+    for item in items:
+        registry.codecs.writer(type(item))(sink, item)
+    return bytes(sink.buffer)
+
+
+def preamble(configuration=None, ismrmrd_header=None):
+    """ The config and header messages opening every stream. """
+    def message(mid, payload):
+        return constants.GadgetMessageIdentifier.pack(mid) + constants.uint32.pack(len(payload)) + payload
+
+    return (message(constants.GADGET_MESSAGE_CONFIG, configuration or config()) +
+            message(constants.GADGET_MESSAGE_HEADER, ismrmrd_header or header()))
+
+
+close = constants.GadgetMessageIdentifier.pack(constants.GADGET_MESSAGE_CLOSE)
+
+
+def complete_stream(payload, header=None):
+    """ Add the config and header messages, and the close message, to serialized messages.
+
+    :param header: Serialized ISMRMRD header; `header()` if not provided.
+    """
+    return preamble(ismrmrd_header=header) + payload + close
@@ -0,0 +1,69 @@
+
+import socket
+import threading
+
+from gadgetron.external import Connection
+
+from . import streams
+from .streams import complete_stream
+
+
+def connect(stream):
+    """ Feed a stream to a socket pair, and collect what is sent back.
+
+    :return: The server end of the socket pair, and a callable waiting for, and returning, the bytes
+    received by the client end once the server end is closed.
+    """
+    client, server = socket.socketpair()
+    received = bytearray()
+
+    def drain():
+        while True:
+            chunk = client.recv(1024 * 1024)
+            if not chunk:
+                return
+            received.extend(chunk)
+
+    feeder = threading.Thread(target=client.sendall, args=(stream,), daemon=True)
+    drainer = threading.Thread(target=drain, daemon=True)
+    feeder.start()
+    drainer.start()
+
+    def result():
+        drainer.join(30)
+        feeder.join(30)
+        client.close()
+        return bytes(received)
+
+    return server, result
+
+
+def run(handler, payload, header=None, setup=None):
+    """ Run a handler on a Connection fed with serialized messages.
+
+    :param setup: Optional callable, called with the connection before the handler.
+    :return: The bytes sent back by the handler, the close message included.
+    """
+    server, result = connect(complete_stream(payload, header))
+    with Connection(server) as connection:
+        if setup:
+            setup(connection)
+        handler(connection)
+    return result()
+
+
+def pass_through(connection):
+    for item in connection:
+        connection.send(item)
+
+
+def messages():
+    """ Small messages of every type supported by the default readers and writers, by name. """
+    return {
+        'acquisitions': [streams.acquisition(line, channels=4, samples=64) for line in range(8)],
+        'waveforms': [streams.waveform() for _ in range(4)],
+        'images': [streams.image(size=32) for _ in range(3)],
+        'image arrays': [streams.image_array(size=16, sets=2, slices=2, meta_entries=4)],
+        'recon data': [streams.recon_data(readout=32, lines=16, channels=4)],
+        'buckets': [streams.acquisition_bucket(lines=16, channels=4, samples=32, reference_lines=4)]
+    }
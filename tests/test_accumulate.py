@@ -0,0 +1,76 @@
+
+import numpy
+import ismrmrd
+import pytest
+
+from gadgetron.util import KSpaceAccumulator
+
+from . import streams
+
+
+@pytest.fixture
+def header():
+    # Encoded space of 128 lines, in a single partition.
+    return ismrmrd.xsd.CreateFromDocument(streams.header(matrix=(64, 128, 1)))
+
+
+def slice_acquisitions(slice, lines, channels=2, samples=16):
+    return [streams.acquisition(line, slice, channels, samples,
+                                flags=[ismrmrd.ACQ_LAST_IN_SLICE] if line == lines[-1] else [])
+            for line in lines]
+
+
+def test_buffer_completes_on_last_in_slice(header):
+    accumulator = KSpaceAccumulator(header)
+    acquisitions = slice_acquisitions(0, range(0, 128, 4))
+
+    assert all(accumulator.add(acquisition) is None for acquisition in acquisitions[:-1])
+    reference, buffer = accumulator.add(acquisitions[-1])
+
+    assert reference is acquisitions[-1]
+    assert buffer.shape == (2, 1, 128, 16) and buffer.dtype == numpy.complex64
+    for acquisition in acquisitions:
+        assert numpy.array_equal(buffer[:, 0, acquisition.idx.kspace_encode_step_1, :], acquisition.data)
+    assert not numpy.any(buffer[:, 0, 1::4, :])
+    assert accumulator.flush() == []
+
+
+def test_acquisitions_are_grouped_by_keys(header):
+    first, second = slice_acquisitions(0, range(8)), slice_acquisitions(1, range(8))
+    interleaved = [acquisition for pair in zip(first, second) for acquisition in pair]
+
+    completed = list(KSpaceAccumulator(header).accumulate(interleaved))
+    assert [reference.idx.slice for reference, _ in completed] == [0, 1]
+    assert numpy.array_equal(completed[1][1][:, 0, 3, :], second[3].data)
+
+    # Without keys, the first acquisition flagged completes the only buffer; the remaining one starts anew.
+    completed = list(KSpaceAccumulator(header, keys=()).accumulate(interleaved))
+    assert [reference.idx.slice for reference, _ in completed] == [0, 1]
+    assert numpy.array_equal(completed[0][1][:, 0, 3, :], second[3].data)
+    assert not numpy.any(completed[1][1][:, 0, :7, :])
+
+
+def test_triggers(header):
+    acquisitions = slice_acquisitions(0, range(4))
+    acquisitions[1].set_flag(ismrmrd.ACQ_LAST_IN_REPETITION)
+
+    completed = list(KSpaceAccumulator(header, triggers=[ismrmrd.ACQ_LAST_IN_REPETITION]).accumulate(acquisitions))
+    assert [reference for reference, _ in completed] == [acquisitions[1]]
+
+
+def test_flush_returns_incomplete_buffers(header):
+    accumulator = KSpaceAccumulator(header)
+    for acquisition in slice_acquisitions(0, range(4))[:-1] + slice_acquisitions(1, range(4))[:2]:
+        accumulator.add(acquisition)
+
+    flushed = accumulator.flush()
+    assert [(reference.idx.slice, reference.idx.kspace_encode_step_1) for reference, _ in flushed] == [(0, 2), (1, 1)]
+    assert accumulator.flush() == []
+
+
+def test_shape_mismatch_raises(header):
+    accumulator = KSpaceAccumulator(header)
+    accumulator.add(streams.acquisition(0, channels=2, samples=16))
+
+    with pytest.raises(ValueError):
+        accumulator.add(streams.acquisition(1, channels=2, samples=32))
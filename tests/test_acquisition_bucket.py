@@ -0,0 +1,127 @@
+
+import io
+
+import numpy
+import pytest
+
+from gadgetron.external import constants
+from gadgetron.external.writers import write_acquisition
+from gadgetron.types.acquisition_bucket import (AcquisitionBundle, read_acquisition_bucket,
+                                                write_acquisition_bucket)
+
+from . import streams
+
+
+def acquisitions(count=4, channels=2, samples=8, trajectory_dimensions=0):
+    result = []
+    for line in range(count):
+        acquisition = streams.acquisition(line, channels=channels, samples=samples)
+        if trajectory_dimensions:
+            acquisition.resize(samples, channels, trajectory_dimensions)
+            acquisition.data[:] = streams.acquisition(line, channels=channels, samples=samples).data
+            acquisition.traj[:] = numpy.arange(samples * trajectory_dimensions).reshape(samples, -1) + line
+        result.append(acquisition)
+    return result
+
+
+def test_acquisitions_are_views_of_the_columns():
+    originals = acquisitions(trajectory_dimensions=2)
+    bundle = AcquisitionBundle.from_acquisitions(originals)
+
+    assert len(bundle) == 4
+    for index, (acquisition, original) in enumerate(zip(bundle, originals)):
+        assert numpy.array_equal(acquisition.data, original.data)
+        assert numpy.array_equal(acquisition.traj, original.traj)
+        assert acquisition.scan_counter == index
+        assert numpy.shares_memory(acquisition.data, bundle.data)
+        assert numpy.shares_memory(acquisition.traj, bundle.trajectory)
+
+    assert bundle[2] is bundle[2]
+    assert [a.scan_counter for a in bundle[1:3]] == [1, 2]
+
+    bundle[1].data[0, 0] = 42
+    bundle[1].idx.slice = 3
+    assert bundle.data[bundle.data_offsets[1]] == 42
+    assert bundle.headers['idx']['slice'][1] == 3
+
+
+def test_columns_are_laid_out_by_acquisition():
+    originals = acquisitions(count=3, channels=2, samples=4, trajectory_dimensions=3)
+    bundle = AcquisitionBundle.from_acquisitions(originals)
+
+    assert list(bundle.data_offsets) == [0, 8, 16, 24]
+    assert list(bundle.trajectory_offsets) == [0, 12, 24, 36]
+    assert numpy.array_equal(bundle.data, numpy.concatenate([a.data.ravel() for a in originals]))
+    assert numpy.array_equal(bundle.trajectory, numpy.concatenate([a.traj.ravel() for a in originals]))
+    assert list(bundle.headers['scan_counter']) == [0, 1, 2]
+
+
+def test_stacked_data():
+    bundle = AcquisitionBundle.from_acquisitions(acquisitions(count=5, channels=3, samples=8))
+
+    stacked = bundle.stacked_data()
+    assert stacked.shape == (5, 3, 8)
+    assert numpy.shares_memory(stacked, bundle.data)
+    for index, acquisition in enumerate(bundle):
+        assert numpy.array_equal(stacked[index], acquisition.data)
+
+    assert AcquisitionBundle.from_acquisitions([]).stacked_data().shape == (0, 0, 0)
+
+    mixed = AcquisitionBundle.from_acquisitions(acquisitions(count=2, samples=8) + acquisitions(count=1, samples=4))
+    with pytest.raises(ValueError):
+        mixed.stacked_data()
+
+
+def test_consolidated():
+    bundle = AcquisitionBundle.from_acquisitions(acquisitions())
+
+    bundle[0].data[:] = 1
+    assert bundle.consolidated() is bundle
+
+    bundle[1].resize(4, 2)
+    bundle[1].data[:] = 2
+    consolidated = bundle.consolidated()
+    assert consolidated is not bundle
+    assert list(consolidated.headers['number_of_samples']) == [8, 4, 8, 8]
+    assert numpy.all(consolidated[0].data == 1)
+    assert numpy.all(consolidated[1].data == 2)
+    assert numpy.array_equal(consolidated[3].data, bundle[3].data)
+
+
+def test_resized_acquisitions_are_written():
+    bucket = streams.acquisition_bucket(lines=4, channels=2, samples=8, reference_lines=2)
+    bucket.data[2].resize(4, 2)
+    bucket.data[2].data[:] = 3
+
+    sink = streams.Sink()
+    write_acquisition_bucket(sink, bucket)
+    source = io.BytesIO(bytes(sink.buffer))
+    source.read(constants.GadgetMessageIdentifier.size)
+
+    received = read_acquisition_bucket(source).data
+    assert list(received.headers['number_of_samples']) == [8, 8, 4, 8]
+    assert numpy.all(received[2].data == 3)
+    assert numpy.array_equal(received[3].data, bucket.data[3].data)
+
+
+def test_read_bucket_arrays_are_writable_columns():
+    bucket = streams.acquisition_bucket(lines=8, channels=2, samples=16, reference_lines=4)
+    sink = streams.Sink()
+    write_acquisition_bucket(sink, bucket)
+    source = io.BytesIO(bytes(sink.buffer))
+    source.read(constants.GadgetMessageIdentifier.size)
+
+    received = read_acquisition_bucket(source)
+    assert isinstance(received.data, AcquisitionBundle)
+
+    for bundle, original in [(received.data, bucket.data), (received.ref, bucket.ref)]:
+        assert bundle.data.flags.writeable and bundle.data.flags.owndata
+        assert bundle.headers.flags.writeable
+        assert numpy.array_equal(bundle.stacked_data(), original.stacked_data())
+        assert all(numpy.shares_memory(acquisition.data, bundle.data) for acquisition in bundle)
+
+    # Acquisitions of a bundle serialize as any other acquisition.
+    sink, expected = streams.Sink(), streams.Sink()
+    write_acquisition(sink, received.data[3])
+    write_acquisition(expected, bucket.data[3])
+    assert sink.buffer == expected.buffer
@@ -0,0 +1,171 @@
+
+import socket
+import asyncio
+import threading
+import concurrent.futures
+
+import ismrmrd
+import pytest
+
+from gadgetron.external import AsyncConnection, constants
+
+from . import streams
+
+from .support import complete_stream, connect, messages
+
+
+async def serve(server, handler, executor=None):
+    reader, writer = await asyncio.open_connection(sock=server)
+    async with await AsyncConnection.open(reader, writer, executor) as connection:
+        await handler(connection)
+
+
+def run_async(handler, payload, executor=None):
+    """ Run a coroutine handler on an AsyncConnection fed with serialized messages; see `support.run`. """
+    server, result = connect(complete_stream(payload))
+    asyncio.run(serve(server, handler, executor))
+    server.close()
+    return result()
+
+
+class RecordingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """ Executor recording the functions submitted to it. """
+
+    def __init__(self, max_workers=1):
+        super().__init__(max_workers=max_workers, thread_name_prefix='recording-executor')
+        self.functions = []
+
+    def submit(self, function, *args, **kwargs):
+        self.functions.append(getattr(function, '__name__', None))
+        return super().submit(function, *args, **kwargs)
+
+
+async def pass_through(connection):
+    async for item in connection:
+        await connection.send(item)
+
+
+def test_pass_through():
+    payload = b''.join(streams.serialize(items) for items in messages().values())
+    assert run_async(pass_through, payload) == payload + streams.close
+
+
+def test_config_and_header():
+    headers = []
+
+    async def record_header(connection):
+        headers.append(connection.raw_bytes.header)
+        await pass_through(connection)
+
+    assert run_async(record_header, b'') == streams.close
+    assert headers == [streams.header()]
+
+
+def test_filtered_items_are_sent_back():
+    kept = []
+
+    async def keep_acquisitions(connection):
+        connection.filter(ismrmrd.Acquisition)
+        async for item in connection:
+            kept.append(item)
+            await connection.send(item)
+
+    payload = streams.serialize(messages()['waveforms']) + streams.serialize(messages()['acquisitions'])
+    assert run_async(keep_acquisitions, payload) == payload + streams.close
+    assert len(kept) == len(messages()['acquisitions'])
+
+
+def test_filtered_messages_are_sent_back_raw():
+    mids = []
+
+    async def keep_acquisitions(connection):
+        connection.filter_messages([constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION])
+        async for mid, item in connection.iter_with_mids():
+            mids.append(mid)
+            await connection.send(item)
+
+    payload = b''.join(streams.serialize(items) for items in messages().values())
+    assert run_async(keep_acquisitions, payload) == payload + streams.close
+    assert set(mids) == {constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION}
+
+
+def test_messages_are_framed_on_the_event_loop():
+    # The executor has a single thread. A connection waiting for the rest of a message must not hold it,
+    # or the other connection could not be served.
+    stream = complete_stream(streams.serialize(messages()['acquisitions']))
+    stalled_at = len(complete_stream(b'')) - len(streams.close) + 100
+
+    stalled_client, stalled_server = socket.socketpair()
+    stalled_client.sendall(stream[:stalled_at])
+    server, result = connect(stream)
+
+    threads = set(threading.enumerate())
+
+    with RecordingExecutor() as executor:
+        async def serve_both():
+            stalled = asyncio.ensure_future(serve(stalled_server, pass_through, executor))
+            await asyncio.wait_for(serve(server, pass_through, executor), timeout=30)
+            assert not stalled.done()
+
+            # No thread waits on the stalled connection; the executor is the only thread started.
+            started = set(threading.enumerate()) - threads
+            assert all(thread.name.startswith('recording-executor') for thread in started)
+
+            stalled_client.sendall(stream[stalled_at:])
+            await asyncio.wait_for(stalled, timeout=30)
+
+        asyncio.run(serve_both())
+
+    server.close()
+    assert result() == stream[len(complete_stream(b'')) - len(streams.close):]
+
+    stalled_server.close()
+    stalled_client.shutdown(socket.SHUT_WR)
+    received = bytearray()
+    while chunk := stalled_client.recv(1024 * 1024):
+        received += chunk
+    stalled_client.close()
+    assert bytes(received) == result()
+
+
+def test_large_items_are_serialized_in_the_executor():
+    large, small = streams.image(size=512, channels=2), streams.acquisition()
+    payload = streams.serialize([large, small])
+
+    with RecordingExecutor() as executor:
+        assert run_async(pass_through, payload, executor) == payload + streams.close
+
+    # Each body is decoded in the executor; the close message has no body, and is read there as well.
+    assert executor.functions.count('_decode') == 3
+    assert executor.functions.count('write_image') == 1
+    assert 'write_acquisition' not in executor.functions
+
+
+def test_messages_without_skimmer_are_read_in_the_executor():
+    custom, waveforms = 2000, streams.serialize(messages()['waveforms'])
+    payload = constants.GadgetMessageIdentifier.pack(custom) + b'abcd' + waveforms
+    received = []
+
+    async def read_custom(connection):
+        connection.add_reader(custom, lambda source: bytes(source.read(4)))
+        async for item in connection:
+            received.append(item)
+            if isinstance(item, ismrmrd.Waveform):
+                await connection.send(item)
+
+    assert run_async(read_custom, payload) == waveforms + streams.close
+    assert received[0] == b'abcd'
+    assert len(received) == 5
+
+
+def test_truncated_message_raises():
+    client, server = socket.socketpair()
+    client.sendall(complete_stream(b'')[:-len(streams.close)] + streams.serialize([streams.acquisition()])[:-10])
+    client.shutdown(socket.SHUT_WR)
+
+    async def next_item(connection):
+        with pytest.raises(EOFError):
+            await connection.next()
+
+    asyncio.run(serve(server, next_item))
+    client.close()
@@ -0,0 +1,92 @@
+
+import types
+
+import numpy
+import ismrmrd
+
+from gadgetron.util import cfft
+from gadgetron.util.batch import batches, gather, scatter, noise_whitening, remove_oversampling
+
+from . import streams
+
+
+def header(encoded=64, recon=32, bandwidth=0.79):
+    def matrix(x):
+        return types.SimpleNamespace(matrixSize=types.SimpleNamespace(x=x))
+
+    system = types.SimpleNamespace(relativeNoiseBandwidth=bandwidth)
+    return types.SimpleNamespace(encoding=[types.SimpleNamespace(encodedSpace=matrix(encoded),
+                                                                 reconSpace=matrix(recon),
+                                                                 acquisitionSystemInformation=system)])
+
+
+def copy(acquisition):
+    return ismrmrd.Acquisition(acquisition.getHead(), acquisition.data.copy())
+
+
+def test_batches_end_at_size_shape_and_slice():
+    acquisitions = ([streams.acquisition(line, channels=2, samples=16) for line in range(5)] +
+                    [streams.acquisition(5, channels=2, samples=16, flags=[ismrmrd.ACQ_LAST_IN_SLICE])] +
+                    [streams.acquisition(line, channels=2, samples=8) for line in range(3)])
+
+    assert [len(batch) for batch in batches(acquisitions, batch_size=4)] == [4, 2, 3]
+
+
+def test_batches_isolate():
+    acquisitions = [streams.acquisition(line, channels=2, samples=16) for line in range(4)]
+    isolated = [len(batch) for batch in batches(acquisitions, isolate=lambda a: a.scan_counter == 2)]
+    assert isolated == [2, 1, 1]
+
+
+def test_gather_and_scatter():
+    batch = [streams.acquisition(line, channels=3, samples=8) for line in range(4)]
+    block = gather(batch)
+    assert block.shape == (3, 4, 8)
+    assert numpy.array_equal(block[:, 2, :], batch[2].data)
+
+    scatter(block * 2, batch)
+    assert numpy.array_equal(batch[2].data, block[:, 2, :] * 2)
+
+
+def test_noise_whitening():
+    noise = streams.acquisition(channels=4, samples=64, flags=[ismrmrd.ACQ_IS_NOISE_MEASUREMENT])
+    noise.sample_time_us = 5.0
+    acquisitions = [streams.acquisition(line, channels=4, samples=64) for line in range(6)]
+    expected = [copy(acquisition) for acquisition in acquisitions]
+
+    covariance = numpy.dot(noise.data, numpy.conjugate(noise.data.T)) / (noise.data.shape[1] - 1)
+    matrix = numpy.linalg.inv(numpy.linalg.cholesky(covariance))
+    scaling = numpy.sqrt(2 * 2.5 * 0.79 / 5.0)
+
+    whitened = list(noise_whitening([noise] + acquisitions, header(), batch_size=4))
+    assert len(whitened) == len(acquisitions)
+    for result, acquisition in zip(whitened, expected):
+        assert numpy.allclose(result.data, scaling * numpy.dot(matrix, acquisition.data), atol=1e-4)
+
+
+def test_remove_oversampling():
+    acquisitions = [streams.acquisition(line, channels=2, samples=64) for line in range(5)]
+    expected = [cfft.cfftn(cfft.cifftn(a.data, axes=[1])[:, 16:48], axes=[1]) for a in acquisitions]
+
+    cropped = list(remove_oversampling(acquisitions, header(), batch_size=4))
+    assert [a.number_of_samples for a in cropped] == [32] * 5
+    assert cropped[0].center_sample == 16
+    for result, data in zip(cropped, expected):
+        assert numpy.allclose(result.data, data, atol=1e-5)
+
+
+def test_remove_oversampling_plans_do_not_depend_on_batch_length():
+    engine = cfft.configure()
+    try:
+        def scan(lines):
+            return [streams.acquisition(line, channels=2, samples=64,
+                                        flags=[ismrmrd.ACQ_LAST_IN_SLICE] if line == lines - 1 else [])
+                    for line in range(lines)]
+
+        for lines in (3, 5, 7, 11):
+            list(remove_oversampling(scan(lines), header(), batch_size=8))
+
+        # One inverse plan for the encoded readout, and one forward plan for the recon readout.
+        assert len(engine.plans) == 2
+    finally:
+        cfft._engine = None
@@ -0,0 +1,86 @@
+
+import numpy
+import pytest
+
+from gadgetron.util import cfft
+
+
+def reference(data, axes):
+    shifted = numpy.fft.ifftshift(data, axes=axes)
+    return numpy.fft.fftshift(numpy.fft.fftn(shifted, axes=axes, norm='ortho'), axes=axes)
+
+
+def inverse_reference(data, axes):
+    shifted = numpy.fft.fftshift(data, axes=axes)
+    return numpy.fft.ifftshift(numpy.fft.ifftn(shifted, axes=axes, norm='ortho'), axes=axes)
+
+
+def random(shape, dtype):
+    rng = numpy.random.default_rng(0)
+    return (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(dtype)
+
+
+@pytest.mark.parametrize('shape, axes', [
+    ((8, 16), (0, 1)),
+    ((7, 9), (0, 1)),
+    ((6, 5, 4), (0, 2)),
+    ((3, 8, 5), (-1, -2)),
+    ((10,), (0,))
+])
+@pytest.mark.parametrize('dtype', [numpy.complex64, numpy.complex128])
+def test_centered_transforms(shape, axes, dtype):
+    data = random(shape, dtype)
+    tolerance = 1e-4 if dtype == numpy.complex64 else 1e-10
+
+    forward = cfft.cfftn(data, axes)
+    assert forward.dtype == dtype
+    assert numpy.allclose(forward, reference(data, axes), atol=tolerance)
+    assert numpy.allclose(cfft.cifftn(data, axes), inverse_reference(data, axes), atol=tolerance)
+
+
+def test_transform_in_place():
+    data = random((8, 6), numpy.complex64)
+    expected = reference(data, (0, 1))
+
+    result = cfft.cfftn(data, (0, 1), out=data)
+    assert result is data
+    assert numpy.allclose(data, expected, atol=1e-4)
+
+
+def test_plan_cache_is_bounded():
+    engine = cfft.CenteredFFT(cache_size=2)
+    for length in (4, 6, 8):
+        engine.forward(numpy.ones(length, dtype=numpy.complex64), (0,))
+    assert len(engine.plans) == 2
+
+    engine = cfft.CenteredFFT(cache_bytes=160 * 1024)
+    for length in (48, 56, 64):
+        engine.forward(numpy.ones((length, length), dtype=numpy.complex64), (0, 1))
+    assert len(engine.plans) == 1
+    assert engine.plan_bytes == next(iter(engine.plans.values())).nbytes
+
+
+def test_oversized_plans_are_not_kept():
+    engine = cfft.CenteredFFT(cache_bytes=64 * 1024)
+    engine.forward(numpy.ones((16, 16), dtype=numpy.complex64), (0, 1))
+
+    data = random((128, 128), numpy.complex64)
+    assert numpy.allclose(engine.forward(data, (0, 1)), reference(data, (0, 1)), atol=1e-3)
+    assert [key[0] for key in engine.plans] == [(16, 16)]
+    assert engine.plan_bytes < 64 * 1024
+
+
+def test_wisdom_round_trip(tmp_path, monkeypatch):
+    if cfft._pyfftw() is None:
+        pytest.skip("pyFFTW is not available.")
+
+    path = tmp_path / 'wisdom'
+    engine = cfft.CenteredFFT(planner_effort='FFTW_MEASURE')
+    engine.forward(random((16, 16), numpy.complex64), (0, 1))
+
+    cfft.save_wisdom(path)
+
+    imported = []
+    monkeypatch.setattr(cfft.pyfftw, 'import_wisdom', imported.append)
+    cfft.load_wisdom(path)
+    assert imported == [cfft.pyfftw.export_wisdom()]
@@ -0,0 +1,121 @@
+
+import gc
+import types
+
+import numpy
+import ismrmrd
+import pytest
+
+from gadgetron.util import CoilCompression, coil_compression
+from gadgetron.util import compression
+
+from . import streams
+
+
+def low_rank(channels, rank, samples, noise=1e-4, seed=0):
+    # Signal spanning `rank` dimensions of the channel space, with a little noise.
+    rng = numpy.random.default_rng(seed)
+
+    def complex_normal(*shape):
+        return rng.standard_normal(shape) + 1j * rng.standard_normal(shape)
+
+    signal = numpy.dot(complex_normal(channels, rank), complex_normal(rank, samples))
+    return (signal + noise * complex_normal(channels, samples)).astype(numpy.complex64)
+
+
+def test_estimate_keeps_dominant_subspace():
+    data = low_rank(channels=8, rank=3, samples=2000)
+    matrix = CoilCompression(channels=3).estimate(data)
+
+    assert matrix.shape == (3, 8)
+    assert numpy.allclose(numpy.dot(matrix, numpy.conjugate(matrix.T)), numpy.eye(3), atol=1e-5)
+
+    # The virtual channels match the dominant left singular vectors, up to the phase of each.
+    vectors = numpy.linalg.svd(data, full_matrices=False)[0][:, :3]
+    assert numpy.allclose(numpy.abs(numpy.dot(matrix, vectors)), numpy.eye(3), atol=1e-3)
+
+
+def test_compress_preserves_signal():
+    data = low_rank(channels=8, rank=3, samples=2000)
+    compressor = CoilCompression(channels=3)
+    compressor.estimate(data)
+
+    compressed = compressor.compress(data)
+    assert compressed.shape == (3, 2000)
+    restored = numpy.dot(numpy.conjugate(compressor.matrix.T), compressed)
+    assert numpy.linalg.norm(restored - data) < 1e-3 * numpy.linalg.norm(data)
+
+
+def test_channels_chosen_by_energy():
+    data = low_rank(channels=8, rank=3, samples=2000)
+    assert CoilCompression(energy=0.999).estimate(data).shape == (3, 8)
+    assert CoilCompression(channels=16).estimate(data).shape == (8, 8)
+
+
+def test_compress_along_axis():
+    data = low_rank(channels=6, rank=2, samples=4 * 50)
+    compressor = CoilCompression(channels=2)
+    compressor.estimate(data)
+
+    along_last = numpy.moveaxis(data.reshape(6, 4, 50), 0, -1)
+    compressed = compressor.compress(along_last, axis=-1)
+    assert compressed.shape == (4, 50, 2)
+    assert numpy.allclose(numpy.moveaxis(compressed, -1, 0).reshape(2, -1), compressor.compress(data), atol=1e-4)
+
+
+def test_compress_requires_estimate():
+    with pytest.raises(RuntimeError):
+        CoilCompression(channels=2).compress(low_rank(channels=4, rank=2, samples=10))
+
+
+def test_compress_buffer():
+    # (RO, E1, E2, CHA, N, S, LOC), with channels along axis 3.
+    channels = low_rank(channels=8, rank=2, samples=32 * 16 * 2)
+    data = numpy.moveaxis(channels.reshape(8, 32, 16, 1, 2, 1, 1), 0, 3).reshape(32, 16, 1, 8, 2, 1, 1)
+    buffer = types.SimpleNamespace(data=data)
+
+    compressor = CoilCompression(channels=2)
+    assert compressor.compress_buffer(buffer) is buffer
+
+    assert buffer.data.shape == (32, 16, 1, 2, 2, 1, 1)
+    vectors = numpy.linalg.svd(channels, full_matrices=False)[0][:, :2]
+    assert numpy.allclose(numpy.abs(numpy.dot(compressor.matrix, vectors)), numpy.eye(2), atol=1e-3)
+    expected = numpy.einsum('vc,rexcnsl->rexvnsl', compressor.matrix, data)
+    assert numpy.allclose(buffer.data, expected, atol=1e-4)
+
+
+def test_compress_acquisitions_estimates_from_first_slice():
+    mixing = low_rank(channels=8, rank=2, samples=2, noise=0)
+    acquisitions = [streams.acquisition(line, channels=8, samples=16,
+                                        flags=[ismrmrd.ACQ_LAST_IN_SLICE] if line == 5 else [])
+                    for line in range(8)]
+    for acquisition in acquisitions:
+        acquisition.data[:] = numpy.dot(mixing, acquisition.data[:2])
+    original = [acquisition.data.copy() for acquisition in acquisitions]
+
+    compressor = CoilCompression(channels=2)
+    compressed = list(compressor.compress_acquisitions(acquisitions, batch_size=4))
+    assert compressed == acquisitions
+    assert all(acquisition.active_channels == 2 for acquisition in compressed)
+
+    # The matrix is estimated from the first slice, and the signal lies in its span.
+    for acquisition, data in zip(compressed, original):
+        assert acquisition.data.shape == (2, 16)
+        assert numpy.allclose(numpy.dot(numpy.conjugate(compressor.matrix.T), acquisition.data), data, atol=1e-4)
+
+
+class Connection:
+    pass
+
+
+def test_compression_is_shared_per_connection():
+    first, second = Connection(), Connection()
+
+    compressor = coil_compression(first, channels=4)
+    assert coil_compression(first) is compressor
+    assert coil_compression(first).channels == 4
+    assert coil_compression(second) is not compressor
+
+    del first
+    gc.collect()
+    assert list(compression._compressions.keys()) == [second]
@@ -0,0 +1,154 @@
+
+import ismrmrd
+import pytest
+
+from gadgetron.external import Connection, constants
+
+from . import streams
+
+from .support import connect, complete_stream, messages, pass_through, run
+
+kinds = list(messages())
+
+def pipelined_metrics(connection):
+    connection.enable_metrics()
+    connection.pipeline()
+
+
+# Ways of setting up a connection before the handler runs; items must pass through unchanged in all of them.
+modes = {
+    'plain': None,
+    'pipeline': lambda connection: connection.pipeline(),
+    'metrics': lambda connection: connection.enable_metrics(),
+    'pipelined metrics': pipelined_metrics,
+    'filter_messages': lambda connection: connection.filter_messages(
+        [constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION, constants.GADGET_MESSAGE_ISMRMRD_IMAGE],
+        lambda header: not isinstance(header, ismrmrd.ImageHeader)),
+}
+
+
+@pytest.fixture(params=kinds)
+def payload(request):
+    return streams.serialize(messages()[request.param])
+
+
+@pytest.fixture(params=list(modes))
+def setup(request):
+    return modes[request.param]
+
+
+def test_pass_through(payload, setup):
+    assert run(pass_through, payload, setup=setup) == payload + streams.close
+
+
+def test_pass_through_mixed(setup):
+    payload = b''.join(streams.serialize(items) for items in messages().values())
+    assert run(pass_through, payload, setup=setup) == payload + streams.close
+
+
+def test_pipeline_raises_write_errors():
+    def fail(destination, item):
+        raise ValueError("Failed to write.")
+
+    def send_unwritable(connection):
+        connection.add_writer(lambda item: True, fail)
+        for item in connection:
+            connection.send(item)
+
+    with pytest.raises(ValueError):
+        run(send_unwritable, streams.serialize(messages()['waveforms']), setup=lambda c: c.pipeline())
+
+
+def test_config_and_header():
+    server, result = connect(complete_stream(b''))
+    with Connection(server) as connection:
+        assert connection.raw_bytes.config == streams.config()
+        assert connection.raw_bytes.header == streams.header()
+        assert connection.config.find('property').get('name') == 'benchmark'
+        assert connection.header.encoding[0].encodedSpace.matrixSize.x == 256
+        assert list(connection) == []
+    assert result() == streams.close
+
+
+def test_direct_writes_are_sent_on_close():
+    def write_directly(connection):
+        connection.socket.write(b'payload')
+
+    assert run(write_directly, b'') == b'payload' + streams.close
+
+
+def test_metrics_count_messages(tmp_path):
+    connections = []
+    prometheus = tmp_path / 'metrics.prom'
+
+    def setup(connection):
+        connections.append(connection)
+        connection.enable_metrics(prometheus_file=str(prometheus))
+        connection.pipeline()
+
+    payload = streams.serialize(messages()['acquisitions'])
+    run(pass_through, payload, setup=setup)
+
+    # Items sent are written behind the handler; all have been sent once the connection is closed.
+    stats = connections[0].stats.as_dict()
+    received, sent = stats['received'], stats['sent']
+    assert list(received) == ['ISMRMRD_ACQUISITION']
+    assert received['ISMRMRD_ACQUISITION']['count'] == 8
+    assert received['ISMRMRD_ACQUISITION']['bytes'] == len(payload)
+    assert sent['Acquisition']['count'] == 8
+    assert sent['Acquisition']['bytes'] == len(payload)
+    assert 'gadgetron_messages_sent_total{type="Acquisition"} 8' in prometheus.read_text()
+
+
+def test_metrics_cannot_be_enabled_once_pipelined():
+    def enable_late(connection):
+        connection.pipeline()
+        with pytest.raises(RuntimeError):
+            connection.enable_metrics()
+        pass_through(connection)
+
+    payload = streams.serialize(messages()['waveforms'])
+    assert run(enable_late, payload) == payload + streams.close
+
+
+def first_item_only(connections):
+    def handler(connection):
+        connections.append(connection)
+        connection.send(next(iter(connection)))
+    return handler
+
+
+def test_read_ahead_stops_when_handler_exits_early():
+    # Many more items than the read-ahead depth; the reader is blocked on the full queue.
+    connections, items = [], messages()['acquisitions'] * 8
+    payload = streams.serialize(items)
+
+    output = run(first_item_only(connections), payload, setup=lambda c: c.pipeline(read_ahead=2))
+    assert output == streams.serialize(items[:1]) + streams.close
+    assert not connections[0].read_ahead.thread.is_alive()
+    assert connections[0].read_ahead.queue.empty()
+
+
+def test_read_ahead_stops_while_waiting_for_data():
+    # The client sends a single item, and keeps the connection open; the reader is blocked receiving.
+    connections, payload = [], streams.serialize(messages()['waveforms'][:1])
+    server, result = connect(streams.preamble() + payload)
+
+    with Connection(server) as connection:
+        connection.pipeline()
+        first_item_only(connections)(connection)
+
+    assert result() == payload + streams.close
+    assert not connections[0].read_ahead.thread.is_alive()
+
+
+def test_read_ahead_stops_when_handler_raises():
+    connections = []
+
+    def fail(connection):
+        first_item_only(connections)(connection)
+        raise ValueError("Failed to process.")
+
+    with pytest.raises(ValueError):
+        run(fail, streams.serialize(messages()['images'] * 4), setup=lambda c: c.pipeline(read_ahead=1))
+    assert not connections[0].read_ahead.thread.is_alive()
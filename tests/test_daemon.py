@@ -0,0 +1,185 @@
+
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import threading
+import subprocess
+
+import numpy
+import pytest
+
+from gadgetron import daemon
+from gadgetron.util import cfft
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="Requires Unix domain sockets.")
+
+
+def warm_up():
+    # Warm-up hook of this module; plans a transform the requests below use.
+    cfft.cfftn(numpy.zeros((16, 16), dtype=numpy.complex64), axes=[0, 1])
+
+
+def run_request(arguments):
+    """ Run a request in a daemon child; the arguments name what it does. """
+    action = arguments['action']
+    if action == 'report':
+        engine = cfft._engine
+        print(json.dumps({
+            'arguments': arguments,
+            'directory': os.getcwd(),
+            'environment': os.environ.get('GADGETRON_TEST_VALUE'),
+            'plans': [list(key[0]) for key in engine.plans] if engine else None
+        }), flush=True)
+    elif action == 'raise':
+        raise ValueError("Request failed.")
+    elif action == 'exit':
+        sys.stdout.flush()
+        os._exit(arguments['status'])
+    elif action == 'kill':
+        os.kill(os.getpid(), signal.SIGKILL)
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / 'daemon.sock')
+
+
+@pytest.fixture
+def running_daemon(socket_path):
+    # The daemon must be the main thread of a process without other threads; it runs in a fresh interpreter.
+    process = subprocess.Popen([sys.executable, '-c',
+                                "from gadgetron import daemon; "
+                                "from tests.test_daemon import run_request; "
+                                "daemon.warm_up(['tests.test_daemon']); "
+                                f"daemon.Daemon({socket_path!r}, run_request).serve_forever()"],
+                               cwd=root, env={**os.environ, 'GADGETRON_FFT_THREADS': '1'})
+
+    deadline = time.monotonic() + 30
+    while not daemon._is_listening(socket_path):
+        assert process.poll() is None, "Daemon exited during start-up."
+        assert time.monotonic() < deadline, "Daemon did not start."
+        time.sleep(0.05)
+
+    yield process
+
+    process.terminate()
+    assert process.wait(timeout=30) == 0
+    assert not os.path.exists(socket_path)
+
+
+@pytest.fixture
+def fresh_engine():
+    engine = cfft._engine
+    cfft._engine = None
+    yield
+    cfft._engine = engine
+
+
+def test_request_runs_in_client_context(running_daemon, socket_path, tmp_path, monkeypatch, capfd):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('GADGETRON_TEST_VALUE', 'from the client')
+
+    assert daemon.request(socket_path, {'action': 'report', 'port': 1234}) == 0
+
+    report = json.loads(capfd.readouterr().out)
+    assert report['arguments'] == {'action': 'report', 'port': 1234}
+    assert report['directory'] == str(tmp_path)
+    assert report['environment'] == 'from the client'
+
+    # Plans made while warming up are inherited by the children.
+    assert [16, 16] in report['plans']
+
+
+@pytest.mark.parametrize('action, status', [
+    ({'action': 'exit', 'status': 0}, 0),
+    ({'action': 'exit', 'status': 7}, 7),
+    ({'action': 'raise'}, 1),
+    ({'action': 'kill'}, -signal.SIGKILL)
+])
+def test_exit_status_is_reported(running_daemon, socket_path, action, status):
+    assert daemon.request(socket_path, action) == status
+
+
+def test_concurrent_requests(running_daemon, socket_path):
+    statuses = [None] * 4
+
+    def send(index):
+        statuses[index] = daemon.request(socket_path, {'action': 'exit', 'status': index})
+
+    threads = [threading.Thread(target=send, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert statuses == [0, 1, 2, 3]
+
+
+def test_socket_is_private(running_daemon, socket_path):
+    assert os.stat(socket_path).st_mode & 0o777 == 0o600
+
+
+def test_second_daemon_is_refused(running_daemon, socket_path):
+    with pytest.raises(RuntimeError, match="already listening"):
+        daemon.Daemon(socket_path, run_request).serve_forever()
+
+
+def test_no_daemon():
+    with pytest.raises(FileNotFoundError):
+        daemon.request('/nonexistent/daemon.sock', {})
+
+
+def test_peer_credentials(monkeypatch):
+    first, second = socket.socketpair(socket.AF_UNIX)
+    with first, second:
+        assert daemon._is_same_user(first)
+        if hasattr(socket, 'SO_PEERCRED'):
+            monkeypatch.setattr(os, 'getuid', lambda: os.geteuid() + 1)
+            assert not daemon._is_same_user(first)
+
+
+def test_refuses_to_serve_with_threads_running(socket_path):
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        with pytest.raises(RuntimeError, match="running threads"):
+            daemon.Daemon(socket_path, run_request).serve_forever()
+    finally:
+        stop.set()
+        thread.join()
+    assert not os.path.exists(socket_path)
+
+
+def test_warm_up_keeps_single_threaded_plans(fresh_engine, monkeypatch):
+    monkeypatch.delenv('GADGETRON_FFT_THREADS', raising=False)
+    daemon.warm_up(['tests.test_daemon'])
+
+    assert cfft._engine.threads == 1
+    assert ((16, 16), numpy.dtype(numpy.complex64).str, (0, 1), 'FFTW_FORWARD') in cfft._engine.plans
+
+
+def test_warm_up_discards_engine_for_threaded_children(fresh_engine, monkeypatch):
+    planned = []
+    monkeypatch.setenv('GADGETRON_FFT_THREADS', '4')
+    monkeypatch.setattr(sys.modules[__name__], 'warm_up', lambda: planned.append(cfft.engine().planner_effort))
+
+    daemon.warm_up(['tests.test_daemon'])
+    assert planned == ['FFTW_MEASURE']
+    assert cfft._engine is None
+
+
+def test_children_asking_for_threads_get_a_new_engine(fresh_engine, monkeypatch):
+    cfft.configure(threads=1)
+
+    monkeypatch.setenv('GADGETRON_FFT_THREADS', '1')
+    daemon._discard_mismatched_fft_engine()
+    assert cfft._engine is not None
+
+    monkeypatch.setenv('GADGETRON_FFT_THREADS', '4')
+    daemon._discard_mismatched_fft_engine()
+    assert cfft._engine is None
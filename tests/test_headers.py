@@ -0,0 +1,61 @@
+
+import numpy
+import ismrmrd
+
+from gadgetron.external import constants
+from gadgetron.external.headers import (header_array, header_objects, header_object,
+                                        acquisition_header_dtype, image_header_dtype)
+from gadgetron.types.recon_data import read_recon_data
+
+from . import streams
+
+from .support import run
+
+
+def test_header_objects_round_trip():
+    headers = numpy.zeros((3, 2), dtype=acquisition_header_dtype)
+    headers['scan_counter'] = numpy.arange(6).reshape(3, 2)
+    headers['idx']['slice'] = 7
+
+    objects = header_objects(headers)
+    assert objects.shape == (3, 2)
+    assert isinstance(objects[2, 1], ismrmrd.AcquisitionHeader)
+    assert objects[2, 1].scan_counter == 5
+    assert objects[0, 0].idx.slice == 7
+
+    assert numpy.array_equal(header_array(objects), headers)
+
+
+def test_header_array_infers_dtype():
+    objects = numpy.empty(2, dtype=object)
+    objects[0], objects[1] = ismrmrd.ImageHeader(), ismrmrd.ImageHeader()
+    objects[1].image_index = 3
+
+    headers = header_array(objects)
+    assert headers.dtype == image_header_dtype
+    assert header_object(headers[1]).image_index == 3
+
+
+def test_header_array_of_nothing():
+    headers = header_array(numpy.empty((0, 1, 1), dtype=object))
+    assert headers.shape == (0, 1, 1)
+    assert headers.dtype == acquisition_header_dtype
+
+    assert header_array(numpy.empty(0, dtype=object), image_header_dtype).dtype == image_header_dtype
+
+
+def test_recon_data_headers_as_objects():
+    received = []
+
+    def pass_through_objects(connection):
+        connection.add_reader(constants.GADGET_MESSAGE_RECON_DATA, read_recon_data, headers_as_objects=True)
+        for item in connection:
+            received.append(item)
+            connection.send(item)
+
+    payload = streams.serialize([streams.recon_data(readout=16, lines=8, channels=2)])
+    assert run(pass_through_objects, payload) == payload + streams.close
+
+    headers = received[0].bits[0].data.headers
+    assert headers.dtype == object
+    assert isinstance(headers.flat[0], ismrmrd.AcquisitionHeader)
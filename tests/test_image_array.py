@@ -0,0 +1,76 @@
+
+import ismrmrd
+
+from gadgetron.external import constants
+from gadgetron.types.image_array import MetaContainers, read_image_array
+
+from . import streams
+
+from .support import run
+
+
+def image_array_message():
+    return streams.serialize([streams.image_array(size=8, sets=1, slices=3, meta_entries=2)])
+
+
+def read_through(handler, payload, **reader_options):
+    # Pass image arrays through a handler, which may modify them; returns the items, and the bytes sent back.
+    items = []
+
+    def read_and_send(connection):
+        if reader_options:
+            connection.add_reader(constants.GADGET_MESSAGE_IMAGE_ARRAY, read_image_array, **reader_options)
+        for item in connection:
+            handler(item)
+            items.append(item)
+            connection.send(item)
+
+    return items, run(read_and_send, payload)
+
+
+def test_meta_is_parsed_on_access():
+    items, _ = read_through(lambda item: None, image_array_message())
+    meta = items[0].meta
+
+    assert isinstance(meta, MetaContainers)
+    assert len(meta) == 3
+    assert meta.parsed == [None] * 3
+
+    assert isinstance(meta[1], ismrmrd.Meta)
+    assert meta[1]['entry_0'] == ['0', '1', '2', '3']
+    assert meta[1] is meta[1]
+    assert meta.parsed[0] is None and meta.parsed[2] is None
+
+
+def test_unchanged_meta_is_sent_as_received():
+    payload = image_array_message()
+
+    def access(item):
+        item.meta[0]['entry_1']
+
+    _, output = read_through(access, payload)
+    assert output == payload + streams.close
+
+
+def test_modified_meta_is_serialized():
+    def modify(item):
+        item.meta[0]['entry_1'] = 'modified'
+        item.meta[2] = {'replaced': 'yes'}
+
+    _, output = read_through(modify, image_array_message())
+    received, _ = read_through(lambda item: None, output[:-len(streams.close)])
+
+    meta = received[0].meta
+    assert meta[0]['entry_1'] == 'modified'
+    assert meta[1]['entry_1'] == ['0', '1', '2', '3']
+    assert meta[2]['replaced'] == 'yes'
+    assert 'entry_0' not in meta[2]
+
+
+def test_meta_as_strings():
+    payload = image_array_message()
+    items, output = read_through(lambda item: None, payload, meta_as_strings=True)
+
+    assert all(isinstance(container, str) for container in items[0].meta)
+    assert ismrmrd.Meta.deserialize(items[0].meta[0])['entry_0'] == ['0', '1', '2', '3']
+    assert output == payload + streams.close
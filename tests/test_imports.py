@@ -0,0 +1,18 @@
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('package', ['gadgetron', 'gadgetron.util', 'gadgetron.types', 'gadgetron.legacy',
+                                     'gadgetron.examples', 'gadgetron.external'])
+def test_star_import(package):
+    # Each package is imported first, in a fresh interpreter, so import cycles are not resolved by other imports.
+    # Star imports also fail if __all__ lists anything but names.
+    result = subprocess.run([sys.executable, '-c', f"from {package} import *"], cwd=root,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,140 @@
+
+import numpy
+import ismrmrd
+import pytest
+
+from gadgetron.legacy import Gadget
+
+from . import streams
+
+from .support import run
+
+pipelined = {'plain': None, 'pipeline': lambda connection: connection.pipeline()}
+
+
+def scan():
+    """ Acquisitions of two shapes, across a slice boundary, with a waveform in the middle. """
+    first = [streams.acquisition(line, channels=4, samples=32,
+                                 flags=[ismrmrd.ACQ_LAST_IN_SLICE] if line == 5 else []) for line in range(6)]
+    second = [streams.acquisition(line, slice=1, channels=2, samples=16) for line in range(7)]
+    return first[:3] + [streams.waveform()] + first[3:] + second
+
+
+class PassThrough(Gadget):
+
+    def process(self, header, data):
+        self.put_next(header, data)
+
+
+class BatchPassThrough(Gadget):
+    batch_size = 4
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def process_batch(self, headers, data):
+        self.batches.append((len(headers), data.shape))
+        self.put_next_batch(headers, data)
+
+
+class ReusedBuffers(Gadget):
+    # Sends the same buffers every time, and clobbers them once sent.
+
+    def process(self, header, data):
+        buffer = numpy.empty_like(data)
+        buffer[:] = data
+        self.put_next(header, buffer)
+        buffer[:] = 0
+        header.scan_counter = 0
+
+
+class ReusedBatchBuffers(BatchPassThrough):
+
+    def process_batch(self, headers, data):
+        self.put_next_batch(headers, data)
+        data[:] = 0
+        headers['scan_counter'] = 0
+
+
+class ImagePassThrough(Gadget):
+
+    def process(self, header, data, meta):
+        self.put_next(header, data, meta)
+
+
+@pytest.mark.parametrize('setup', list(pipelined.values()), ids=list(pipelined))
+@pytest.mark.parametrize('gadget', [PassThrough, BatchPassThrough, ReusedBuffers, ReusedBatchBuffers])
+def test_acquisitions_pass_through(gadget, setup):
+    payload = streams.serialize(scan())
+    assert run(gadget().handle, payload, setup=setup) == payload + streams.close
+
+
+def test_batches():
+    gadget = BatchPassThrough()
+    run(gadget.handle, streams.serialize(scan()))
+
+    # Batches end at the waveform, at the batch size, at the last acquisition in the slice, and on a change
+    # of shape.
+    assert gadget.batches == [(3, (3, 32, 4)), (3, (3, 32, 4)), (4, (4, 16, 2)), (3, (3, 16, 2))]
+
+
+def test_put_next_batch_accepts_header_objects():
+    class HeaderObjects(BatchPassThrough):
+        def process_batch(self, headers, data):
+            objects = [ismrmrd.AcquisitionHeader.from_buffer_copy(header.tobytes()) for header in headers]
+            self.put_next_batch(objects, data)
+
+    payload = streams.serialize(scan())
+    assert run(HeaderObjects().handle, payload) == payload + streams.close
+
+
+@pytest.mark.parametrize('setup', list(pipelined.values()), ids=list(pipelined))
+def test_images_pass_through(setup):
+    payload = streams.serialize([streams.image(size=16, channels=2) for _ in range(3)])
+    assert run(ImagePassThrough().handle, payload, setup=setup) == payload + streams.close
+
+
+def test_errors_raised_by_process_are_not_retried():
+    calls, error = [], TypeError("Raised by the gadget.")
+
+    class Failing(Gadget):
+        def process(self, header, data, *args):
+            calls.append(len(args))
+            raise error
+
+    with pytest.raises(TypeError) as raised:
+        run(Failing().handle, streams.serialize(scan()[:2]))
+    assert raised.value is error
+    assert calls == [0]
+
+
+def test_surplus_arguments_are_dropped():
+    received = []
+
+    class HeadersOnly(Gadget):
+        def process(self, header):
+            received.append(type(header))
+
+    run(HeadersOnly().handle, streams.serialize([streams.image(size=8)]))
+    assert received == [ismrmrd.ImageHeader]
+
+
+def test_variable_arguments():
+    received = []
+
+    class Variadic(Gadget):
+        def process(self, *args):
+            received.append([type(arg) for arg in args])
+
+    run(Variadic().handle, streams.serialize([streams.image(size=8), streams.acquisition(channels=1, samples=4)]))
+    assert received == [[ismrmrd.ImageHeader, numpy.ndarray, str], [ismrmrd.AcquisitionHeader, numpy.ndarray]]
+
+
+def test_missing_arguments_raise():
+    class TooMany(Gadget):
+        def process(self, header, data, meta):
+            pass
+
+    with pytest.raises(TypeError, match="arguments do not match"):
+        run(TooMany().handle, streams.serialize([streams.acquisition(channels=1, samples=4)]))
@@ -0,0 +1,125 @@
+
+import os
+import sys
+import time
+import signal
+import socket
+import threading
+import subprocess
+import multiprocessing
+
+import pytest
+
+from gadgetron.external import Server
+
+from . import streams
+from .streams import complete_stream
+
+from .support import messages, pass_through
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+payload = streams.serialize(messages()['acquisitions'] + messages()['images'])
+
+
+def free_port():
+    with socket.socket(family=socket.AF_INET6) as sock:
+        sock.bind(('', 0))
+        return sock.getsockname()[1]
+
+
+def connect(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return socket.create_connection(('localhost', port), timeout=timeout)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def receive_all(sock):
+    received = bytearray()
+    while True:
+        chunk = sock.recv(1024 * 1024)
+        if not chunk:
+            return bytes(received)
+        received.extend(chunk)
+
+
+def exchange(port, stream):
+    with connect(port) as sock:
+        sock.sendall(stream)
+        return receive_all(sock)
+
+
+def concurrently(*calls):
+    results = [None] * len(calls)
+
+    def call(index):
+        results[index] = calls[index]()
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(len(calls))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    return results
+
+
+def synchronized_pass_through(connection, barrier):
+    # Both connections must be handled at the same time to get past the barrier.
+    barrier.wait(timeout=10)
+    pass_through(connection)
+
+
+@pytest.mark.parametrize('fork', [False, True], ids=['threads', 'processes'])
+def test_server_handles_concurrent_connections(fork):
+    port = free_port()
+    barrier = multiprocessing.get_context('fork').Barrier(2) if fork else threading.Barrier(2)
+    server = Server(port, synchronized_pass_through, barrier, workers=2, fork=fork)
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        results = concurrently(lambda: exchange(port, complete_stream(payload)),
+                               lambda: exchange(port, complete_stream(payload)))
+    finally:
+        server.shutdown()
+        thread.join(30)
+
+    assert results == [payload + streams.close] * 2
+    assert not thread.is_alive()
+    assert server.children == set()
+    with pytest.raises(ConnectionRefusedError):
+        socket.create_connection(('localhost', port))
+
+
+@pytest.mark.parametrize('fork', [False, True], ids=['threads', 'processes'])
+@pytest.mark.parametrize('signum', [signal.SIGTERM, signal.SIGINT], ids=['SIGTERM', 'SIGINT'])
+def test_serve_shuts_down_on_signal(fork, signum):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, '-c',
+                                "from gadgetron.external import serve; "
+                                "from tests.support import pass_through; "
+                                f"serve({port}, pass_through, workers=2, fork={fork})"],
+                               cwd=root)
+    try:
+        assert concurrently(lambda: exchange(port, complete_stream(payload)),
+                            lambda: exchange(port, complete_stream(payload))) == [payload + streams.close] * 2
+
+        # A connection being handled when the signal arrives is allowed to complete.
+        with connect(port) as sock:
+            sock.sendall(streams.preamble() + payload)
+            time.sleep(0.2)
+            process.send_signal(signum)
+            time.sleep(0.2)
+            sock.sendall(streams.close)
+            assert receive_all(sock) == payload + streams.close
+
+        assert process.wait(timeout=30) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
@@ -0,0 +1,76 @@
+
+import io
+
+import ismrmrd
+import pytest
+
+from gadgetron.external import constants
+from gadgetron.external.raw import MessageFilter, RawMessage, read_raw_message, write_raw_message
+
+from . import streams
+
+from .support import messages, run
+
+
+class Source(io.BytesIO):
+
+    def peek(self, nbytes):
+        return self.getbuffer()[self.tell():self.tell() + nbytes]
+
+
+def message_bodies(items):
+    # Serialize items one by one, as (mid, body) pairs.
+    size = constants.GadgetMessageIdentifier.size
+    for item in items:
+        message = streams.serialize([item])
+        yield constants.GadgetMessageIdentifier.unpack_from(message)[0], message[size:]
+
+
+@pytest.mark.parametrize('kind', list(messages()))
+def test_skimmed_messages_are_complete(kind):
+    for mid, body in message_bodies(messages()[kind]):
+        source = Source(body + b'trailing')
+        message = read_raw_message(source, mid)
+
+        assert isinstance(message, RawMessage)
+        assert b''.join(message.chunks) == body
+        assert message.nbytes == len(body)
+        assert source.read() == b'trailing'
+
+        sink = streams.Sink()
+        write_raw_message(sink, message)
+        assert bytes(sink.buffer) == constants.GadgetMessageIdentifier.pack(mid) + body
+
+
+def test_message_filter_by_mid():
+    acquisitions = MessageFilter([constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION])
+    assert acquisitions.accepts(constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION, Source())
+    assert not acquisitions.accepts(constants.GADGET_MESSAGE_ISMRMRD_IMAGE, Source())
+    assert acquisitions.accepts(constants.GADGET_MESSAGE_CLOSE, Source())
+
+
+def test_message_filter_peeks_headers():
+    even = MessageFilter([constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION],
+                         lambda header: header.idx.kspace_encode_step_1 % 2 == 0)
+
+    for line in range(4):
+        mid, body = next(message_bodies([streams.acquisition(line, channels=1, samples=4)]))
+        source = Source(body)
+        assert even.accepts(mid, source) == (line % 2 == 0)
+        assert source.tell() == 0
+
+
+def test_filtered_messages_pass_through_unchanged():
+    lines = []
+
+    def even_lines(connection):
+        connection.filter_messages([constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION],
+                                   lambda header: header.idx.kspace_encode_step_1 % 2 == 0)
+        for item in connection:
+            assert isinstance(item, ismrmrd.Acquisition)
+            lines.append(item.idx.kspace_encode_step_1)
+            connection.send(item)
+
+    payload = b''.join(streams.serialize(items) for items in messages().values())
+    assert run(even_lines, payload) == payload + streams.close
+    assert lines == [0, 2, 4, 6]
@@ -0,0 +1,80 @@
+
+import io
+import struct
+
+import numpy
+import pytest
+
+from gadgetron.external import Connection
+from gadgetron.external.readers import read_array, read_into, read_vector
+
+
+class FakeSocket:
+    """ Socket serving bytes to `recv_into`, and recording the buffers it received into. """
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+        self.buffers = []
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv_into(self, buffer, nbytes=0, flags=0):
+        view = memoryview(buffer).cast('B')
+        self.buffers.append(view)
+        return self.stream.readinto(view[:nbytes or len(view)])
+
+
+def encoded(array):
+    return struct.pack(f'<Q{array.ndim}Q', array.ndim, *array.shape) + array.tobytes(order='F')
+
+
+def received_into(socket, array):
+    return any(numpy.may_share_memory(numpy.frombuffer(buffer, dtype=numpy.uint8), array)
+               for buffer in socket.buffers)
+
+
+def test_read_into_fills_the_array_in_place():
+    array = numpy.zeros((4, 3), dtype=numpy.float32, order='F')
+    expected = numpy.arange(12, dtype=numpy.float32).reshape(4, 3, order='F')
+
+    assert read_into(io.BytesIO(expected.tobytes(order='F')), array) is array
+    assert numpy.array_equal(array, expected)
+
+
+def test_large_arrays_are_received_directly():
+    array = numpy.asfortranarray(numpy.arange(256 * 512, dtype=numpy.complex64).reshape(256, 512))
+    socket = FakeSocket(encoded(array))
+    source = Connection.SocketWrapper(socket, buffer_size=4096)
+
+    received = read_array(source, numpy.complex64)
+
+    assert numpy.array_equal(received, array)
+    assert received.flags.f_contiguous and received.flags.writeable and received.flags.owndata
+    assert received_into(socket, received)
+
+
+def test_small_arrays_are_served_from_the_buffer():
+    vector = numpy.arange(8, dtype=numpy.uint64)
+    socket = FakeSocket(struct.pack('<Q', 8) + vector.tobytes() + b'trailing')
+    source = Connection.SocketWrapper(socket, buffer_size=4096)
+
+    received = read_vector(source)
+
+    assert numpy.array_equal(received, vector)
+    assert received.flags.writeable
+    assert len(socket.buffers) == 1 and not received_into(socket, received)
+    assert source.read(8) == b'trailing'
+
+
+@pytest.mark.parametrize('nbytes', [1, 4095, 4096, 4097, 3 * 4096 + 5])
+def test_reads_across_the_buffer(nbytes):
+    data = bytes(range(256)) * (2 + 2 * nbytes // 256)
+    source = Connection.SocketWrapper(FakeSocket(data), buffer_size=4096)
+
+    assert bytes(source.read(3)) == data[:3]
+    destination = bytearray(nbytes)
+    assert source.readinto(destination) == nbytes
+    assert bytes(destination) == data[3:3 + nbytes]
+    assert bytes(source.peek(2)) == data[3 + nbytes:5 + nbytes]
+    assert bytes(source.read(2)) == data[3 + nbytes:5 + nbytes]
@@ -0,0 +1,113 @@
+
+import ismrmrd
+import pytest
+
+from gadgetron.external import constants, registry, register_reader, register_writer
+from gadgetron.external.writers import write_waveform
+
+from . import streams
+
+from .support import messages, run
+
+
+class Tagged(ismrmrd.Waveform):
+    pass
+
+
+def tag(label):
+    def write(destination, item):
+        destination.write(label)
+        write_waveform(destination, item)
+    return write
+
+
+@pytest.fixture(autouse=True)
+def process_codecs():
+    # Registrations made by a test are dropped afterwards.
+    readers, writers = dict(registry.codecs.readers), dict(registry.codecs.writers)
+    yield registry.codecs
+    registry.codecs.readers, registry.codecs.writers = readers, writers
+    registry.Codecs.generation += 1
+
+
+def send_all(connection, setup):
+    setup(connection)
+    for item in connection:
+        connection.send(item)
+
+
+def test_defaults_are_visible_on_the_connection():
+    def inspect(connection):
+        assert connection.readers[constants.GADGET_MESSAGE_ISMRMRD_ACQUISITION] is not None
+        assert constants.GADGET_MESSAGE_CLOSE in connection.readers
+
+        acquisition = streams.acquisition(channels=1, samples=4)
+        assert any(predicate(acquisition) for predicate, _ in connection.writers)
+
+    run(inspect, b'')
+
+
+def test_process_writer_takes_precedence_over_default():
+    payload = streams.serialize(messages()['waveforms'][:1])
+    register_writer(ismrmrd.Waveform, tag(b'process'))
+    assert run(lambda c: send_all(c, lambda _: None), payload) == b'process' + payload + streams.close
+
+
+def test_connection_writer_takes_precedence_over_process():
+    payload = streams.serialize(messages()['waveforms'][:1])
+    register_writer(ismrmrd.Waveform, tag(b'process'))
+    output = run(lambda c: send_all(c, lambda c: c.add_writer(ismrmrd.Waveform, tag(b'connection'))), payload)
+    assert output == b'connection' + payload + streams.close
+
+
+def test_predicate_writer_takes_precedence_over_types():
+    payload = streams.serialize(messages()['waveforms'][:1])
+
+    def setup(connection):
+        connection.add_writer(ismrmrd.Waveform, tag(b'type'))
+        connection.add_writer(lambda item: isinstance(item, ismrmrd.Waveform), tag(b'predicate'))
+
+    assert run(lambda c: send_all(c, setup), payload) == b'predicate' + payload + streams.close
+
+
+def test_writers_serve_subclasses():
+    waveform = streams.waveform()
+
+    def send_tagged(connection):
+        connection.add_writer(Tagged, tag(b'subclass'))
+        connection.send(waveform)
+        connection.send(Tagged(waveform.getHead(), waveform.data))
+
+    expected = streams.serialize([waveform])
+    assert run(send_tagged, b'') == expected + b'subclass' + expected + streams.close
+
+
+def test_connection_writers_do_not_leak_into_other_connections():
+    payload = streams.serialize(messages()['waveforms'][:1])
+    run(lambda c: send_all(c, lambda c: c.add_writer(ismrmrd.Waveform, tag(b'connection'))), payload)
+    assert run(lambda c: send_all(c, lambda _: None), payload) == payload + streams.close
+
+
+def test_reader_precedence():
+    seen = []
+
+    def read_as(label):
+        def read(source):
+            seen.append(label)
+            return registry.defaults.reader(constants.GADGET_MESSAGE_ISMRMRD_WAVEFORM)(source)
+        return read
+
+    payload = streams.serialize(messages()['waveforms'][:1])
+    register_reader(constants.GADGET_MESSAGE_ISMRMRD_WAVEFORM, read_as('process'))
+    run(lambda c: send_all(c, lambda _: None), payload)
+
+    def setup(connection):
+        connection.add_reader(constants.GADGET_MESSAGE_ISMRMRD_WAVEFORM, read_as('connection'))
+    run(lambda c: send_all(c, setup), payload)
+
+    def set_item(connection):
+        connection.readers[constants.GADGET_MESSAGE_ISMRMRD_WAVEFORM] = read_as('item')
+    run(lambda c: send_all(c, set_item), payload)
+
+    assert seen == ['process', 'connection', 'item']
+    assert registry.codecs.readers[constants.GADGET_MESSAGE_ISMRMRD_WAVEFORM] is not None
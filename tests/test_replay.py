@@ -0,0 +1,110 @@
+
+import os
+import logging
+
+import numpy
+import pytest
+
+from gadgetron.external import Connection, ReplaySource, replay
+
+from . import streams
+from .streams import complete_stream
+
+from .support import connect, messages, pass_through
+
+
+def record(payload, path=None):
+    # Pass a stream through a recording connection; returns the bytes sent back.
+    server, result = connect(complete_stream(payload))
+    with Connection(server, record=path) as connection:
+        pass_through(connection)
+    return result()
+
+
+@pytest.fixture
+def payload():
+    return b''.join(streams.serialize(items) for items in messages().values())
+
+
+def test_recording_replays_as_received(tmp_path, payload):
+    recording, output = tmp_path / 'stream', tmp_path / 'output'
+    sent = record(payload, path=str(recording))
+
+    assert recording.read_bytes() == complete_stream(payload)
+
+    replay(str(recording), pass_through, output=str(output))
+    assert output.read_bytes() == sent == payload + streams.close
+
+
+def test_record_directory(tmp_path, monkeypatch, payload):
+    monkeypatch.setenv('GADGETRON_RECORD_DIRECTORY', str(tmp_path))
+    record(payload)
+    record(payload)
+
+    recordings = sorted(tmp_path.iterdir())
+    assert len(recordings) == 2
+    assert all(path.read_bytes() == complete_stream(payload) for path in recordings)
+
+
+def test_unusable_record_directory_is_skipped(tmp_path, monkeypatch, caplog, payload):
+    monkeypatch.setenv('GADGETRON_RECORD_DIRECTORY', str(tmp_path / 'missing'))
+    with caplog.at_level(logging.WARNING):
+        assert record(payload) == payload + streams.close
+    assert "continuing without recording" in caplog.text
+
+
+def test_unusable_record_file_raises(tmp_path):
+    server, _ = connect(b'')
+    try:
+        with pytest.raises(OSError):
+            Connection(server, record=str(tmp_path / 'missing' / 'stream'))
+    finally:
+        server.close()
+
+
+@pytest.mark.skipif(not os.path.exists('/dev/full'), reason="Requires /dev/full.")
+def test_failed_recording_stops_with_warning(caplog, payload):
+    with caplog.at_level(logging.WARNING):
+        assert record(payload, path='/dev/full') == payload + streams.close
+    assert "recording stopped" in caplog.text
+
+
+def test_large_reads_are_zero_copy(tmp_path):
+    recording = tmp_path / 'stream'
+    recording.write_bytes(bytes(range(256)) * 1024)
+
+    with ReplaySource(str(recording)) as source:
+        assert isinstance(source.read(16), bytes)
+        view = source.read(ReplaySource.zero_copy_threshold)
+        assert isinstance(view, memoryview) and view.readonly
+        assert bytes(view[:4]) == bytes([16, 17, 18, 19])
+
+        destination = numpy.zeros(4, dtype=numpy.uint8)
+        source.readinto(destination)
+        assert list(destination) == [16, 17, 18, 19]
+
+        del view
+    assert source.map is None
+
+
+def test_source_closes_with_referenced_slices(tmp_path):
+    recording = tmp_path / 'stream'
+    recording.write_bytes(bytes(2 * ReplaySource.zero_copy_threshold))
+
+    with ReplaySource(str(recording)) as source:
+        view = source.read(ReplaySource.zero_copy_threshold)
+
+    assert source.map is None
+    assert len(view) == ReplaySource.zero_copy_threshold
+
+
+def test_reads_past_the_end_raise(tmp_path):
+    recording = tmp_path / 'stream'
+    recording.write_bytes(bytes(16))
+
+    with ReplaySource(str(recording)) as source:
+        with pytest.raises(EOFError):
+            source.peek(17)
+        source.read(12)
+        with pytest.raises(EOFError):
+            source.read(8)
@@ -0,0 +1,139 @@
+
+import os
+import time
+import pickle
+
+import numpy
+import pytest
+
+from gadgetron.util import shard
+from gadgetron.util.shard import _dumps, _loads
+
+pytestmark = pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason="Requires POSIX shared memory in /dev/shm.")
+
+# Per-key state of the worker processes; see `count_per_key`.
+counts = {}
+
+
+class Unpicklable(Exception):
+
+    def __reduce__(self):
+        raise TypeError("Not picklable.")
+
+
+def shared_memory_blocks():
+    return {name for name in os.listdir('/dev/shm') if name.startswith('psm_')}
+
+
+@pytest.fixture(autouse=True)
+def no_leaked_blocks():
+    before = shared_memory_blocks()
+    yield
+    assert shared_memory_blocks() - before == set()
+
+
+def delayed(item):
+    # Later items finish first, so results arrive out of order.
+    time.sleep(0.01 * (10 - item % 10))
+    return item
+
+
+def count_per_key(item):
+    key, value = item
+    counts[key] = counts.get(key, 0) + 1
+    return key, value, counts[key], os.getpid()
+
+
+def double(array):
+    return array * 2
+
+
+def odd_only(item):
+    return item if item % 2 else None
+
+
+def fail_on_five(item):
+    if item == 5:
+        raise ValueError("Five.")
+    return item
+
+
+def fail_on_array_five(array):
+    if array[0] == 5:
+        raise ValueError("Five.")
+    return array
+
+
+def fail_unpicklably(item):
+    raise Unpicklable()
+
+
+def test_results_are_in_order():
+    assert list(shard(range(20), key=lambda item: item % 4, function=delayed, processes=4)) == list(range(20))
+
+
+def test_items_sharing_a_key_go_to_the_same_worker():
+    items = [(key, value) for value in range(5) for key in 'abc']
+    results = list(shard(items, key=lambda item: item[0], function=count_per_key, processes=2))
+
+    assert [(key, value) for key, value, _, _ in results] == items
+    for key in 'abc':
+        per_key = [result for result in results if result[0] == key]
+        assert [count for _, _, count, _ in per_key] == [1, 2, 3, 4, 5]
+        assert len({pid for _, _, _, pid in per_key}) == 1
+
+
+def test_none_results_are_dropped():
+    assert list(shard(range(10), key=lambda item: item, function=odd_only, processes=2)) == [1, 3, 5, 7, 9]
+
+
+def test_large_arrays_pass_through_shared_memory():
+    arrays = [numpy.full((64, 64), index, dtype=numpy.complex64) for index in range(6)]
+    arrays.append(numpy.asfortranarray(numpy.arange(128 * 96, dtype=numpy.float32).reshape(128, 96)))
+
+    results = list(shard(arrays, key=lambda array: 0, function=double, processes=2, threshold=1024))
+    for result, array in zip(results, arrays):
+        assert numpy.array_equal(result, array * 2)
+    assert results[-1].flags.f_contiguous
+
+
+def test_large_arrays_are_not_pickled():
+    array = numpy.arange(1024, dtype=numpy.float64)
+
+    payload, blocks = _dumps({'data': array, 'small': array[:4].copy()}, threshold=1024)
+    assert len(blocks) == 1
+    assert len(payload) < len(pickle.dumps(array)) // 4
+
+    for block in blocks:
+        block.close()
+    loaded = _loads(payload, unlink=True)
+    assert numpy.array_equal(loaded['data'], array)
+    assert numpy.array_equal(loaded['small'], array[:4])
+
+
+def test_errors_are_raised_in_order():
+    results = []
+    with pytest.raises(ValueError, match="Five."):
+        for result in shard(range(10), key=lambda item: item % 3, function=fail_on_five, processes=3):
+            results.append(result)
+    assert results == [0, 1, 2, 3, 4]
+
+
+def test_blocks_are_released_after_errors():
+    arrays = (numpy.full(4096, index, dtype=numpy.float64) for index in range(16))
+    with pytest.raises(ValueError, match="Five."):
+        list(shard(arrays, key=lambda array: int(array[0]) % 3, function=fail_on_array_five, processes=3,
+                   threshold=1024))
+
+
+def test_unpicklable_errors_are_reported():
+    with pytest.raises(RuntimeError, match="Unpicklable"):
+        list(shard(range(3), key=lambda item: item, function=fail_unpicklably, processes=1))
+
+
+def test_blocks_are_released_when_consumer_stops_early():
+    arrays = (numpy.full(4096, index, dtype=numpy.float64) for index in range(32))
+    results = shard(arrays, key=lambda array: int(array[0]) % 2, function=double, processes=2, threshold=1024)
+
+    assert numpy.array_equal(next(results), numpy.zeros(4096))
+    results.close()
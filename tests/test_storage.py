@@ -0,0 +1,122 @@
+
+import io
+import struct
+
+import numpy
+import pytest
+
+from gadgetron.external import storage
+from gadgetron.external.readers import read_array
+from gadgetron.external.writers import write_array
+
+
+@pytest.fixture(autouse=True)
+def settings():
+    # Settings changed by a test are restored afterwards.
+    saved = storage.threshold, storage.directory, storage.chunk_size
+    yield
+    storage.threshold, storage.directory, storage.chunk_size = saved
+
+
+class Destination:
+
+    def __init__(self):
+        self.writes = []
+        self.flushes = 0
+
+    def write(self, byte_array):
+        self.writes.append(bytes(byte_array))
+
+    def flush(self):
+        self.flushes += 1
+
+
+class ReadOnlySource:
+    # Source without `readinto`; arrays are read in chunks, and copied into place.
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, nbytes):
+        return self.stream.read(nbytes)
+
+
+def encoded(array):
+    # Arrays are sent as their number of dimensions, the dimensions, and the elements in Fortran order.
+    return struct.pack(f'<Q{array.ndim}Q', array.ndim, *array.shape) + array.tobytes(order='F')
+
+
+def test_configure_changes_only_settings_passed(tmp_path):
+    storage.configure(memmap_threshold=1024, memmap_directory=str(tmp_path), chunk_bytes=4096)
+
+    storage.configure(chunk_bytes=512)
+    assert (storage.threshold, storage.directory, storage.chunk_size) == (1024, str(tmp_path), 512)
+
+    storage.configure(memmap_threshold=None)
+    assert (storage.threshold, storage.directory, storage.chunk_size) == (None, str(tmp_path), 512)
+
+
+def test_is_large():
+    storage.configure(memmap_threshold=None)
+    assert not storage.is_large(2 ** 40)
+
+    storage.configure(memmap_threshold=1024)
+    assert not storage.is_large(1024)
+    assert storage.is_large(1025)
+
+
+def test_empty(tmp_path):
+    storage.configure(memmap_threshold=1024, memmap_directory=str(tmp_path))
+
+    small = storage.empty((4, 4), numpy.complex64)
+    assert type(small) is numpy.ndarray and small.flags.f_contiguous
+
+    large = storage.empty((32, 16), numpy.complex64)
+    assert isinstance(large, numpy.memmap) and large.flags.f_contiguous
+    large[:] = 1
+    assert numpy.all(large == 1)
+
+    # The backing file is unlinked as soon as it is created.
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('shape', [(1000,), (10, 20, 30), (3, 5, 7, 11), (2000, 3)])
+def test_chunks(shape):
+    storage.configure(chunk_bytes=512)
+    array = numpy.asfortranarray(numpy.arange(numpy.prod(shape), dtype=numpy.float64).reshape(shape, order='F'))
+
+    pieces = list(storage.chunks(array))
+    assert all(piece.nbytes <= 512 for piece in pieces)
+    assert all(numpy.shares_memory(piece, array) for piece in pieces)
+    assert numpy.array_equal(numpy.concatenate([piece.ravel(order='F') for piece in pieces]),
+                             array.ravel(order='F'))
+
+
+@pytest.mark.parametrize('source', [io.BytesIO, ReadOnlySource])
+def test_large_array_round_trip(tmp_path, source):
+    storage.configure(memmap_threshold=4096, memmap_directory=str(tmp_path), chunk_bytes=1024)
+    array = numpy.asfortranarray(numpy.arange(64 * 48, dtype=numpy.float32).reshape(64, 48) * (1 + 1j))
+
+    destination = Destination()
+    write_array(destination, array, numpy.complex64)
+    assert b''.join(destination.writes) == encoded(array.astype(numpy.complex64))
+    # The dimensions, followed by the elements in flushed chunks.
+    assert len(destination.writes) > 2
+    assert destination.flushes == len(destination.writes) - 1
+
+    received = read_array(source(b''.join(destination.writes)), numpy.complex64)
+    assert isinstance(received, numpy.memmap)
+    assert numpy.array_equal(received, array)
+
+
+def test_small_array_round_trip():
+    storage.configure(memmap_threshold=4096)
+    array = numpy.arange(12, dtype=numpy.uint16).reshape(3, 4)
+
+    destination = Destination()
+    write_array(destination, array, numpy.uint16)
+    assert b''.join(destination.writes) == encoded(array)
+
+    received = read_array(io.BytesIO(b''.join(destination.writes)), numpy.uint16)
+    assert type(received) is numpy.ndarray
+    assert numpy.array_equal(received, array)
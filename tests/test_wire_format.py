@@ -0,0 +1,148 @@
+
+import struct
+
+import numpy
+import ismrmrd
+import pytest
+
+from gadgetron.external import constants
+from gadgetron.external.headers import header_array
+from gadgetron.types.acquisition_bucket import AcquisitionBucket, AcquisitionBucketStats, AcquisitionBundle
+
+from . import reference, streams
+from .support import pass_through, run
+
+
+def received(payload):
+    items = []
+
+    def collect(connection):
+        for item in connection:
+            items.append(item)
+            connection.send(item)
+
+    return items, run(collect, payload)
+
+
+def same_acquisition(a, b):
+    return (bytes(a.getHead()) == bytes(b.getHead()) and
+            numpy.array_equal(a.data, b.data) and numpy.array_equal(a.traj, b.traj))
+
+
+def same_waveform(a, b):
+    return bytes(a.getHead()) == bytes(b.getHead()) and numpy.array_equal(a.data, b.data)
+
+
+def same_image(a, b):
+    # The attribute string length of the header is only set as the image is serialized; compare the rest.
+    return (a.image_index == b.image_index and a.image_series_index == b.image_series_index and
+            numpy.array_equal(a.data, b.data) and a.attribute_string == b.attribute_string)
+
+
+def same_headers(a, b):
+    def structured(headers):
+        return header_array(headers) if headers.dtype == object else headers
+    return a.shape == b.shape and structured(a).tobytes() == structured(b).tobytes()
+
+
+def same_image_array(a, b):
+    return (numpy.array_equal(a.data, b.data) and same_headers(a.headers, b.headers) and
+            [dict(a.meta[i]) for i in range(len(a.meta))] == [dict(ismrmrd.Meta.deserialize(m)) for m in b.meta] and
+            all(same_waveform(x, y) for x, y in zip(a.waveform, b.waveform)) and
+            same_headers(a.acq_headers, b.acq_headers))
+
+
+def same_recon_data(a, b):
+    def same_buffer(x, y):
+        return (numpy.array_equal(x.data, y.data) and numpy.array_equal(x.trajectory, y.trajectory) and
+                x.density is None and y.density is None and same_headers(x.headers, y.headers) and
+                bytes(x.sampling) == bytes(y.sampling))
+
+    return all(same_buffer(x.data, y.data) and x.ref is None and y.ref is None for x, y in zip(a.bits, b.bits))
+
+
+comparisons = {
+    'acquisitions': same_acquisition,
+    'waveforms': same_waveform,
+    'images': same_image,
+    'image arrays': same_image_array,
+    'recon data': same_recon_data
+}
+
+
+@pytest.mark.parametrize('name', list(comparisons))
+def test_writers_match_reference(name):
+    assert streams.serialize(reference.items()[name]) == reference.serialized(name)
+
+
+@pytest.mark.parametrize('name', list(comparisons))
+def test_readers_decode_reference(name):
+    payload = reference.serialized(name)
+    items, output = received(payload)
+
+    expected = reference.items()[name]
+    assert len(items) == len(expected)
+    assert all(comparisons[name](item, other) for item, other in zip(items, expected))
+    assert output == payload + streams.close
+
+
+@pytest.mark.parametrize('name', list(comparisons))
+def test_reference_passes_through(name):
+    payload = reference.serialized(name)
+    assert run(pass_through, payload, setup=lambda c: c.pipeline()) == payload + streams.close
+
+
+def bucket():
+    acquisitions = [reference.acquisition(0), reference.acquisition(1, trajectory_dimensions=2)]
+    stats = [AcquisitionBucketStats(kspace_encode_step_1={0, 1}, kspace_encode_step_2={0}, slice={1}, phase={0},
+                                    contrast={0}, repetition={0}, set={0}, segment={0}, average={0})]
+    return AcquisitionBucket(AcquisitionBundle.from_acquisitions(acquisitions), stats,
+                             AcquisitionBundle.from_acquisitions([]), [], [reference.waveform()]), acquisitions
+
+
+def packed_bucket():
+    """ The bucket above, packed by hand as Gadgetron serializes an AcquisitionBucket. """
+    _, acquisitions = bucket()
+    waveform = reference.waveform()
+
+    headers = b''.join(bytes(acquisition.getHead()) for acquisition in acquisitions)
+    trajectory = b''.join(acquisition.traj.tobytes() for acquisition in acquisitions)
+    data = b''.join(acquisition.data.tobytes() for acquisition in acquisitions)
+
+    # Stats: a count, then per entry, nine vectors of uint16 in the order of `AcquisitionBucketStats.fields`.
+    def vector(*values):
+        return struct.pack(f'<Q{len(values)}H', len(values), *values)
+    data_stats = struct.pack('<Q', 1) + vector(0, 1) + vector(0) + vector(1) + b''.join(vector(0) for _ in range(6))
+    reference_stats = struct.pack('<Q', 0)
+
+    waveform_header, waveform_data = bytes(waveform.getHead()), waveform.data.tobytes()
+
+    sizes = struct.pack('<13Q',
+                        2, len(headers), len(data), len(trajectory),
+                        0, 0, 0, 0,
+                        len(data_stats), len(reference_stats),
+                        1, len(waveform_header), len(waveform_data))
+
+    return (struct.pack('<H', constants.GADGET_MESSAGE_BUCKET) + sizes +
+            headers + trajectory + data + data_stats +
+            reference_stats +
+            waveform_header + waveform_data)
+
+
+def test_bucket_writer_matches_packed_bytes():
+    item, _ = bucket()
+    assert streams.serialize([item]) == packed_bucket()
+
+
+def test_bucket_reader_decodes_packed_bytes():
+    _, acquisitions = bucket()
+    items, output = received(packed_bucket())
+
+    assert len(items) == 1
+    assert all(same_acquisition(a, b) for a, b in zip(items[0].data, acquisitions))
+    assert len(items[0].ref) == 0
+    assert [stats.kspace_encode_step_1 for stats in items[0].datastats] == [{0, 1}]
+    assert [stats.slice for stats in items[0].datastats] == [{1}]
+    assert items[0].refstats == []
+    assert same_waveform(items[0].waveforms[0], reference.waveform())
+    assert output == packed_bucket() + streams.close